@@ -0,0 +1,139 @@
+"""Bandwidth vs CPU of response compression on a large product listing.
+
+The first --rows products are rendered the way the server sends them: one
+JSON body (the FAST_JSON_RESPONSES list shape) and the NDJSON export stream
+in EXPORT_BATCH_SIZE-row chunks. Each coding and level is timed compressing
+the whole body, compressing the stream chunk by chunk with a flush after
+each (as CompressionMiddleware does), and decompressing. The total_ms
+figures add the time to send the compressed bytes over a link of the given
+speed, i.e. when compression pays for itself.
+
+Usage (from src/backend, with the DB_* variables):
+
+    python -m benchmarks.bench_compression --rows 100000
+"""
+import argparse, asyncio, json, time, zlib
+from typing import Any, Callable, Dict, List, Tuple
+import brotli, zstandard
+from middleware import CompressionMiddleware, CompressionSettings
+from middleware.compression import available_compressors
+from repositories import PostgresProductRepository
+from services import ProductService
+from services.product_service import EXPORT_BATCH_SIZE
+from utils import ndjson_chunk
+from utils.fast_json import dumps
+from utils.metrics import MetricsRegistry
+from .common import make_repo
+
+LEVELS: List[Tuple[str, int]] = [
+    ("gzip", 1), ("gzip", 6), ("gzip", 9),
+    ("br", 1), ("br", 4), ("br", 6), ("br", 9),
+    ("zstd", 1), ("zstd", 3), ("zstd", 9), ("zstd", 15),
+]
+LINKS_MBIT = (10, 100, 1000)
+DECOMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda data: zlib.decompressobj(31).decompress(data),
+    "br": brotli.decompress,
+    "zstd": lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+}
+
+def best_of(repeat: int, func: Callable[[], Any]) -> Tuple[float, Any]:
+    """Fastest of repeat runs in milliseconds, and the result of the last one."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+def measure(body: bytes, chunks: List[bytes], encoding: str, level: int, repeat: int) -> Dict[str, Any]:
+    factory = available_compressors()[encoding]
+
+    def whole() -> bytes:
+        compressor = factory(level)
+        return compressor.compress(body) + compressor.finish()
+
+    def streamed() -> int:
+        compressor = factory(level)
+        sizes = [len(compressor.compress(chunk) + compressor.flush()) for chunk in chunks]
+        return sum(sizes) + len(compressor.finish())
+
+    compress_ms, compressed = best_of(repeat, whole)
+    stream_ms, stream_size = best_of(repeat, streamed)
+    decompress_ms, restored = best_of(repeat, lambda: DECOMPRESSORS[encoding](compressed))
+    assert restored == body, f"{encoding} {level} did not round-trip"
+    result = {
+        "encoding": encoding,
+        "level": level,
+        "bytes": len(compressed),
+        "ratio": len(body) / len(compressed),
+        "compress_ms": compress_ms,
+        "compress_mb_per_s": len(body) / 1e6 / (compress_ms / 1000),
+        "decompress_ms": decompress_ms,
+        "stream_bytes": stream_size,
+        "stream_compress_ms": stream_ms,
+    }
+    for mbit in LINKS_MBIT:
+        result[f"total_ms_at_{mbit}mbit"] = compress_ms + len(compressed) * 8 / (mbit * 1000) + decompress_ms
+    return result
+
+async def through_middleware(body: bytes, encoding: str, repeat: int) -> float:
+    """Fastest end-to-end pass of the body through CompressionMiddleware with default settings, in ms."""
+    async def app(scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def send(message) -> None:
+        pass
+
+    middleware = CompressionMiddleware(app, CompressionSettings(), MetricsRegistry())
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", encoding.encode())]}
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await middleware(scope, None, send)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="products in the payload")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the fastest counts")
+    args = parser.parse_args()
+
+    repo = make_repo()
+    if not await repo.connect():
+        raise SystemExit("Could not connect to Postgres")
+    try:
+        service = ProductService(PostgresProductRepository(repo.pool))
+        rows: List[Any] = []
+        async for batch in service.repository.export_products(None, EXPORT_BATCH_SIZE):
+            rows.extend(dict(row) for row in batch[:args.rows - len(rows)])
+            if len(rows) >= args.rows:
+                break
+    finally:
+        await repo.close()
+
+    list_body = dumps({"items": rows, "next_cursor": None})
+    export_chunks = [ndjson_chunk(rows[i:i + EXPORT_BATCH_SIZE]) for i in range(0, len(rows), EXPORT_BATCH_SIZE)]
+    results: Dict[str, Any] = {
+        "rows": len(rows),
+        "list_json_bytes": len(list_body),
+        "export_ndjson_bytes": sum(len(chunk) for chunk in export_chunks),
+        "identity_total_ms": {f"at_{mbit}mbit": len(list_body) * 8 / (mbit * 1000) for mbit in LINKS_MBIT},
+    }
+    # The list body is measured whole; the export stream chunk by chunk, against its own bytes
+    export_body = b"".join(export_chunks)
+    results["list_json"] = [measure(list_body, [list_body], encoding, level, args.repeat) for encoding, level in LEVELS]
+    results["export_ndjson"] = [
+        {key: value for key, value in measure(export_body, export_chunks, encoding, level, args.repeat).items() if key.startswith(("encoding", "level", "stream", "ratio"))}
+        for encoding, level in LEVELS
+    ]
+    defaults = CompressionSettings().levels
+    results["middleware_ms_default_levels"] = {
+        encoding: await through_middleware(list_body, encoding, args.repeat) for encoding in defaults
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""Compare single-row inserts with write-behind batching under many concurrent producers.
+
+Each producer calls ProductService.create_product in a loop; the pool keeps
+its DB_POOL_* size (10 by default), so direct inserts queue for connections
+while batched ones share a flush.
+
+Usage (from src/backend, with the DB_* variables):
+
+    python -m benchmarks.bench_insert_batching --producers 200 --inserts 20000
+"""
+import argparse, asyncio, json, time
+from typing import Any, Dict, List
+from models import Product
+from repositories import PostgresProductRepository
+from services import InsertBatcher, InsertBatchSettings, ProductService
+from utils import random_product
+from .common import make_repo, percentiles
+
+async def run(service: ProductService, producers: int, inserts: int) -> Dict[str, Any]:
+    products = [Product(**random_product()) for _ in range(inserts)]
+    samples: List[float] = []
+
+    async def produce(start: int) -> None:
+        for product in products[start::producers]:
+            started = time.perf_counter()
+            await service.create_product(product)
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(produce(start) for start in range(producers)))
+    elapsed = time.perf_counter() - started
+    return {"inserts_per_second": inserts / elapsed, **percentiles(samples)}
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--producers", type=int, default=200, help="concurrent callers")
+    parser.add_argument("--inserts", type=int, default=20000, help="products inserted per mode")
+    parser.add_argument("--max-batch", type=int, default=InsertBatchSettings.max_batch)
+    parser.add_argument("--max-delay-ms", type=float, default=InsertBatchSettings.max_delay * 1000)
+    args = parser.parse_args()
+
+    repo = make_repo()
+    if not await repo.connect():
+        raise SystemExit("Could not connect to Postgres")
+    try:
+        repository = PostgresProductRepository(repo.pool)
+        results: Dict[str, Any] = {"producers": args.producers, "inserts": args.inserts}
+        results["direct"] = await run(ProductService(repository), args.producers, args.inserts)
+        for use_copy in (True, False):
+            settings = InsertBatchSettings(True, args.max_batch, args.max_delay_ms / 1000, use_copy=use_copy)
+            batcher = InsertBatcher(repository, settings)
+            batcher.start()
+            mode = "batched_copy" if use_copy else "batched_insert"
+            results[mode] = await run(ProductService(repository, insert_batcher=batcher), args.producers, args.inserts)
+            await batcher.close()
+            results[mode]["batches"] = batcher.stats()["batches"]
+    finally:
+        await repo.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
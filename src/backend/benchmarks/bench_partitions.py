@@ -0,0 +1,84 @@
+"""ProductService latency on the products table of DB_NAME, partitioned by month (migration 008) or not.
+
+To compare, run it against a copy of the database migrated to 008 and, from
+a checkout before migration 008, against the original. Time-filtered
+listings pick a random month of 2024 (--year); lookups and upserts pick
+random existing products. With --vacuum, VACUUM (ANALYZE) of one month's
+partition is timed against the whole table.
+
+Usage (from src/backend, with the DB_* variables):
+
+    python -m benchmarks.bench_partitions --iterations 200 --vacuum
+"""
+import argparse, asyncio, json, random, time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List
+from models import Product, ProductFilter, ProductSortField, SortOrder
+from repositories import PostgresProductRepository, ProductPartitions
+from repositories.product_partitions import add_months
+from services import ProductService
+from utils import random_product
+from .common import make_repo, percentiles
+
+Operation = Callable[[ProductService], Awaitable[Any]]
+
+def month_filter(year: int, category: str = None) -> ProductFilter:
+    month = datetime(year, random.randint(1, 12), 1, tzinfo=timezone.utc)
+    return ProductFilter(category=category, created_after=month, created_before=add_months(month, 1))
+
+def operations(year: int, ids: List[int], stored: List[Product], created: List[int]) -> Dict[str, Operation]:
+    async def create(service: ProductService) -> None:
+        created.append(await service.create_product(Product(**random_product())))
+
+    return {
+        "list_month_by_created": lambda service: service.list_products_page(month_filter(year), ProductSortField.created_at, SortOrder.asc, 50),
+        "list_month_by_price": lambda service: service.list_products_page(month_filter(year), ProductSortField.price, SortOrder.asc, 50),
+        "list_category_month_by_id": lambda service: service.list_products_page(month_filter(year, "Test"), ProductSortField.id, SortOrder.asc, 50),
+        "list_by_id": lambda service: service.list_products_page(None, ProductSortField.id, SortOrder.asc, 50),
+        "list_by_created_desc": lambda service: service.list_products_page(None, ProductSortField.created_at, SortOrder.desc, 50),
+        "get_by_id": lambda service: service.get_product_by_id(random.choice(ids)),
+        "upsert_unchanged": lambda service: service.upsert_product(random.choice(stored)),
+        "create_product": create,
+    }
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200, help="calls per operation")
+    parser.add_argument("--year", type=int, default=2024, help="year whose months the filtered listings read")
+    parser.add_argument("--vacuum", action="store_true", help="also time VACUUM (ANALYZE) of a month and of the table")
+    args = parser.parse_args()
+
+    repo = make_repo()
+    if not await repo.connect():
+        raise SystemExit("Could not connect to Postgres")
+    try:
+        service = ProductService(PostgresProductRepository(repo.pool))
+        partitions = await ProductPartitions(repo.pool).list_partitions()
+        async with repo.pool.acquire() as conn:
+            ids = [row["id"] for row in await conn.fetch("SELECT id FROM products TABLESAMPLE SYSTEM (1) LIMIT 2000")]
+        stored = [product for product in (await service.get_products_by_ids(ids[:200])).items]
+        created: List[int] = []
+        results: Dict[str, Any] = {"partitions": len(partitions)}
+        for name, operation in operations(args.year, ids, stored, created).items():
+            samples = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                await operation(service)
+                samples.append(time.perf_counter() - started)
+            results[name] = percentiles(samples)
+        await service.delete_products(created)
+
+        if args.vacuum:
+            month = next((p.name for p in partitions if p.start and p.start.year == args.year), None)
+            async with repo.pool.acquire() as conn:
+                for label, table in (("vacuum_month_ms", month), ("vacuum_table_ms", "products")):
+                    if table:
+                        started = time.perf_counter()
+                        await conn.execute(f'VACUUM (ANALYZE) "{table}"')
+                        results[label] = (time.perf_counter() - started) * 1000
+    finally:
+        await repo.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
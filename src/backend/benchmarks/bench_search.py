@@ -0,0 +1,65 @@
+"""Measure search latency per mode against a local Postgres.
+
+Usage (from src/backend, with the DB_* variables set):
+
+    python -m benchmarks.bench_search --rows 1000000 --queries 200
+"""
+import argparse, asyncio, asyncpg, json, random, time
+from models import SearchMode
+from services import ProductService
+from .common import make_repo, percentiles, seed_products
+
+async def sample_terms(service: ProductService, count: int):
+    async with service.repository.pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT name FROM products TABLESAMPLE SYSTEM (1) LIMIT $1", count
+        ) or await conn.fetch("SELECT name FROM products LIMIT $1", count)
+    return [row["name"] for row in rows]
+
+def term_for(mode: SearchMode, name: str) -> str:
+    words = name.split() or [name]
+    if mode == SearchMode.prefix:
+        return name[:4]
+    if mode == SearchMode.fuzzy:
+        # Drop one character so the match is approximate
+        word = max(words, key=len)
+        cut = random.randrange(len(word))
+        return word[:cut] + word[cut + 1:]
+    return max(words, key=len)
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000, help="minimum number of products to seed")
+    parser.add_argument("--queries", type=int, default=200, help="queries per search mode")
+    parser.add_argument("--limit", type=int, default=20, help="page size")
+    args = parser.parse_args()
+
+    repo = make_repo()
+    if not await repo.connect():
+        raise SystemExit("Could not connect to Postgres")
+    try:
+        service = ProductService(repo.pool)
+        rows = await seed_products(service, args.rows)
+        async with repo.pool.acquire() as conn:
+            # Merge the GIN pending list so lookups do not scan freshly seeded rows linearly
+            await conn.execute("VACUUM ANALYZE products")
+        names = await sample_terms(service, args.queries)
+
+        results = {"rows": rows, "modes": {}}
+        for mode in SearchMode:
+            samples = []
+            try:
+                for name in names:
+                    started = time.perf_counter()
+                    await service.search_products(term_for(mode, name), mode, args.limit)
+                    samples.append(time.perf_counter() - started)
+            except asyncpg.PostgresError as e:
+                results["modes"][mode.value] = {"skipped": str(e)}
+                continue
+            results["modes"][mode.value] = {"queries": len(samples), **percentiles(samples)}
+        print(json.dumps(results, indent=2))
+    finally:
+        await repo.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""Compare the pydantic response path with the orjson fast path for product listings.
+
+The benchmark drives GET /api/products/ through the ASGI app in-process, with a
+service that returns pre-built rows, so only validation and encoding are timed.
+
+Usage (from src/backend):
+
+    python -m benchmarks.bench_serialization --rows 500 --iterations 200
+"""
+import argparse, asyncio, json, time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, List
+import httpx
+import server
+from models import Product, ProductPage
+from utils import random_product
+from .common import percentiles
+
+class PrebuiltRowsService:
+    """Stands in for ProductService and returns the same page of rows on every call."""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+
+    async def list_products_page(self, *args: Any) -> ProductPage:
+        # The real service builds one Product per row, so that cost is included here
+        return ProductPage(items=[Product(**row) for row in self.rows], next_cursor=None)
+
+    async def list_product_rows(self, *args: Any) -> Dict[str, Any]:
+        return {"items": [dict(row) for row in self.rows], "next_cursor": None}
+
+def build_rows(count: int) -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc)
+    rows = []
+    for index in range(count):
+        product = random_product()
+        product.update(
+            id=index + 1,
+            price=Decimal(str(product["price"])),
+            created_at=now - timedelta(seconds=index, microseconds=index)
+        )
+        rows.append(product)
+    return rows
+
+async def run(fast: bool, rows: int, iterations: int) -> Dict[str, Any]:
+    server.FAST_JSON_RESPONSES = fast
+    transport = httpx.ASGITransport(app=server.app)
+    samples = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = await client.get("/api/products/", params={"limit": rows})
+            samples.append(time.perf_counter() - started)
+            response.raise_for_status()
+    return {"bytes": len(response.content), "requests_per_second": iterations / sum(samples), **percentiles(samples)}
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500, help="products per response (max page size is 500)")
+    parser.add_argument("--iterations", type=int, default=200, help="requests per path")
+    args = parser.parse_args()
+
+    server.product_service = PrebuiltRowsService(build_rows(args.rows))
+    results = {
+        "rows": args.rows,
+        "model_path": await run(False, args.rows, args.iterations),
+        "fast_path": await run(True, args.rows, args.iterations),
+    }
+    results["speedup_p50"] = results["model_path"]["p50_ms"] / results["fast_path"]["p50_ms"]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""Time ProductService calls over the in-memory repository, optionally next to PostgreSQL.
+
+The in-memory numbers are the service's own overhead (validation, model
+building, cursor handling); the difference to the PostgreSQL numbers is what
+the database round trip adds.
+
+Usage (from src/backend; --postgres needs the DB_* variables):
+
+    python -m benchmarks.bench_service --rows 100000 --iterations 500 --postgres
+"""
+import argparse, asyncio, json, random, time
+from typing import Any, Awaitable, Callable, Dict, List
+from models import Product, ProductFilter, ProductSortField, SearchMode, SortOrder
+from repositories import InMemoryProductRepository
+from services import ProductService
+from utils import random_product
+from .common import make_repo, percentiles, seed_products
+
+Operation = Callable[[ProductService, List[int]], Awaitable[Any]]
+
+OPERATIONS: Dict[str, Operation] = {
+    "get_product_by_id": lambda service, ids: service.get_product_by_id(random.choice(ids)),
+    "get_products_by_ids": lambda service, ids: service.get_products_by_ids(random.sample(ids, 50)),
+    "list_products_page": lambda service, ids: service.list_products_page(None, ProductSortField.price, SortOrder.desc, 50),
+    "list_product_rows": lambda service, ids: service.list_product_rows(ProductFilter(category="Test"), ProductSortField.created_at, SortOrder.asc, 50),
+    "search_prefix": lambda service, ids: service.search_products("a", SearchMode.prefix, 20),
+    "create_and_fetch_product": lambda service, ids: service.create_and_fetch_product(Product(**random_product())),
+}
+
+async def run(service: ProductService, ids: List[int], iterations: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, operation in OPERATIONS.items():
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await operation(service, ids)
+            samples.append(time.perf_counter() - started)
+        results[name] = percentiles(samples)
+    return results
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="products to load into each backend")
+    parser.add_argument("--iterations", type=int, default=500, help="calls per operation")
+    parser.add_argument("--postgres", action="store_true", help="also run against the DB_* database")
+    args = parser.parse_args()
+
+    memory = ProductService(InMemoryProductRepository())
+    started = time.perf_counter()
+    ids = await memory.create_products_bulk([Product(**random_product()) for _ in range(args.rows)])
+    results: Dict[str, Any] = {"rows": args.rows, "memory_load_seconds": time.perf_counter() - started}
+    results["memory"] = await run(memory, ids, args.iterations)
+
+    if args.postgres:
+        repo = make_repo()
+        if not await repo.connect():
+            raise SystemExit("Could not connect to Postgres")
+        try:
+            postgres = ProductService(repo.pool)
+            await seed_products(postgres, args.rows)
+            async with repo.pool.acquire() as conn:
+                pg_ids = [row["id"] for row in await conn.fetch("SELECT id FROM products ORDER BY random() LIMIT $1", args.rows)]
+            results["postgres"] = await run(postgres, pg_ids, args.iterations)
+        finally:
+            await repo.close()
+        results["database_share_p50"] = {
+            name: 1 - results["memory"][name]["p50_ms"] / results["postgres"][name]["p50_ms"] for name in OPERATIONS
+        }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+"""Compare the catalog snapshot with PostgreSQL for listings and category statistics.
+
+Memory: the first --memory-rows products are fetched and kept either as
+Product models (what a naive in-process cache would hold) or in a
+CatalogSnapshot; each figure is what stays allocated once the fetched records
+are released. Latency: ProductService calls over the PostgreSQL repository and
+over a SnapshotProductRepository loaded with the whole table.
+
+Usage (from src/backend, with the DB_* variables):
+
+    python -m benchmarks.bench_snapshot --rows 1000000 --iterations 200
+"""
+import argparse, asyncio, gc, json, random, time, tracemalloc
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, List
+from models import Product, ProductFilter, ProductSortField, SortOrder
+from repositories import CatalogSnapshot, PostgresProductRepository, SnapshotProductRepository
+from services import ProductService
+from .common import make_repo, percentiles, seed_products
+
+Operation = Callable[[ProductService], Awaitable[Any]]
+
+OPERATIONS: Dict[str, Operation] = {
+    "list_by_price_desc": lambda service: service.list_products_page(None, ProductSortField.price, SortOrder.desc, 50),
+    "list_by_name": lambda service: service.list_products_page(None, ProductSortField.name, SortOrder.asc, 50),
+    "list_category_by_created": lambda service: service.list_products_page(
+        ProductFilter(category="Test"), ProductSortField.created_at, SortOrder.desc, 50
+    ),
+    "list_small_category_by_created": lambda service: service.list_products_page(
+        ProductFilter(category="LoadTest"), ProductSortField.created_at, SortOrder.desc, 50
+    ),
+    "list_missing_category_by_price": lambda service: service.list_products_page(
+        ProductFilter(category="Books"), ProductSortField.price, SortOrder.asc, 50
+    ),
+    "list_price_range_by_price": lambda service: service.list_products_page(
+        ProductFilter(min_price=Decimal(random.randrange(100, 900)), max_price=Decimal(1000)), ProductSortField.price, SortOrder.asc, 50
+    ),
+    "list_category_price_range_by_id": lambda service: service.list_products_page(
+        ProductFilter(category="Test", min_price=Decimal(500)), ProductSortField.id, SortOrder.asc, 50
+    ),
+    "category_stats": lambda service: service.get_category_stats(),
+}
+
+async def retained_bytes(build: Callable[[List[Any]], Any], fetch: Callable[[], Awaitable[List[Any]]]) -> int:
+    """Bytes still allocated by build()'s result once the fetched rows are released."""
+    gc.collect()
+    tracemalloc.start()
+    rows = await fetch()
+    kept = build(rows)
+    del rows
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return retained
+
+async def run(service: ProductService, iterations: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, operation in OPERATIONS.items():
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await operation(service)
+            samples.append(time.perf_counter() - started)
+        results[name] = percentiles(samples)
+    return results
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000, help="products to seed the table with")
+    parser.add_argument("--memory-rows", type=int, default=200000, help="products to hold for the memory comparison")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per operation")
+    args = parser.parse_args()
+
+    repo = make_repo()
+    if not await repo.connect():
+        raise SystemExit("Could not connect to Postgres")
+    try:
+        postgres = ProductService(PostgresProductRepository(repo.pool))
+        results: Dict[str, Any] = {"rows": await seed_products(postgres, args.rows)}
+
+        async def fetch() -> List[Any]:
+            async with repo.pool.acquire() as conn:
+                return await conn.fetch("SELECT * FROM products ORDER BY id LIMIT $1", args.memory_rows)
+
+        def snapshot_of(rows: List[Any]) -> CatalogSnapshot:
+            snapshot = CatalogSnapshot()
+            snapshot.extend(rows)
+            snapshot.reindex()
+            return snapshot
+
+        models = await retained_bytes(lambda rows: [Product(**row) for row in rows], fetch)
+        columns = await retained_bytes(snapshot_of, fetch)
+        results["memory"] = {
+            "rows": args.memory_rows,
+            "product_models_bytes": models,
+            "snapshot_bytes": columns,
+            "snapshot_share": columns / models,
+        }
+
+        snapshot = SnapshotProductRepository(PostgresProductRepository(repo.pool), refresh_seconds=3600)
+        started = time.perf_counter()
+        await snapshot.load()
+        results["snapshot_load_seconds"] = time.perf_counter() - started
+        results["snapshot"] = snapshot.stats()
+
+        results["postgres_latency"] = await run(postgres, args.iterations)
+        results["snapshot_latency"] = await run(ProductService(snapshot), args.iterations)
+        results["speedup_p50"] = {
+            name: results["postgres_latency"][name]["p50_ms"] / results["snapshot_latency"][name]["p50_ms"] for name in OPERATIONS
+        }
+    finally:
+        await repo.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
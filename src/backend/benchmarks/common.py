@@ -0,0 +1,40 @@
+import os, statistics
+from typing import Dict, Optional, Sequence
+from repositories import PoolSettings, PostgresRepository
+from services import ProductService
+from utils import stream_products_csv
+
+def make_repo() -> PostgresRepository:
+    """Build a repository from the same DB_* environment variables as the server."""
+    return PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        settings=PoolSettings.from_env(),
+    )
+
+def percentiles(samples: Sequence[float]) -> Dict[str, float]:
+    """Summarize latency samples (seconds) as milliseconds."""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value, "max_ms": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50_ms": cuts[49] * 1000,
+        "p95_ms": cuts[94] * 1000,
+        "p99_ms": cuts[98] * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+async def seed_products(service: ProductService, target: int, seed: Optional[int] = None) -> int:
+    """Load generated products until the table holds at least target rows; return the row count."""
+    async with service.repository.pool.acquire() as conn:
+        count = await conn.fetchval("SELECT count(*) FROM products")
+    if count < target:
+        # Codes are unique, so a top-up must not replay the rows of an earlier seeding run
+        rows = stream_products_csv(target - count, seed=None if seed is None else [seed, count])
+        count += await service.copy_products_csv(rows)
+        print(f"seeded {count}/{target} products")
+    return count
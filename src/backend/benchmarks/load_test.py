@@ -0,0 +1,284 @@
+"""Load-test every product API endpoint and report throughput and tail latency.
+
+Seeds products through POST /api/products/bulk using utils.rand_gen.random_product,
+then runs each scenario for a fixed duration with N concurrent clients. Results
+are written as JSON so that runs can be compared against a saved baseline.
+
+Usage (from src/backend, with the server running against a local Postgres):
+
+    python -m benchmarks.load_test --seed 10000 --concurrency 32 --duration 10 --save-baseline
+    python -m benchmarks.load_test --concurrency 32 --duration 10 --compare benchmarks/results/baseline.json
+"""
+import argparse, asyncio, json, os, platform, random, sys, time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from utils import random_product
+from .common import percentiles
+
+LOAD_TEST_CATEGORY = "LoadTest"
+DISPOSABLE_CATEGORY = "LoadTestDisposable"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "baseline.json")
+
+def product_payload(category: str = LOAD_TEST_CATEGORY) -> Dict[str, Any]:
+    product = random_product()
+    product["category"] = category
+    product["created_at"] = product["created_at"].astimezone(timezone.utc).isoformat()
+    return product
+
+class LoadContext:
+    """Shared state between scenarios: seeded ids, listing cursors and ids that may be deleted."""
+
+    def __init__(self, product_ids: List[int], cursors: List[str], disposable_ids: List[int], search_terms: List[str]):
+        self.product_ids = product_ids
+        self.cursors = cursors
+        self.disposable_ids = disposable_ids
+        self.search_terms = search_terms
+
+    def random_id(self) -> int:
+        return random.choice(self.product_ids)
+
+Scenario = Callable[[httpx.AsyncClient, LoadContext], Awaitable[Optional[httpx.Response]]]
+
+async def hello(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.post("/api/hello_test", json={"username": "load"})
+
+async def create_product(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.post("/api/products/", json=product_payload(DISPOSABLE_CATEGORY))
+
+async def create_random_product(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.post("/api/products_test/")
+
+async def create_bulk(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    payload = [product_payload(DISPOSABLE_CATEGORY) for _ in range(100)]
+    return await client.post("/api/products/bulk", json=payload)
+
+async def get_product(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.get(f"/api/products/{ctx.random_id()}")
+
+async def batch_get(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    ids = random.sample(ctx.product_ids, min(50, len(ctx.product_ids)))
+    return await client.post("/api/products/batch-get", json={"ids": ids})
+
+async def update_product(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.put(f"/api/products/{ctx.random_id()}", json=product_payload())
+
+async def patch_product(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.patch(f"/api/products/{ctx.random_id()}", json={"price": "19.90"})
+
+async def patch_bulk(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    ids = random.sample(ctx.product_ids, min(50, len(ctx.product_ids)))
+    return await client.patch("/api/products/bulk", json=[{"id": i, "price": "29.90"} for i in ids])
+
+async def update_where(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    body = {"filter": {"category": LOAD_TEST_CATEGORY, "min_price": "9990"}, "price_change_percent": "0"}
+    return await client.patch("/api/products/", json=body)
+
+async def delete_product(client: httpx.AsyncClient, ctx: LoadContext) -> Optional[httpx.Response]:
+    if not ctx.disposable_ids:
+        return None
+    return await client.delete(f"/api/products/{ctx.disposable_ids.pop()}")
+
+async def delete_bulk(client: httpx.AsyncClient, ctx: LoadContext) -> Optional[httpx.Response]:
+    ids = [ctx.disposable_ids.pop() for _ in range(min(20, len(ctx.disposable_ids)))]
+    if not ids:
+        return None
+    return await client.post("/api/products/bulk-delete", json={"ids": ids})
+
+async def list_first_page(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.get("/api/products/", params={"limit": 50})
+
+async def list_filtered(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    params = {"category": LOAD_TEST_CATEGORY, "min_price": "100", "sort": "price", "order": "desc", "limit": 50}
+    return await client.get("/api/products/", params=params)
+
+async def list_deep_page(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    params = {"category": LOAD_TEST_CATEGORY, "limit": 50, "cursor": random.choice(ctx.cursors)}
+    return await client.get("/api/products/", params=params)
+
+async def search(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.get("/api/products/search", params={"q": random.choice(ctx.search_terms), "limit": 20})
+
+async def search_prefix(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    term = random.choice(ctx.search_terms)[:3]
+    return await client.get("/api/products/search", params={"q": term, "mode": "prefix", "limit": 20})
+
+async def export(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    params = {"category": LOAD_TEST_CATEGORY, "min_price": "9900", "format": "ndjson"}
+    return await client.get("/api/products/export", params=params)
+
+async def metrics(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.get("/metrics")
+
+async def pool_stats(client: httpx.AsyncClient, ctx: LoadContext) -> httpx.Response:
+    return await client.get("/api/pool/stats")
+
+SCENARIOS: Dict[str, Scenario] = {
+    "hello": hello,
+    "create_product": create_product,
+    "create_random_product": create_random_product,
+    "create_bulk_100": create_bulk,
+    "get_product": get_product,
+    "batch_get_50": batch_get,
+    "update_product": update_product,
+    "patch_product": patch_product,
+    "patch_bulk_50": patch_bulk,
+    "update_where": update_where,
+    "delete_product": delete_product,
+    "delete_bulk_20": delete_bulk,
+    "list_first_page": list_first_page,
+    "list_filtered": list_filtered,
+    "list_deep_page": list_deep_page,
+    "search": search,
+    "search_prefix": search_prefix,
+    "export_filtered": export,
+    "metrics": metrics,
+    "pool_stats": pool_stats,
+}
+
+async def seed(client: httpx.AsyncClient, count: int, category: str, chunk: int = 5000) -> List[int]:
+    """Insert count products through the bulk endpoint and return their ids."""
+    product_ids: List[int] = []
+    while len(product_ids) < count:
+        payload = [product_payload(category) for _ in range(min(chunk, count - len(product_ids)))]
+        response = await client.post("/api/products/bulk", json=payload, timeout=300)
+        response.raise_for_status()
+        product_ids.extend(response.json()["ids"])
+    return product_ids
+
+async def walk_catalog(client: httpx.AsyncClient) -> Tuple[List[int], List[str]]:
+    """Page through every load-test product, returning their ids and the cursor of each page."""
+    product_ids: List[int] = []
+    cursors: List[str] = []
+    params: Dict[str, Any] = {"category": LOAD_TEST_CATEGORY, "limit": 500}
+    while True:
+        page = (await client.get("/api/products/", params=params)).json()
+        product_ids.extend(item["id"] for item in page["items"])
+        if not page["next_cursor"]:
+            return product_ids, cursors
+        cursors.append(page["next_cursor"])
+        params["cursor"] = page["next_cursor"]
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    ctx: LoadContext,
+    scenario: Scenario,
+    concurrency: int,
+    duration: float
+) -> Dict[str, Any]:
+    samples: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await scenario(client, ctx)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if response is None:
+                return
+            samples.append(time.perf_counter() - started)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "statuses": statuses,
+        "rps": len(samples) / elapsed if elapsed else 0.0,
+        **percentiles(samples),
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return a description of every scenario whose RPS or p99 regressed beyond tolerance."""
+    regressions = []
+    print(f"\n{'scenario':<24}{'rps':>12}{'baseline':>12}{'delta':>9}{'p99 ms':>10}{'baseline':>10}{'delta':>9}")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or not previous["requests"] or not current["requests"]:
+            continue
+        rps_delta = current["rps"] / previous["rps"] - 1 if previous["rps"] else 0.0
+        p99_delta = current["p99_ms"] / previous["p99_ms"] - 1 if previous["p99_ms"] else 0.0
+        print(
+            f"{name:<24}{current['rps']:>12.1f}{previous['rps']:>12.1f}{rps_delta:>+9.1%}"
+            f"{current['p99_ms']:>10.2f}{previous['p99_ms']:>10.2f}{p99_delta:>+9.1%}"
+        )
+        if rps_delta < -tolerance or p99_delta > tolerance:
+            regressions.append(f"{name}: rps {rps_delta:+.1%}, p99 {p99_delta:+.1%}")
+    return regressions
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("LOAD_TEST_BASE_URL", "http://localhost:3000"))
+    parser.add_argument("--seed", type=int, default=10000, help="load-test products to make sure exist")
+    parser.add_argument("--disposable", type=int, default=20000, help="products created for delete scenarios")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients per scenario")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--scenarios", nargs="*", choices=sorted(SCENARIOS), help="subset of scenarios to run")
+    parser.add_argument("--output", help="where to write the JSON results (default: results/<timestamp>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write the results to {DEFAULT_BASELINE}")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a previous results file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression when comparing")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        product_ids, cursors = await walk_catalog(client)
+        if len(product_ids) < args.seed:
+            await seed(client, args.seed - len(product_ids), LOAD_TEST_CATEGORY)
+            product_ids, cursors = await walk_catalog(client)
+        disposable_ids = await seed(client, args.disposable, DISPOSABLE_CATEGORY) if args.disposable else []
+        random.shuffle(disposable_ids)
+        sample = random.sample(product_ids, min(200, len(product_ids)))
+        names = [p["name"] for p in (await client.post("/api/products/batch-get", json={"ids": sample})).json()["items"]]
+        ctx = LoadContext(product_ids, cursors or [""], disposable_ids, [max(n.split(), key=len) for n in names])
+
+        results: Dict[str, Any] = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "base_url": args.base_url,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "seeded": len(product_ids),
+                "python": platform.python_version(),
+                "host": platform.node(),
+            },
+            "scenarios": {},
+        }
+        print(f"{'scenario':<24}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name in args.scenarios or SCENARIOS:
+            stats = await run_scenario(client, ctx, SCENARIOS[name], args.concurrency, args.duration)
+            results["scenarios"][name] = stats
+            print(
+                f"{name:<24}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>10.1f}"
+                f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+            )
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    paths = [output] + ([DEFAULT_BASELINE] if args.save_baseline else [])
+    for path in paths:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nregressions beyond tolerance:\n  " + "\n  ".join(regressions))
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,53 @@
+"""Seed synthetic products at high volume with the vectorized generator in utils.rand_gen.
+
+Streams CSV straight into COPY, or writes it to a file ('-' for stdout) for
+loading elsewhere, e.g. with psql's \\copy. The same --seed always produces the
+same rows.
+
+Usage (from src/backend, with the DB_* variables set):
+
+    python -m benchmarks.seed --rows 10000000 --seed 42
+    python -m benchmarks.seed --rows 1000000 --seed 42 --csv products.csv
+"""
+import argparse, asyncio, sys, time
+from services import ProductService
+from utils import stream_products_csv
+from .common import make_repo
+
+def write_csv(path: str, chunks) -> None:
+    output = sys.stdout.buffer if path == "-" else open(path, "wb")
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, required=True, help="number of products to generate")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible data")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows generated per vectorized chunk")
+    parser.add_argument("--categories", nargs="+", default=["Test"], help="categories to spread products across")
+    parser.add_argument("--csv", metavar="PATH", help="write CSV to PATH ('-' for stdout) instead of loading the database")
+    args = parser.parse_args()
+
+    chunks = stream_products_csv(args.rows, args.chunk_size, args.seed, header=args.csv is not None, categories=args.categories)
+    started = time.perf_counter()
+    if args.csv:
+        write_csv(args.csv, chunks)
+        print(f"wrote {args.rows} products in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        return
+
+    repo = make_repo()
+    if not await repo.connect():
+        raise SystemExit("Could not connect to Postgres")
+    try:
+        loaded = await ProductService(repo.pool).copy_products_csv(chunks)
+    finally:
+        await repo.close()
+    elapsed = time.perf_counter() - started
+    print(f"loaded {loaded} products in {elapsed:.1f}s ({loaded / elapsed:.0f} rows/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,2 @@
+from .base_cache import BaseCache
+from .lru_cache import LRUCache
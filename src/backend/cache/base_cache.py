@@ -0,0 +1,34 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+class BaseCache(ABC):
+    """Key/value cache used in front of the product service.
+
+    Implementations may be in-process or backed by a shared store; the methods
+    are async so that network-backed caches fit the same interface.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if absent or expired."""
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: Any) -> None:
+        """Store value under key."""
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove key from the cache."""
+        pass
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Remove every entry from the cache."""
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Return backend counters such as size and evictions."""
+        pass
@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from .base_cache import BaseCache
+
+class LRUCache(BaseCache):
+    """In-process LRU cache whose entries also expire after a fixed TTL."""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value and mark it as recently used."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        """Store value, evicting the least recently used entry when full."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str) -> None:
+        """Remove key if present."""
+        self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the current size and eviction counters."""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,4 @@
+from .admission import AdmissionControlMiddleware, AdmissionController, AdmissionSettings
+from .compression import CompressionMiddleware, CompressionSettings
+from .metrics import MetricsMiddleware
+from .read_your_writes import ReadYourWritesMiddleware
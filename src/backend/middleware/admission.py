@@ -0,0 +1,266 @@
+import asyncio, math, os, time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+from utils.metrics import MetricsRegistry, REGISTRY
+
+# Exports hold a pooled connection for the whole stream, so only a few may run at once
+DEFAULT_ROUTE_LIMITS = {"/api/products/export": 2, "/api/products/bulk": 2}
+# Long-lived streams and scrapes must never queue behind (or be shed with) regular traffic
+DEFAULT_EXEMPT_ROUTES = ("/metrics", "/api/products/events")
+QUEUE_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Outcomes of ConcurrencyLimiter.acquire; the two refusals double as rejection reasons
+ADMITTED = "admitted"
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+
+def _parse_route_limits(value: str) -> Dict[str, int]:
+    limits = {}
+    for entry in value.split(","):
+        entry = entry.strip()
+        if entry:
+            route, _, limit = entry.rpartition("=")
+            limits[route.strip()] = int(limit)
+    return limits
+
+@dataclass
+class AdmissionSettings:
+    max_concurrency: int = 20
+    queue_size: int = 100
+    queue_timeout: float = 1.0
+    route_limits: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_ROUTE_LIMITS))
+    exempt_routes: Tuple[str, ...] = DEFAULT_EXEMPT_ROUTES
+    rate_limit: float = 0.0
+    rate_burst: float = 0.0
+    max_clients: int = 10000
+
+    @classmethod
+    def from_env(cls, pool_size: Optional[int] = None) -> "AdmissionSettings":
+        """Build admission settings from ADMISSION_* and RATE_LIMIT_* environment variables.
+
+        The shared concurrency limit defaults to twice the pool size, leaving room for
+        requests served from the cache while the rest wait here rather than on the pool.
+
+        RATE_LIMIT_PER_SECOND and RATE_LIMIT_BURST are totals for the whole server. Each of
+        the WEB_CONCURRENCY worker processes keeps its own buckets, so every worker enforces
+        its share; a client whose requests all reach one worker (one keep-alive connection)
+        is therefore held to that share rather than the full rate.
+        """
+        defaults = cls()
+        route_limits = dict(DEFAULT_ROUTE_LIMITS)
+        route_limits.update(_parse_route_limits(os.getenv("ADMISSION_ROUTE_LIMITS", "")))
+        workers = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+        rate_limit = float(os.getenv("RATE_LIMIT_PER_SECOND", defaults.rate_limit))
+        rate_burst = float(os.getenv("RATE_LIMIT_BURST", 2 * rate_limit))
+        return cls(
+            max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", 2 * pool_size if pool_size else defaults.max_concurrency)),
+            queue_size=int(os.getenv("ADMISSION_QUEUE_SIZE", defaults.queue_size)),
+            queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", defaults.queue_timeout)),
+            route_limits=route_limits,
+            rate_limit=rate_limit / workers,
+            rate_burst=rate_burst / workers,
+        )
+
+class ConcurrencyLimiter:
+    """Semaphore with a bounded FIFO wait queue and a maximum wait per request."""
+
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def full(self) -> bool:
+        """True when a new request would be rejected without waiting."""
+        return self.active >= self.limit and len(self._waiters) >= self.queue_size
+
+    async def acquire(self) -> str:
+        """Take a slot, waiting up to queue_timeout; return ADMITTED, or QUEUE_FULL or QUEUE_TIMEOUT when refused."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return ADMITTED
+        if self.full:
+            self.rejected += 1
+            return QUEUE_FULL
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        expiry = loop.call_later(self.queue_timeout, self._expire, waiter)
+        try:
+            return ADMITTED if await waiter else QUEUE_TIMEOUT
+        except asyncio.CancelledError:
+            # A slot handed over just before cancellation must be passed on, not lost
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+        finally:
+            expiry.cancel()
+
+    def _expire(self, waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            self._discard(waiter)
+            self.timed_out += 1
+            waiter.set_result(False)
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self) -> None:
+        """Hand the slot to the oldest waiter, or free it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+class TokenBucketLimiter:
+    """Per-client token buckets refilled at rate tokens per second up to burst.
+
+    Only the most recently seen max_clients buckets are kept; a client evicted
+    from the table simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.limited = 0
+
+    def take(self, client: str, now: Optional[float] = None) -> float:
+        """Spend a token for client; return 0 when allowed, otherwise seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1.0:
+            wait = 0.0
+            tokens -= 1.0
+        else:
+            wait = (1.0 - tokens) / self.rate
+            self.limited += 1
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+class AdmissionController:
+    """Per-route concurrency limiters plus optional per-client rate limiting."""
+
+    def __init__(self, settings: AdmissionSettings):
+        self.settings = settings
+        self.default = ConcurrencyLimiter(settings.max_concurrency, settings.queue_size, settings.queue_timeout)
+        self.routes = {
+            route: ConcurrencyLimiter(limit, settings.queue_size, settings.queue_timeout)
+            for route, limit in settings.route_limits.items()
+        }
+        self.rate_limiter = (
+            TokenBucketLimiter(settings.rate_limit, settings.rate_burst, settings.max_clients)
+            if settings.rate_limit > 0 else None
+        )
+
+    def limiter(self, route: str) -> Optional[ConcurrencyLimiter]:
+        """Limiter guarding route, or None for exempt routes."""
+        if route in self.settings.exempt_routes:
+            return None
+        return self.routes.get(route, self.default)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {"default": self.default.stats()}
+        stats.update((route, limiter.stats()) for route, limiter in self.routes.items())
+        return stats
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that sheds load before it reaches the database pool.
+
+    Requests wait in a bounded queue for a slot on their route's limiter; when
+    the queue is full or the wait exceeds the queue timeout they get a fast 503
+    with Retry-After. Clients over their token-bucket rate get 429.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController, registry: MetricsRegistry = REGISTRY):
+        self.app = app
+        self.controller = controller
+        self.rejections = registry.counter(
+            "http_admission_rejections_total", "Requests shed by admission control.", ("route", "reason")
+        )
+        self.queue_wait = registry.histogram(
+            "http_admission_queue_wait_seconds", "Time requests waited for an admission slot.", ("route",), QUEUE_WAIT_BUCKETS
+        )
+
+    @staticmethod
+    def _route(scope: Scope) -> str:
+        """Route template for the request, matched the same way the router will match it."""
+        app = scope.get("app")
+        for route in getattr(getattr(app, "router", None), "routes", ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                # Lets MetricsMiddleware label shed requests by route too
+                scope.setdefault("route", route)
+                return route.path
+        return scope["path"]
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send, route: str, reason: str, status_code: int, retry_after: float) -> None:
+        self.rejections.labels(route, reason).inc()
+        response = JSONResponse(
+            status_code=status_code,
+            content={"detail": f"Request rejected by admission control: {reason.replace('_', ' ')}"},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self._route(scope)
+        limiter = self.controller.limiter(route)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        rate_limiter = self.controller.rate_limiter
+        if rate_limiter is not None:
+            client: Any = scope.get("client")
+            wait = rate_limiter.take(client[0] if client else "unknown")
+            if wait > 0:
+                await self._reject(scope, receive, send, route, "rate_limited", 429, wait)
+                return
+
+        started = time.perf_counter()
+        outcome = await limiter.acquire()
+        if outcome != ADMITTED:
+            await self._reject(scope, receive, send, route, outcome, 503, limiter.queue_timeout)
+            return
+        self.queue_wait.labels(route).observe(time.perf_counter() - started)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,251 @@
+import os, zlib
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from utils.metrics import MetricsRegistry, REGISTRY
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_ENCODINGS = ("zstd", "br", "gzip")
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "application/xml")
+# Event streams are tiny messages that must reach the client the moment they are sent
+DEFAULT_EXCLUDED_TYPES = ("text/event-stream",)
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        # wbits=31 writes a gzip header and trailer rather than a bare zlib stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        """End the current block so that everything compressed so far can be decoded."""
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class BrotliCompressor:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+def available_compressors() -> Dict[str, Callable[[int], object]]:
+    """Content codings this process can produce; br and zstd need their optional packages."""
+    compressors: Dict[str, Callable[[int], object]] = {"gzip": GzipCompressor}
+    if brotli is not None:
+        compressors["br"] = BrotliCompressor
+    if zstandard is not None:
+        compressors["zstd"] = ZstdCompressor
+    return compressors
+
+def compress(encoding: str, level: int, data: bytes) -> bytes:
+    """Compress a whole body in one go."""
+    compressor = available_compressors()[encoding](level)
+    return compressor.compress(data) + compressor.finish()
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    weights: Dict[str, float] = {}
+    for entry in value.split(","):
+        coding, _, params = entry.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, raw = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(raw)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights
+
+@dataclass
+class CompressionSettings:
+    # Server preference among the codings the client accepts equally
+    encodings: Tuple[str, ...] = DEFAULT_ENCODINGS
+    min_size: int = 1024
+    # Fast levels: on product listings higher ones shrink bodies by a few percent for several times the CPU
+    levels: Dict[str, int] = field(default_factory=lambda: {"gzip": 1, "br": 1, "zstd": 1})
+    # Bodies at least this large are compressed on a worker thread so the event loop keeps serving
+    thread_min_size: int = 256 * 1024
+    excluded_types: Tuple[str, ...] = DEFAULT_EXCLUDED_TYPES
+
+    @classmethod
+    def from_env(cls) -> "CompressionSettings":
+        """Build compression settings from COMPRESSION_* environment variables.
+
+        COMPRESSION_ENCODINGS is an ordered list such as "zstd,br,gzip" (empty
+        disables compression); codings whose package is missing are skipped.
+        """
+        defaults = cls()
+        encodings = os.getenv("COMPRESSION_ENCODINGS", ",".join(defaults.encodings))
+        available = available_compressors()
+        return cls(
+            encodings=tuple(e.strip() for e in encodings.split(",") if e.strip() in available),
+            min_size=int(os.getenv("COMPRESSION_MIN_SIZE", defaults.min_size)),
+            levels={
+                "gzip": int(os.getenv("COMPRESSION_GZIP_LEVEL", defaults.levels["gzip"])),
+                "br": int(os.getenv("COMPRESSION_BROTLI_QUALITY", defaults.levels["br"])),
+                "zstd": int(os.getenv("COMPRESSION_ZSTD_LEVEL", defaults.levels["zstd"])),
+            },
+            thread_min_size=int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", defaults.thread_min_size)),
+        )
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses responses with the best coding the client accepts.
+
+    Complete bodies smaller than min_size are sent as they are. Streamed
+    bodies (more_body) are compressed as they go, flushing after every
+    message so that each chunk the application sends reaches the client
+    without waiting for the next one.
+    """
+
+    def __init__(self, app: ASGIApp, settings: Optional[CompressionSettings] = None, registry: MetricsRegistry = REGISTRY):
+        self.app = app
+        self.settings = settings or CompressionSettings()
+        available = available_compressors()
+        self.encodings = [encoding for encoding in self.settings.encodings if encoding in available]
+        self.compressors = {encoding: available[encoding] for encoding in self.encodings}
+        self.bytes_in = registry.counter(
+            "http_compression_input_bytes_total", "Response bytes before compression.", ("encoding",)
+        )
+        self.bytes_out = registry.counter(
+            "http_compression_output_bytes_total", "Response bytes after compression.", ("encoding",)
+        )
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Pick a content coding for a request, or None to send the body as is."""
+        if not accept_encoding or not self.encodings:
+            return None
+        weights = parse_accept_encoding(accept_encoding)
+        wildcard = weights.get("*", 0.0)
+        best, best_weight = None, 0.0
+        for encoding in self.encodings:
+            weight = weights.get(encoding, wildcard)
+            if weight > best_weight:
+                best, best_weight = encoding, weight
+        return best
+
+    def compressible(self, headers: Headers) -> bool:
+        if "content-encoding" in headers or "content-range" in headers:
+            return False
+        content_type = headers.get("content-type", "").lower()
+        if content_type.startswith(self.settings.excluded_types):
+            return False
+        media_type = content_type.partition(";")[0].strip()
+        return media_type.startswith(COMPRESSIBLE_TYPES) or media_type.endswith(("+json", "+xml"))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding"))
+        await self.app(scope, receive, CompressionResponder(self, encoding, send).send)
+
+class CompressionResponder:
+    """Send wrapper for one response: holds back the start message until the first body chunk decides the coding."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: Optional[str], send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.level = middleware.settings.levels.get(encoding, 0) if encoding else 0
+        self._send = send
+        self.start: Optional[Message] = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+        if self.start is not None:
+            await self._first_body(message)
+        elif self.passthrough:
+            await self._send(message)
+        else:
+            more_body = message.get("more_body", False)
+            body = await self._compress(message.get("body", b""), more_body)
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _first_body(self, message: Message) -> None:
+        start, self.start = self.start, None
+        headers = MutableHeaders(scope=start)
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not self.middleware.compressible(headers):
+            self.passthrough = True
+        else:
+            # The body differs by Accept-Encoding even when this response is not compressed
+            headers.add_vary_header("Accept-Encoding")
+            self.passthrough = self.encoding is None or (not more_body and len(body) < self.middleware.settings.min_size)
+        if self.passthrough:
+            await self._send(start)
+            await self._send(message)
+            return
+
+        headers["Content-Encoding"] = self.encoding
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # The compressed bytes are a different representation; only weak comparison still holds
+            headers["ETag"] = f"W/{etag}"
+        self.compressor = self.middleware.compressors[self.encoding](self.level)
+        compressed = await self._compress(body, more_body)
+        if more_body:
+            if "content-length" in headers:
+                del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(len(compressed))
+        await self._send(start)
+        await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    def _chunk(self, body: bytes, more_body: bool) -> bytes:
+        compressor = self.compressor
+        compressed = compressor.compress(body) + (compressor.flush() if more_body else compressor.finish())
+        self.middleware.bytes_in.labels(self.encoding).inc(len(body))
+        self.middleware.bytes_out.labels(self.encoding).inc(len(compressed))
+        return compressed
+
+    async def _compress(self, body: bytes, more_body: bool) -> bytes:
+        if len(body) >= self.middleware.settings.thread_min_size:
+            # zlib, brotli and zstd release the GIL while compressing
+            return await run_in_threadpool(self._chunk, body, more_body)
+        return self._chunk(body, more_body)
@@ -0,0 +1,39 @@
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from utils.metrics import MetricsRegistry, REGISTRY
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request latency and status counts."""
+
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry = REGISTRY):
+        self.app = app
+        self.duration = registry.histogram(
+            "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+        )
+        self.requests = registry.counter(
+            "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status")
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Label by route template rather than raw path to keep cardinality bounded
+            route_label = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            self.duration.labels(method, route_label).observe(time.perf_counter() - started)
+            self.requests.labels(method, route_label, str(status_code)).inc()
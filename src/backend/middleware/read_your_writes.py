@@ -0,0 +1,49 @@
+from http.cookies import SimpleCookie
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from repositories import ReadConsistency, bind_read_consistency
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware that keeps a client's reads on the primary for a while after it writes.
+
+    A write stamps the request's ReadConsistency; the deadline is returned as a
+    cookie and restored on the client's next requests, so replica lag cannot
+    hide the client's own changes from it.
+    """
+
+    def __init__(self, app: ASGIApp, sticky_seconds: float, cookie_name: str = READ_PRIMARY_COOKIE):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+        self.cookie_name = cookie_name
+
+    def _restore(self, scope: Scope) -> ReadConsistency:
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                morsel = SimpleCookie(value.decode("latin-1")).get(self.cookie_name)
+                if morsel is not None:
+                    try:
+                        return ReadConsistency(primary_until=float(morsel.value))
+                    except ValueError:
+                        pass
+        return ReadConsistency()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = self._restore(scope)
+        bind_read_consistency(state)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and state.wrote:
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{self.cookie_name}={state.primary_until:.3f}; Max-Age={int(self.sticky_seconds) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
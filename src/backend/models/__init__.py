@@ -1 +1,24 @@
-from .product import Product
\ No newline at end of file
+from .product import Product
+from .product_bulk import (
+    BulkInsertResult,
+    BulkRowError,
+    BulkWriteResult,
+    ProductBulkDelete,
+    ProductBulkUpdate,
+    ProductPatch,
+    ProductPatchItem,
+)
+from .product_query import (
+    ExportFormat,
+    ProductBatch,
+    ProductChanges,
+    ProductFilter,
+    ProductIds,
+    ProductPage,
+    ProductSearchHit,
+    ProductSearchPage,
+    ProductSortField,
+    SearchMode,
+    SortOrder,
+)
+from .product_stats import CatalogStats, CategoryStats
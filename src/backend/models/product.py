@@ -1,11 +1,15 @@
 from datetime import datetime
 from decimal import Decimal
 from pydantic import BaseModel
+from typing import Optional
 
 class Product(BaseModel):
+    id: Optional[int] = None
     name: str
     code: str
     description: str
     category: str
     price: Decimal
     created_at: datetime
+    version: Optional[int] = None
+    updated_at: Optional[datetime] = None
@@ -0,0 +1,39 @@
+from datetime import datetime
+from decimal import Decimal
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from .product_query import ProductFilter
+
+class BulkRowError(BaseModel):
+    index: int
+    errors: List[str]
+
+class BulkInsertResult(BaseModel):
+    inserted: int
+    ids: List[int]
+    failed: List[BulkRowError]
+    updated: int = 0
+    unchanged: int = 0
+
+class ProductPatch(BaseModel):
+    name: Optional[str] = None
+    code: Optional[str] = None
+    description: Optional[str] = None
+    category: Optional[str] = None
+    price: Optional[Decimal] = None
+    created_at: Optional[datetime] = None
+
+class ProductPatchItem(ProductPatch):
+    id: int
+
+class ProductBulkUpdate(BaseModel):
+    filter: ProductFilter
+    set: ProductPatch = ProductPatch()
+    price_change_percent: Optional[Decimal] = Field(None, gt=-100)
+
+class ProductBulkDelete(BaseModel):
+    ids: Optional[List[int]] = Field(None, min_length=1)
+    filter: Optional[ProductFilter] = None
+
+class BulkWriteResult(BaseModel):
+    affected: int
@@ -0,0 +1,56 @@
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from .product import Product
+
+class ProductSortField(str, Enum):
+    id = "id"
+    created_at = "created_at"
+    price = "price"
+    name = "name"
+
+class SortOrder(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+class ProductFilter(BaseModel):
+    category: Optional[str] = None
+    min_price: Optional[Decimal] = None
+    max_price: Optional[Decimal] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+class ProductPage(BaseModel):
+    items: List[Product]
+    next_cursor: Optional[str] = None
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+class ProductIds(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+class ProductBatch(BaseModel):
+    items: List[Product]
+    missing: List[int]
+
+class SearchMode(str, Enum):
+    fts = "fts"
+    prefix = "prefix"
+    fuzzy = "fuzzy"
+
+class ProductSearchHit(Product):
+    rank: float
+
+class ProductSearchPage(BaseModel):
+    items: List[ProductSearchHit]
+    next_offset: Optional[int] = None
+
+class ProductChanges(BaseModel):
+    items: List[Product]
+    deleted: List[int]
+    version: int
+    next_cursor: Optional[str] = None
@@ -0,0 +1,16 @@
+from decimal import Decimal
+from pydantic import BaseModel
+from typing import List, Optional
+
+class CategoryStats(BaseModel):
+    category: str
+    product_count: int
+    avg_price: Optional[Decimal]
+    min_price: Optional[Decimal]
+    max_price: Optional[Decimal]
+    recent_count: int
+
+class CatalogStats(BaseModel):
+    recent_days: int
+    total_count: int
+    categories: List[CategoryStats]
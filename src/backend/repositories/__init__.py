@@ -1,2 +1,13 @@
 from .base_repository import BaseRepository
+from .metered_pool import MeteredPool, PoolAcquireTimeout
+from .pool_settings import PoolSettings
 from .postgres_repository import PostgresRepository
+from .query_registry import Query, QueryPlanSettings, QueryRegistry
+from .read_router import ReadConsistency, ReadRouter, ReadRoutingSettings, bind_read_consistency, primary_reads
+from .product_repository import ProductRepository, ProductRow
+from .product_queries import PRODUCT_QUERIES
+from .postgres_product_repository import PostgresProductRepository
+from .product_partitions import ProductPartition, ProductPartitions
+from .memory_repository import InMemoryProductRepository
+from .catalog_snapshot import CatalogSnapshot
+from .snapshot_repository import SnapshotProductRepository
@@ -0,0 +1,451 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from decimal import ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_UP, Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from models import ProductFilter, ProductSortField, SortOrder
+from .product_repository import ProductRow
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+CENT = Decimal("0.01")
+MAX_PRICE_SCALE = 2
+INITIAL_CAPACITY = 1024
+# Rows examined per step of a filtered page walk; doubles while too few rows match
+WALK_WINDOW = 256
+# Rebuild the columns once this share of their rows belongs to deleted or rewritten products
+COMPACT_DEAD_RATIO = 0.25
+TEXT_COLUMNS = ("name", "code", "description")
+
+def _micros(value: datetime) -> int:
+    """Microseconds since the epoch; naive datetimes are taken as UTC, as timestamptz does for a UTC session."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+def _datetime(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(micros))
+
+def _cents(price: Decimal) -> Tuple[int, int]:
+    """Price as whole cents plus its decimal scale, so "9.5" and "9.50" read back as stored."""
+    text = str(price)
+    if "E" in text:
+        scale = max(0, -price.as_tuple().exponent)
+    else:
+        # Reading the scale off the plain notation is several times cheaper than as_tuple()
+        point = text.find(".")
+        scale = 0 if point < 0 else len(text) - point - 1
+    if scale > MAX_PRICE_SCALE:
+        raise ValueError(f"Price {price} has more than {MAX_PRICE_SCALE} decimal places")
+    return int(price.scaleb(MAX_PRICE_SCALE)), scale
+
+def _price(cents: int, scale: int) -> Decimal:
+    return Decimal(int(cents)).scaleb(-MAX_PRICE_SCALE).quantize(Decimal(1).scaleb(-int(scale)))
+
+def _bound_cents(price: Decimal, rounding: str) -> int:
+    return int((price * 100).to_integral_value(rounding))
+
+class SortIndex:
+    """Rows ordered by (value, id), as parallel arrays of sorted values and row numbers.
+
+    Ties on value are broken by id, read from the snapshot's id column, exactly
+    like the (column, id) keyset order of the database indexes.
+    """
+
+    def __init__(self, values: "np.ndarray", rows: "np.ndarray"):
+        """Index rows, which must be in id order so that a stable sort on value alone breaks ties by id."""
+        values = values[rows]
+        if values.dtype == object:
+            # Python's sort compares strings about twice as fast as numpy does for object arrays
+            order = np.array(sorted(range(len(values)), key=values.__getitem__), dtype=np.int64)
+        else:
+            order = np.argsort(values, kind="stable")
+        self.values = values[order]
+        self.rows = rows[order]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _tie_offsets(self, ids: "np.ndarray", lo: "np.ndarray", hi: "np.ndarray", keys: Iterable[int], side: str) -> "np.ndarray":
+        positions = lo.copy()
+        for i in np.flatnonzero(hi > lo):
+            tie_ids = ids[self.rows[lo[i]:hi[i]]]
+            positions[i] += np.searchsorted(tie_ids, keys[i], side)
+        return positions
+
+    def position(self, ids: "np.ndarray", values: Sequence[Any], keys: Sequence[int], side: str = "left") -> "np.ndarray":
+        """Positions of (value, id) keys: before equal keys with side="left", after them with "right"."""
+        values = np.asarray(values, dtype=self.values.dtype)
+        keys = np.asarray(keys, dtype=np.int64)
+        lo = np.searchsorted(self.values, values, "left")
+        hi = np.searchsorted(self.values, values, "right")
+        return self._tie_offsets(ids, lo, hi, keys, side)
+
+    def bound(self, value: Any, side: str) -> int:
+        """Position before (side="left") or after ("right") every key with this value."""
+        return int(np.searchsorted(self.values, np.asarray(value, dtype=self.values.dtype), side))
+
+    def remove(self, ids: "np.ndarray", values: Sequence[Any], keys: Sequence[int]) -> None:
+        positions = self.position(ids, values, keys)
+        self.values = np.delete(self.values, positions)
+        self.rows = np.delete(self.rows, positions)
+
+    def insert(self, ids: "np.ndarray", values: "np.ndarray", rows: "np.ndarray") -> None:
+        order = np.lexsort((ids[rows], values))
+        values, rows = values[order], rows[order]
+        positions = self.position(ids, values, ids[rows])
+        self.values = np.insert(self.values, positions, values)
+        self.rows = np.insert(self.rows, positions, rows)
+
+class CatalogSnapshot:
+    """Columnar, read-optimized copy of the products table.
+
+    Each product is one row across typed numpy columns: int64 ids, interned
+    category codes, integer-cent prices, epoch-microsecond timestamps, and
+    object columns for the text fields. Keyset pages walk a SortIndex per sort
+    field and filters are evaluated a window of rows at a time, so a page costs
+    a binary search plus the rows it inspects and no per-row Python objects
+    beyond the ones returned. apply() folds in changed and deleted products;
+    superseded rows are left in place and reclaimed by compaction.
+    """
+
+    def __init__(self):
+        if np is None:
+            raise RuntimeError("numpy is required for the catalog snapshot")
+        self.size = 0
+        self.dead = 0
+        self.version = 0
+        self.categories: List[str] = []
+        self.category_codes: Dict[str, int] = {}
+        self.columns: Dict[str, "np.ndarray"] = {}
+        self._allocate(INITIAL_CAPACITY)
+        self.indexes: Dict[ProductSortField, SortIndex] = {}
+        self._build_indexes(np.arange(0, dtype=np.int64))
+        # Values derived from the current rows (statistics, index ranks), dropped by apply()
+        self._derived: Dict[Any, Any] = {}
+
+    def _allocate(self, capacity: int) -> None:
+        dtypes = {
+            "id": np.int64, "category": np.int32, "price": np.int64, "price_scale": np.int8,
+            "created_at": np.int64, "version": np.int64, "updated_at": np.int64,
+            **{name: object for name in TEXT_COLUMNS},
+        }
+        columns = {}
+        for name, dtype in dtypes.items():
+            column = np.empty(capacity, dtype=dtype)
+            if name in self.columns:
+                column[:self.size] = self.columns[name][:self.size]
+            columns[name] = column
+        self.columns = columns
+
+    def _build_indexes(self, rows: "np.ndarray") -> None:
+        rows = rows[np.argsort(self.columns["id"][rows], kind="stable")]
+        self.indexes = {field: SortIndex(self.columns[field.value], rows) for field in ProductSortField}
+
+    def __len__(self) -> int:
+        return len(self.indexes[ProductSortField.id])
+
+    def _category_code(self, category: str) -> int:
+        code = self.category_codes.get(category)
+        if code is None:
+            code = self.category_codes[category] = len(self.categories)
+            self.categories.append(sys.intern(category))
+        return code
+
+    def _append(self, products: Sequence[ProductRow]) -> "np.ndarray":
+        """Write products to new rows at the end of the columns and return their row numbers."""
+        needed = self.size + len(products)
+        if needed > len(self.columns["id"]):
+            self._allocate(max(needed, 2 * len(self.columns["id"])))
+        rows = np.arange(self.size, needed, dtype=np.int64)
+        prices = [_cents(product["price"]) for product in products]
+        columns = self.columns
+        columns["id"][rows] = [product["id"] for product in products]
+        columns["category"][rows] = [self._category_code(product["category"]) for product in products]
+        columns["price"][rows] = [cents for cents, _ in prices]
+        columns["price_scale"][rows] = [scale for _, scale in prices]
+        columns["created_at"][rows] = [_micros(product["created_at"]) for product in products]
+        columns["version"][rows] = [product["version"] for product in products]
+        columns["updated_at"][rows] = [_micros(product["updated_at"]) for product in products]
+        for name in TEXT_COLUMNS:
+            columns[name][rows] = [product[name] for product in products]
+        self.size = needed
+        return rows
+
+    def extend(self, products: Sequence[ProductRow]) -> None:
+        """Add products not yet in the snapshot without indexing them; reindex() must follow before reads.
+
+        Bulk loads use this to sort each index once instead of merging every batch into it.
+        """
+        self._append(products)
+        self._derived = {}
+
+    def reindex(self) -> None:
+        """Rebuild the sort indexes over every row; rows that are not live must have been compacted away."""
+        self._build_indexes(np.arange(self.size, dtype=np.int64))
+        self._derived = {}
+
+    def _find(self, product_ids: Sequence[int]) -> "np.ndarray":
+        """Row numbers of the live products with these IDs, -1 where there is none."""
+        index = self.indexes[ProductSortField.id]
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if not len(index):
+            return np.full(len(product_ids), -1, dtype=np.int64)
+        positions = np.searchsorted(index.values, product_ids)
+        found = positions < len(index)
+        found[found] = index.values[positions[found]] == product_ids[found]
+        return np.where(found, index.rows[np.minimum(positions, len(index) - 1)], -1)
+
+    def apply(self, products: Sequence[ProductRow], deleted: Sequence[int] = (), version: Optional[int] = None) -> None:
+        """Insert or replace products (full rows, keyed by id) and drop deleted IDs.
+
+        Raises ValueError, leaving the snapshot unchanged, for prices it cannot
+        store exactly.
+        """
+        for product in products:
+            _cents(product["price"])
+        # The last write of an id wins, as when replaying a change feed in version order
+        latest = {product["id"]: product for product in products}
+        for product_id in deleted:
+            latest.pop(product_id, None)
+        replaced_ids = list(latest) + list(deleted)
+        old_rows = self._find(replaced_ids) if replaced_ids else np.empty(0, dtype=np.int64)
+        old_rows = old_rows[old_rows >= 0]
+
+        if len(old_rows):
+            ids = self.columns["id"]
+            for field, index in self.indexes.items():
+                index.remove(ids, self.columns[field.value][old_rows], ids[old_rows])
+            self.dead += len(old_rows)
+        if latest:
+            rows = self._append(list(latest.values()))
+            ids = self.columns["id"]
+            for field, index in self.indexes.items():
+                index.insert(ids, self.columns[field.value][rows], rows)
+        if version is not None:
+            self.version = max(self.version, version)
+        self._derived = {}
+        if self.dead > COMPACT_DEAD_RATIO * self.size:
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the columns with live rows only, in id order."""
+        rows = self.indexes[ProductSortField.id].rows
+        for name, column in self.columns.items():
+            column[:len(rows)] = column[rows]
+            if column.dtype == object:
+                # Release the text of dropped rows
+                column[len(rows):self.size] = None
+        self.size = len(rows)
+        self.dead = 0
+        self.reindex()
+
+    def row(self, row: int) -> Dict[str, Any]:
+        """One product as a dict of the same Python types the database driver returns."""
+        columns = self.columns
+        return {
+            "id": int(columns["id"][row]),
+            "name": columns["name"][row],
+            "code": columns["code"][row],
+            "description": columns["description"][row],
+            "category": self.categories[columns["category"][row]],
+            "price": _price(columns["price"][row], columns["price_scale"][row]),
+            "created_at": _datetime(columns["created_at"][row]),
+            "version": int(columns["version"][row]),
+            "updated_at": _datetime(columns["updated_at"][row]),
+        }
+
+    def _sort_key(self, sort: ProductSortField, value: Any) -> Any:
+        if sort == ProductSortField.price:
+            return _bound_cents(value, ROUND_FLOOR)
+        if sort == ProductSortField.created_at:
+            return _micros(value)
+        return value
+
+    def _range(
+        self,
+        index: SortIndex,
+        sort: ProductSortField,
+        filters: Optional[ProductFilter],
+        descending: bool,
+        after: Optional[Tuple[Any, int]]
+    ) -> Tuple[int, int]:
+        """Positions [start, end) of the index that can hold the page, from the cursor and filters on the sort column."""
+        start, end = 0, len(index)
+        if filters is not None:
+            if sort == ProductSortField.price:
+                if filters.min_price is not None:
+                    start = max(start, index.bound(_bound_cents(filters.min_price, ROUND_CEILING), "left"))
+                if filters.max_price is not None:
+                    end = min(end, index.bound(_bound_cents(filters.max_price, ROUND_FLOOR), "right"))
+            elif sort == ProductSortField.created_at:
+                if filters.created_after is not None:
+                    start = max(start, index.bound(_micros(filters.created_after), "left"))
+                if filters.created_before is not None:
+                    end = min(end, index.bound(_micros(filters.created_before), "left"))
+        if after is not None:
+            value, last_id = after
+            key = last_id if sort == ProductSortField.id else self._sort_key(sort, value)
+            ids = self.columns["id"]
+            if descending:
+                end = min(end, int(index.position(ids, [key], [last_id], "left")[0]))
+            else:
+                start = max(start, int(index.position(ids, [key], [last_id], "right")[0]))
+        return start, end
+
+    def _mask(self, rows: "np.ndarray", filters: Optional[ProductFilter]) -> Optional["np.ndarray"]:
+        """Which rows match filters, or None when every row does."""
+        if filters is None:
+            return None
+        columns = self.columns
+        mask = np.ones(len(rows), dtype=bool)
+        if filters.category is not None:
+            mask &= columns["category"][rows] == self.category_codes.get(filters.category, -1)
+        if filters.min_price is not None:
+            mask &= columns["price"][rows] >= _bound_cents(filters.min_price, ROUND_CEILING)
+        if filters.max_price is not None:
+            mask &= columns["price"][rows] <= _bound_cents(filters.max_price, ROUND_FLOOR)
+        if filters.created_after is not None:
+            mask &= columns["created_at"][rows] >= _micros(filters.created_after)
+        if filters.created_before is not None:
+            mask &= columns["created_at"][rows] < _micros(filters.created_before)
+        return mask
+
+    def _ranks(self, sort: ProductSortField) -> "np.ndarray":
+        """Position of each row in the sort index, -1 for rows no longer live."""
+        key = ("ranks", sort)
+        if key not in self._derived:
+            index = self.indexes[sort]
+            ranks = np.full(self.size, -1, dtype=np.int64)
+            ranks[index.rows] = np.arange(len(index))
+            self._derived[key] = ranks
+        return self._derived[key]
+
+    def list_products(
+        self,
+        filters: Optional[ProductFilter],
+        sort: ProductSortField,
+        order: SortOrder,
+        limit: int,
+        after: Optional[Tuple[Any, int]] = None
+    ) -> List[Dict[str, Any]]:
+        """Same contract as ProductRepository.list_products."""
+        index = self.indexes[sort]
+        descending = order == SortOrder.desc
+        start, end = self._range(index, sort, filters, descending, after)
+        if filters is not None and filters.category is not None:
+            code = self.category_codes.get(filters.category)
+            count = 0 if code is None else int(self._category_totals()["count"][code])
+            if not count:
+                return []
+            if count * count <= limit * len(self):
+                # Walking the index would pass over many rows per match; rank the category's rows instead
+                return self._list_category(code, index, sort, filters, descending, start, end, limit)
+        found: List["np.ndarray"] = []
+        remaining = limit
+        window = max(WALK_WINDOW, limit)
+        while remaining > 0 and start < end:
+            if descending:
+                rows = index.rows[max(start, end - window):end][::-1]
+                end -= len(rows)
+            else:
+                rows = index.rows[start:min(end, start + window)]
+                start += len(rows)
+            mask = self._mask(rows, filters)
+            matched = rows if mask is None else rows[mask]
+            found.append(matched[:remaining])
+            remaining -= len(found[-1])
+            window *= 2
+        return [self.row(row) for row in np.concatenate(found)] if found else []
+
+    def _list_category(
+        self,
+        code: int,
+        index: SortIndex,
+        sort: ProductSortField,
+        filters: ProductFilter,
+        descending: bool,
+        start: int,
+        end: int,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        rows = np.flatnonzero(self.columns["category"][:self.size] == code)
+        positions = self._ranks(sort)[rows]
+        positions = positions[(positions >= start) & (positions < end)]
+        positions.sort()
+        rows = index.rows[positions[::-1] if descending else positions]
+        mask = self._mask(rows, filters)
+        matched = rows if mask is None else rows[mask]
+        return [self.row(row) for row in matched[:limit]]
+
+    def _category_totals(self) -> Dict[str, "np.ndarray"]:
+        """Per-category count, price sum and extreme prices, cached until the next apply()."""
+        if "totals" not in self._derived:
+            count = len(self.categories)
+            rows = self.indexes[ProductSortField.id].rows
+            codes = self.columns["category"][rows]
+            prices = self.columns["price"][rows]
+            by_price = self.indexes[ProductSortField.price]
+            price_codes = self.columns["category"][by_price.rows]
+            positions = np.arange(len(by_price))
+            first = np.full(count, len(by_price), dtype=np.int64)
+            last = np.full(count, -1, dtype=np.int64)
+            np.minimum.at(first, price_codes, positions)
+            np.maximum.at(last, price_codes, positions)
+            sums = np.zeros(count, dtype=np.int64)
+            np.add.at(sums, codes, prices)
+            self._derived["totals"] = {
+                "count": np.bincount(codes, minlength=count),
+                "sum": sums,
+                "min_row": by_price.rows[np.minimum(first, len(by_price) - 1)] if len(by_price) else first,
+                "max_row": by_price.rows[last] if len(by_price) else last,
+            }
+        return self._derived["totals"]
+
+    def category_stats(self, recent_days: int, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Same contract as ProductRepository.get_category_stats."""
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        cutoff = _micros(today - timedelta(days=recent_days - 1))
+        key = ("stats", cutoff)
+        if key not in self._derived:
+            self._derived[key] = self._build_category_stats(cutoff)
+        return [row for row in self._derived[key] if category is None or row["category"] == category]
+
+    def _build_category_stats(self, cutoff: int) -> List[Dict[str, Any]]:
+        totals = self._category_totals()
+        by_created = self.indexes[ProductSortField.created_at]
+        recent_rows = by_created.rows[by_created.bound(cutoff, "left"):]
+        recent = np.bincount(self.columns["category"][recent_rows], minlength=len(self.categories))
+        columns = self.columns
+        stats = []
+        for name in sorted(self.category_codes):
+            code = self.category_codes[name]
+            count = int(totals["count"][code])
+            if not count:
+                continue
+            min_row, max_row = totals["min_row"][code], totals["max_row"][code]
+            stats.append({
+                "category": name,
+                "product_count": count,
+                "min_price": _price(columns["price"][min_row], columns["price_scale"][min_row]),
+                "max_price": _price(columns["price"][max_row], columns["price_scale"][max_row]),
+                "avg_price": (Decimal(int(totals["sum"][code])) / count / 100).quantize(CENT, ROUND_HALF_UP),
+                "recent_count": int(recent[code]),
+            })
+        return stats
+
+    def stats(self) -> Dict[str, int]:
+        """Row counts and the memory held by the numeric columns and indexes (text excluded)."""
+        index_bytes = sum(index.rows.nbytes + (index.values.nbytes if index.values.dtype != object else 0) for index in self.indexes.values())
+        return {
+            "products": len(self),
+            "rows": self.size,
+            "dead_rows": self.dead,
+            "version": self.version,
+            "column_bytes": sum(column.nbytes for column in self.columns.values()),
+            "index_bytes": index_bytes,
+        }
@@ -0,0 +1,510 @@
+import asyncpg, csv, heapq, io, re
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from models import Product, ProductFilter, ProductPatchItem, ProductSortField, SearchMode, SortOrder
+from utils import BATCH_COLUMNS
+from .product_repository import CsvSource, ProductRepository, ProductRow
+
+PRODUCT_FIELDS = ("name", "code", "description", "category", "price", "created_at")
+FUZZY_THRESHOLD = 0.3
+FTS_NAME_WEIGHT = 1.0
+FTS_DESCRIPTION_WEIGHT = 0.4
+WORD_PATTERN = re.compile(r"\w+")
+CENT = Decimal("0.01")
+# Sorts after every id, so (value, AFTER_ALL_IDS) is past all keys with that value
+AFTER_ALL_IDS = float("inf")
+
+def _utc(value: datetime) -> datetime:
+    """Naive datetimes are stored as UTC, as timestamptz does for a UTC session."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def _words(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+def _trigrams(text: str) -> Set[str]:
+    """Trigrams of each word, padded the way pg_trgm pads them."""
+    trigrams: Set[str] = set()
+    for word in _words(text):
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class SortedIndex:
+    """(value, id) keys kept in order, for keyset range scans in either direction."""
+
+    def __init__(self):
+        self.keys: List[Tuple[Any, int]] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, value: Any, product_id: int) -> None:
+        insort(self.keys, (value, product_id))
+
+    def add_many(self, keys: List[Tuple[Any, int]]) -> None:
+        if len(keys) == 1:
+            insort(self.keys, keys[0])
+        else:
+            # Timsort merges the appended run in about linear time, where insort would shift the list per key
+            self.keys.extend(keys)
+            self.keys.sort()
+
+    def remove(self, value: Any, product_id: int) -> None:
+        del self.keys[bisect_left(self.keys, (value, product_id))]
+
+    def scan(self, descending: bool = False, after: Optional[Tuple[Any, ...]] = None) -> Iterator[Tuple[Any, int]]:
+        """Keys in order, starting strictly after the given position (before it when descending)."""
+        keys = self.keys
+        if descending:
+            end = len(keys) if after is None else bisect_left(keys, after)
+            return (keys[i] for i in range(end - 1, -1, -1))
+        start = 0 if after is None else bisect_right(keys, after)
+        return (keys[i] for i in range(start, len(keys)))
+
+    def count_from(self, value: Any) -> int:
+        """Number of keys whose value is at least value."""
+        return len(self.keys) - bisect_left(self.keys, (value,))
+
+class InMemoryProductRepository(ProductRepository):
+    """Product storage in process memory, for tests and for profiling the service without a database.
+
+    Rows are held by id with a unique code index, and every sort field has a
+    SortedIndex both over all products and per category, so lookups, keyset
+    pages and category statistics avoid full scans much like the PostgreSQL
+    indexes do. Each write call stands for one transaction and gets its own
+    version. Search approximates PostgreSQL: fts matches all words with name
+    hits ranked above description hits, fuzzy uses pg_trgm-style trigram
+    similarity, and names sort by code point rather than collation.
+    """
+
+    def __init__(self):
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self.ids_by_code: Dict[str, int] = {}
+        self.indexes: Dict[ProductSortField, SortedIndex] = {field: SortedIndex() for field in ProductSortField}
+        self.category_indexes: Dict[str, Dict[ProductSortField, SortedIndex]] = {}
+        self.category_price_sums: Dict[str, Decimal] = {}
+        self.name_index = SortedIndex()
+        self.version_index = SortedIndex()
+        self.tombstones: Dict[int, Tuple[int, datetime]] = {}
+        self.tombstone_index = SortedIndex()
+        self.idempotency_keys: Dict[str, Tuple[bytes, int, datetime]] = {}
+        self.horizon = 0
+        self.version = 0
+        self._next_id = 1
+
+    async def connect(self) -> "InMemoryProductRepository":
+        """Nothing to connect to; returns the repository itself."""
+        return self
+
+    async def get_version(self) -> Optional[str]:
+        """Identify the backend in place of a server version."""
+        return "in-memory"
+
+    async def close(self) -> None:
+        """Nothing to release; the data lives as long as the repository."""
+
+    # Storage primitives. None of them awaits, so each call is atomic on the event loop.
+
+    def _begin(self) -> Tuple[int, datetime]:
+        """Version and timestamp shared by every row written by one call."""
+        self.version += 1
+        return self.version, datetime.now(timezone.utc)
+
+    def _check_codes(self, codes: Sequence[str], replacing: Sequence[Optional[int]] = ()) -> None:
+        """Raise like the product_codes_pkey constraint if codes would collide, before anything is written."""
+        owners = dict(zip(codes, replacing))
+        seen: Set[str] = set()
+        for code in codes:
+            owner = self.ids_by_code.get(code)
+            if code in seen or (owner is not None and owner != owners.get(code)):
+                raise asyncpg.UniqueViolationError(
+                    f'duplicate key value violates unique constraint "product_codes_pkey": Key (code)=({code}) already exists.'
+                )
+            seen.add(code)
+
+    def _category_index(self, category: str) -> Dict[ProductSortField, SortedIndex]:
+        indexes = self.category_indexes.get(category)
+        if indexes is None:
+            indexes = self.category_indexes[category] = {field: SortedIndex() for field in ProductSortField}
+            self.category_price_sums[category] = Decimal(0)
+        return indexes
+
+    def _index(self, rows: Sequence[Dict[str, Any]]) -> None:
+        by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            self.ids_by_code[row["code"]] = row["id"]
+            by_category.setdefault(row["category"], []).append(row)
+        for field, index in self.indexes.items():
+            index.add_many([(row[field.value], row["id"]) for row in rows])
+        for category, category_rows in by_category.items():
+            for field, index in self._category_index(category).items():
+                index.add_many([(row[field.value], row["id"]) for row in category_rows])
+            self.category_price_sums[category] += sum(row["price"] for row in category_rows)
+        self.name_index.add_many([(row["name"].lower(), row["id"]) for row in rows])
+        self.version_index.add_many([(row["version"], row["id"]) for row in rows])
+
+    def _unindex(self, row: Dict[str, Any]) -> None:
+        product_id = row["id"]
+        del self.ids_by_code[row["code"]]
+        category = row["category"]
+        for indexes in (self.indexes, self.category_indexes[category]):
+            for field, index in indexes.items():
+                index.remove(row[field.value], product_id)
+        self.category_price_sums[category] -= row["price"]
+        if not self.category_indexes[category][ProductSortField.id]:
+            del self.category_indexes[category]
+            del self.category_price_sums[category]
+        self.name_index.remove(row["name"].lower(), product_id)
+        self.version_index.remove(row["version"], product_id)
+
+    def _insert(self, products: Sequence[Product], version: int, now: datetime) -> List[Dict[str, Any]]:
+        rows = []
+        for product in products:
+            row = {"id": self._next_id, **{field: getattr(product, field) for field in PRODUCT_FIELDS}}
+            row.update(created_at=_utc(row["created_at"]), version=version, updated_at=now)
+            self._next_id += 1
+            self.rows[row["id"]] = row
+            rows.append(row)
+        self._index(rows)
+        return rows
+
+    def _update(self, row: Dict[str, Any], values: Dict[str, Any], version: int, now: datetime) -> None:
+        self._unindex(row)
+        row.update(values)
+        row.update(created_at=_utc(row["created_at"]), version=version, updated_at=now)
+        self._index([row])
+
+    def _delete(self, product_id: int, version: int, now: datetime) -> None:
+        self._unindex(self.rows.pop(product_id))
+        self.tombstones[product_id] = (version, now)
+        self.tombstone_index.add(version, product_id)
+
+    @staticmethod
+    def _matches(row: Dict[str, Any], filters: Optional[ProductFilter]) -> bool:
+        if filters is None:
+            return True
+        return (
+            (filters.category is None or row["category"] == filters.category)
+            and (filters.min_price is None or row["price"] >= filters.min_price)
+            and (filters.max_price is None or row["price"] <= filters.max_price)
+            and (filters.created_after is None or row["created_at"] >= _utc(filters.created_after))
+            and (filters.created_before is None or row["created_at"] < _utc(filters.created_before))
+        )
+
+    def _matching_ids(self, filters: Optional[ProductFilter]) -> List[int]:
+        """IDs of matching products in id order, narrowed through the category index when filtered by category."""
+        if filters is not None and filters.category is not None:
+            index = self.category_indexes.get(filters.category, {}).get(ProductSortField.id, SortedIndex())
+        else:
+            index = self.indexes[ProductSortField.id]
+        return [product_id for _, product_id in index.scan() if self._matches(self.rows[product_id], filters)]
+
+    # Writes
+
+    async def insert_product(self, product: Product) -> int:
+        return (await self.insert_and_fetch_product(product))["id"]
+
+    async def insert_and_fetch_product(self, product: Product) -> ProductRow:
+        self._check_codes([product.code])
+        return dict(self._insert([product], *self._begin())[0])
+
+    async def insert_products(self, products: Sequence[Product], chunk_size: int, use_copy: bool = True) -> List[int]:
+        self._check_codes([p.code for p in products])
+        return [row["id"] for row in self._insert(products, *self._begin())]
+
+    async def copy_products_csv(self, source: CsvSource) -> int:
+        if isinstance(source, bytes):
+            data = source
+        elif hasattr(source, "__aiter__"):
+            data = b"".join([chunk async for chunk in source])
+        else:
+            data = b"".join(source)
+        products = [
+            Product(**dict(zip(BATCH_COLUMNS, values)))
+            for values in csv.reader(io.StringIO(data.decode())) if values
+        ]
+        return len(await self.insert_products(products, len(products)))
+
+    async def insert_product_idempotent(self, product: Product, key: str, request_hash: bytes) -> Tuple[int, Optional[bytes]]:
+        claimed = self.idempotency_keys.get(key)
+        if claimed is not None:
+            return claimed[1], claimed[0]
+        product_id = await self.insert_product(product)
+        self.idempotency_keys[key] = (request_hash, product_id, datetime.now(timezone.utc))
+        return product_id, None
+
+    async def purge_idempotency_keys(self, older_than: datetime) -> int:
+        expired = [key for key, (_, _, created_at) in self.idempotency_keys.items() if created_at < _utc(older_than)]
+        for key in expired:
+            del self.idempotency_keys[key]
+        return len(expired)
+
+    def _overwrite(self, row: Dict[str, Any], product: Product, version: int, now: datetime) -> Optional[bool]:
+        """Write product's fields over row; False when updated, None when they already matched."""
+        values = {field: getattr(product, field) for field in PRODUCT_FIELDS}
+        values["created_at"] = _utc(values["created_at"])
+        if all(row[field] == value for field, value in values.items()):
+            return None
+        self._update(row, values, version, now)
+        return False
+
+    async def upsert_product(self, product: Product) -> Tuple[ProductRow, bool]:
+        version, now = self._begin()
+        product_id = self.ids_by_code.get(product.code)
+        if product_id is None:
+            return dict(self._insert([product], version, now)[0]), True
+        row = self.rows[product_id]
+        self._overwrite(row, product, version, now)
+        return dict(row), False
+
+    async def upsert_products(self, products: Sequence[Product], chunk_size: int) -> List[ProductRow]:
+        new = [p for p in products if p.code not in self.ids_by_code]
+        self._check_codes([p.code for p in new])
+        version, now = self._begin()
+        written: Dict[str, ProductRow] = {}
+        for product in products:
+            product_id = self.ids_by_code.get(product.code)
+            if product_id is not None:
+                inserted = self._overwrite(self.rows[product_id], product, version, now)
+                written[product.code] = {"id": product_id, "code": product.code, "inserted": inserted}
+        for row in self._insert(new, version, now):
+            written[row["code"]] = {"id": row["id"], "code": row["code"], "inserted": True}
+        return [written[p.code] for p in products]
+
+    async def update_product(self, product_id: int, product: Product) -> bool:
+        row = self.rows.get(product_id)
+        if row is None:
+            return False
+        self._check_codes([product.code], [product_id])
+        self._update(row, {field: getattr(product, field) for field in PRODUCT_FIELDS}, *self._begin())
+        return True
+
+    async def delete_product(self, product_id: int) -> bool:
+        return bool(await self.delete_products([product_id]))
+
+    def _apply(self, changes: Dict[int, Dict[str, Any]]) -> List[int]:
+        """Write per-product changes as one transaction, after checking the new codes."""
+        codes = {product_id: values["code"] for product_id, values in changes.items() if "code" in values}
+        self._check_codes(list(codes.values()), list(codes))
+        version, now = self._begin()
+        for product_id, values in changes.items():
+            self._update(self.rows[product_id], values, version, now)
+        return list(changes)
+
+    async def patch_products(self, patches: Sequence[ProductPatchItem]) -> List[int]:
+        changes: Dict[int, Dict[str, Any]] = {}
+        for patch in patches:
+            if patch.id in self.rows:
+                # The last patch of a product wins, as with the UPDATE ... FROM unnest() join
+                changes[patch.id] = patch.model_dump(exclude={"id"}, exclude_none=True)
+        return self._apply(changes)
+
+    async def update_products_where(
+        self,
+        filters: ProductFilter,
+        values: Dict[str, Any],
+        price_change_percent: Optional[Decimal] = None
+    ) -> List[int]:
+        changes: Dict[int, Dict[str, Any]] = {}
+        for product_id in self._matching_ids(filters):
+            changes[product_id] = dict(values)
+            if price_change_percent is not None:
+                price = self.rows[product_id]["price"] * (1 + price_change_percent / 100)
+                changes[product_id]["price"] = price.quantize(CENT, ROUND_HALF_UP)
+        return self._apply(changes)
+
+    async def delete_products(self, product_ids: Sequence[int]) -> List[int]:
+        deleted = [product_id for product_id in dict.fromkeys(product_ids) if product_id in self.rows]
+        if deleted:
+            version, now = self._begin()
+            for product_id in deleted:
+                self._delete(product_id, version, now)
+        return deleted
+
+    async def delete_products_where(self, filters: ProductFilter) -> List[int]:
+        return await self.delete_products(self._matching_ids(filters))
+
+    # Reads
+
+    async def get_product(self, product_id: int) -> Optional[ProductRow]:
+        row = self.rows.get(product_id)
+        return dict(row) if row is not None else None
+
+    async def get_products(self, product_ids: Sequence[int]) -> List[ProductRow]:
+        return [dict(self.rows[product_id]) for product_id in set(product_ids) if product_id in self.rows]
+
+    async def list_products(
+        self,
+        filters: Optional[ProductFilter],
+        sort: ProductSortField,
+        order: SortOrder,
+        limit: int,
+        after: Optional[Tuple[Any, int]] = None
+    ) -> List[ProductRow]:
+        if filters is not None and filters.category is not None:
+            indexes = self.category_indexes.get(filters.category)
+            if indexes is None:
+                return []
+        else:
+            indexes = self.indexes
+        descending = order == SortOrder.desc
+        position: Optional[Tuple[Any, ...]] = None
+        if after is not None:
+            value, last_id = after
+            position = (_utc(value) if isinstance(value, datetime) else value, last_id)
+
+        # Seek past rows that the filter on the sort column rules out, and stop at its other bound
+        past_end: Callable[[Any], bool] = lambda value: False
+        low, high = self._bounds(sort, filters)
+        if descending:
+            if high is not None and (position is None or high < position):
+                position = high
+            if low is not None:
+                past_end = lambda value: value < low[0]
+        else:
+            if low is not None and (position is None or low > position):
+                position = low
+            if high is not None:
+                past_end = lambda value: (value,) >= high
+
+        rows = []
+        for value, product_id in indexes[sort].scan(descending, position):
+            if past_end(value):
+                break
+            row = self.rows[product_id]
+            if self._matches(row, filters):
+                rows.append(dict(row))
+                if len(rows) >= limit:
+                    break
+        return rows
+
+    @staticmethod
+    def _bounds(sort: ProductSortField, filters: Optional[ProductFilter]) -> Tuple[Optional[Tuple[Any, ...]], Optional[Tuple[Any, ...]]]:
+        """Exclusive (low, high) scan positions implied by a filter on the sort column."""
+        if filters is None:
+            return None, None
+        if sort == ProductSortField.price:
+            low = (filters.min_price,) if filters.min_price is not None else None
+            high = (filters.max_price, AFTER_ALL_IDS) if filters.max_price is not None else None
+            return low, high
+        if sort == ProductSortField.created_at:
+            low = (_utc(filters.created_after),) if filters.created_after is not None else None
+            high = (_utc(filters.created_before),) if filters.created_before is not None else None
+            return low, high
+        return None, None
+
+    async def search_products(self, text: str, mode: SearchMode, limit: int, offset: int) -> List[ProductRow]:
+        if mode == SearchMode.prefix:
+            prefix = text.lower()
+            hits = []
+            for name, product_id in self.name_index.scan(after=(prefix,)):
+                if not name.startswith(prefix):
+                    break
+                hits.append((1.0, product_id))
+            hits = hits[offset:offset + limit]
+        else:
+            if mode == SearchMode.fts:
+                query: Any = self._fts_query(text)
+                score = self._fts_rank
+            else:
+                query = _trigrams(text)
+                score = self._fuzzy_rank
+            ranked = ((score(query, row), product_id) for product_id, row in self.rows.items())
+            hits = heapq.nsmallest(offset + limit, ((-rank, product_id) for rank, product_id in ranked if rank is not None))
+            hits = [(-rank, product_id) for rank, product_id in hits[offset:]]
+        return [{**self.rows[product_id], "rank": rank} for rank, product_id in hits]
+
+    @staticmethod
+    def _fts_query(text: str) -> Tuple[Set[str], Set[str]]:
+        """Required and excluded words of a websearch_to_tsquery-style query (phrases match as plain words)."""
+        required: Set[str] = set()
+        excluded: Set[str] = set()
+        for term in text.split():
+            if term.lower() == "or":
+                continue
+            (excluded if term.startswith("-") else required).update(_words(term))
+        return required, excluded
+
+    @staticmethod
+    def _fts_rank(query: Tuple[Set[str], Set[str]], row: Dict[str, Any]) -> Optional[float]:
+        required, excluded = query
+        if not required:
+            return None
+        name, description = set(_words(row["name"])), set(_words(row["description"]))
+        if not required <= (name | description) or excluded & (name | description):
+            return None
+        return sum(FTS_NAME_WEIGHT if word in name else FTS_DESCRIPTION_WEIGHT for word in required)
+
+    @staticmethod
+    def _fuzzy_rank(query: Set[str], row: Dict[str, Any]) -> Optional[float]:
+        similarity = _similarity(query, _trigrams(row["name"]))
+        return similarity if similarity >= FUZZY_THRESHOLD else None
+
+    async def export_products(self, filters: Optional[ProductFilter], batch_size: int) -> AsyncIterator[List[ProductRow]]:
+        product_ids = self._matching_ids(filters)
+        for start in range(0, len(product_ids), batch_size):
+            yield [
+                {key: value for key, value in self.rows[product_id].items() if key not in ("version", "updated_at")}
+                for product_id in product_ids[start:start + batch_size]
+                # Deleted while the export was paused between batches
+                if product_id in self.rows
+            ]
+
+    async def get_category_stats(self, recent_days: int, category: Optional[str] = None) -> List[ProductRow]:
+        # Products created on the last recent_days UTC days, today included
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        cutoff = today - timedelta(days=recent_days - 1)
+        stats = []
+        for name in sorted(self.category_indexes):
+            if category is not None and name != category:
+                continue
+            indexes = self.category_indexes[name]
+            prices = indexes[ProductSortField.price].keys
+            count = len(prices)
+            stats.append({
+                "category": name,
+                "product_count": count,
+                "min_price": prices[0][0],
+                "max_price": prices[-1][0],
+                "avg_price": (self.category_price_sums[name] / count).quantize(CENT, ROUND_HALF_UP),
+                "recent_count": indexes[ProductSortField.created_at].count_from(cutoff),
+            })
+        return stats
+
+    async def refresh_category_stats(self) -> None:
+        """Statistics are read from the live indexes, so there is nothing to rebuild."""
+
+    async def get_changes(self, since: int, last_id: int, limit: int) -> Tuple[int, int, List[ProductRow]]:
+        # Every call has finished writing, so no version below the next one can still appear
+        safe_version = self.version + 1
+        if not self.horizon <= since < safe_version:
+            return self.horizon, safe_version, []
+        position = (since, last_id)
+        changes = heapq.merge(
+            ((key, False) for key in self.version_index.scan(after=position)),
+            ((key, True) for key in self.tombstone_index.scan(after=position)),
+        )
+        rows: List[ProductRow] = []
+        for (version, product_id), deleted in changes:
+            if len(rows) >= limit:
+                break
+            if deleted:
+                rows.append({"id": product_id, "version": version, "deleted": True})
+            else:
+                rows.append({**self.rows[product_id], "deleted": False})
+        return self.horizon, safe_version, rows
+
+    async def purge_tombstones(self, older_than: datetime) -> int:
+        purged = [product_id for product_id, (_, deleted_at) in self.tombstones.items() if deleted_at < _utc(older_than)]
+        for product_id in purged:
+            version, _ = self.tombstones.pop(product_id)
+            self.tombstone_index.remove(version, product_id)
+            self.horizon = max(self.horizon, version)
+        return len(purged)
@@ -0,0 +1,69 @@
+import asyncio, asyncpg, time
+from typing import Any, Dict, Optional
+from utils import Histogram
+
+class PoolAcquireTimeout(Exception):
+    """Raised when no pool connection became available within the acquire timeout."""
+    pass
+
+class _MeteredAcquire:
+    def __init__(self, metered: "MeteredPool", timeout: Optional[float]):
+        self.metered = metered
+        self.timeout = timeout
+        self.conn: Optional[asyncpg.Connection] = None
+
+    async def _acquire(self) -> asyncpg.Connection:
+        metered = self.metered
+        metered.waiting += 1
+        started = time.perf_counter()
+        try:
+            return await metered.pool.acquire(timeout=self.timeout)
+        except asyncio.TimeoutError as e:
+            metered.timeouts += 1
+            raise PoolAcquireTimeout(f"Timed out after {self.timeout}s waiting for a database connection") from e
+        finally:
+            metered.waiting -= 1
+            metered.acquire_wait.observe(time.perf_counter() - started)
+
+    async def __aenter__(self) -> asyncpg.Connection:
+        self.conn = await self._acquire()
+        return self.conn
+
+    async def __aexit__(self, *exc: Any) -> None:
+        conn, self.conn = self.conn, None
+        await self.metered.pool.release(conn)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+class MeteredPool:
+    """Wrapper around asyncpg.Pool that applies an acquire timeout and records wait times."""
+
+    def __init__(self, pool: asyncpg.Pool, acquire_timeout: Optional[float] = None):
+        self.pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.acquire_wait = Histogram()
+        self.waiting = 0
+        self.timeouts = 0
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _MeteredAcquire:
+        """Acquire a connection, usable both as `async with` and `await`."""
+        return _MeteredAcquire(self, timeout if timeout is not None else self.acquire_timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Report pool occupancy and the acquire wait-time histogram."""
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        return {
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size(),
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "waiting": self.waiting,
+            "acquire_timeouts": self.timeouts,
+            "acquire_wait_seconds": self.acquire_wait.snapshot(),
+        }
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool, name)
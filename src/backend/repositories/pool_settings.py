@@ -0,0 +1,51 @@
+import os
+from dataclasses import dataclass, replace
+from typing import Optional
+
+DEFAULT_RESERVED_CONNECTIONS = 5
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return float(value)
+
+@dataclass
+class PoolSettings:
+    min_size: int = 1
+    max_size: int = 10
+    acquire_timeout: Optional[float] = 10.0
+    max_inactive_connection_lifetime: float = 300.0
+    statement_cache_size: int = 100
+    command_timeout: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        """Build pool settings from DB_POOL_* / DB_* environment variables."""
+        defaults = cls()
+        settings = cls(
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", defaults.min_size)),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", defaults.max_size)),
+            acquire_timeout=_env_float("DB_POOL_ACQUIRE_TIMEOUT", defaults.acquire_timeout),
+            max_inactive_connection_lifetime=_env_float(
+                "DB_POOL_MAX_INACTIVE_LIFETIME", defaults.max_inactive_connection_lifetime
+            ),
+            statement_cache_size=int(os.getenv("DB_STATEMENT_CACHE_SIZE", defaults.statement_cache_size)),
+            command_timeout=_env_float("DB_COMMAND_TIMEOUT", defaults.command_timeout),
+        )
+        max_connections = os.getenv("DB_MAX_CONNECTIONS")
+        if max_connections:
+            settings = settings.within_budget(
+                int(max_connections),
+                int(os.getenv("WEB_CONCURRENCY", "1")),
+                int(os.getenv("DB_RESERVED_CONNECTIONS", DEFAULT_RESERVED_CONNECTIONS)),
+            )
+        return settings
+
+    def within_budget(self, max_connections: int, workers: int, reserved: int = DEFAULT_RESERVED_CONNECTIONS) -> "PoolSettings":
+        """Shrink max_size so that workers processes, each holding a pool plus one LISTEN connection, fit in max_connections."""
+        per_worker = (max_connections - reserved) // max(workers, 1) - 1
+        if per_worker < 1:
+            raise ValueError(f"max_connections={max_connections} cannot serve {workers} workers with {reserved} reserved connections")
+        max_size = min(self.max_size, per_worker)
+        return replace(self, max_size=max_size, min_size=min(self.min_size, max_size))
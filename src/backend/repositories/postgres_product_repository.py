@@ -0,0 +1,430 @@
+import asyncpg
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+from models import Product, ProductFilter, ProductPatchItem, ProductSortField, SearchMode, SortOrder
+from utils import BATCH_COLUMNS
+from . import product_queries as sql
+from .product_queries import PRODUCT_QUERIES
+from .product_repository import CsvSource, ProductRepository, ProductRow
+from .query_registry import Query
+from .read_router import ReadRouter
+
+PRODUCT_INSERT_COLUMNS = ["id", "name", "code", "description", "category", "price", "created_at"]
+
+async def _as_async_chunks(source: Union[bytes, Iterable[bytes], AsyncIterable[bytes]]) -> AsyncIterator[bytes]:
+    if isinstance(source, bytes):
+        yield source
+    elif hasattr(source, "__aiter__"):
+        async for chunk in source:
+            yield chunk
+    else:
+        for chunk in source:
+            yield chunk
+
+class PostgresProductRepository(ProductRepository):
+    """Product storage on the pools of a PostgresRepository.
+
+    The pools belong to the PostgresRepository that created them, which also
+    closes them; reads go to a replica when a ReadRouter is given.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, reads: Optional[ReadRouter] = None):
+        self.pool = pool
+        self.reads = reads
+
+    def _read_pool(self) -> asyncpg.Pool:
+        """Pool for read-only queries: a replica when routing is configured, else the primary."""
+        return self.reads.for_read() if self.reads else self.pool
+
+    def _write_pool(self) -> asyncpg.Pool:
+        """Primary pool for writes; also starts read-your-writes stickiness for the caller."""
+        if self.reads:
+            self.reads.note_write()
+        return self.pool
+
+    async def connect(self) -> Optional[asyncpg.Pool]:
+        """Return the primary pool; it is created by the owning PostgresRepository."""
+        return self.pool
+
+    async def get_version(self) -> Optional[str]:
+        """Retrieve the PostgreSQL version."""
+        if self.pool:
+            async with self.pool.acquire() as conn:
+                return await conn.fetchval('SELECT version()')
+        return None
+
+    async def close(self) -> None:
+        """Nothing to release; the owning PostgresRepository closes the pools."""
+
+    async def insert_product(self, product: Product) -> int:
+        async with self._write_pool().acquire() as conn:
+            return await PRODUCT_QUERIES.fetchval(
+                conn,
+                sql.INSERT_PRODUCT,
+                product.name,
+                product.code,
+                product.description,
+                product.category,
+                product.price,
+                product.created_at
+            )
+
+    async def insert_and_fetch_product(self, product: Product) -> ProductRow:
+        async with self._write_pool().acquire() as conn:
+            return await PRODUCT_QUERIES.fetchrow(
+                conn,
+                sql.INSERT_AND_FETCH_PRODUCT,
+                product.name,
+                product.code,
+                product.description,
+                product.category,
+                product.price,
+                product.created_at
+            )
+
+    async def insert_products(self, products: Sequence[Product], chunk_size: int, use_copy: bool = True) -> List[int]:
+        product_ids: List[int] = []
+        async with self._write_pool().acquire() as conn:
+            async with conn.transaction():
+                for start in range(0, len(products), chunk_size):
+                    chunk = products[start:start + chunk_size]
+                    if use_copy:
+                        product_ids.extend(await self._copy_chunk(conn, chunk))
+                    else:
+                        product_ids.extend(await self._insert_chunk(conn, chunk))
+        return product_ids
+
+    @staticmethod
+    async def _copy_chunk(conn: asyncpg.Connection, products: Sequence[Product]) -> List[int]:
+        """COPY a chunk of products, reserving their IDs from the sequence first."""
+        product_ids = [row[0] for row in await PRODUCT_QUERIES.fetch(conn, sql.RESERVE_PRODUCT_IDS, len(products))]
+        records = [
+            (product_id, p.name, p.code, p.description, p.category, p.price, p.created_at)
+            for product_id, p in zip(product_ids, products)
+        ]
+        await conn.copy_records_to_table("products", records=records, columns=PRODUCT_INSERT_COLUMNS)
+        return product_ids
+
+    @staticmethod
+    async def _insert_chunk(conn: asyncpg.Connection, products: Sequence[Product]) -> List[int]:
+        """Insert a chunk of products with a single multi-row INSERT over unnest()."""
+        rows = await PRODUCT_QUERIES.fetch(
+            conn,
+            sql.INSERT_PRODUCTS,
+            [p.name for p in products],
+            [p.code for p in products],
+            [p.description for p in products],
+            [p.category for p in products],
+            [p.price for p in products],
+            [p.created_at for p in products]
+        )
+        return [row["id"] for row in rows]
+
+    async def copy_products_csv(self, source: CsvSource) -> int:
+        async with self._write_pool().acquire() as conn:
+            status = await conn.copy_to_table(
+                "products",
+                source=_as_async_chunks(source),
+                columns=list(BATCH_COLUMNS),
+                format="csv"
+            )
+        return int(status.split()[-1])
+
+    async def insert_product_idempotent(self, product: Product, key: str, request_hash: bytes) -> Tuple[int, Optional[bytes]]:
+        async with self._write_pool().acquire() as conn:
+            product_id = await PRODUCT_QUERIES.fetchval(
+                conn,
+                sql.INSERT_PRODUCT_IDEMPOTENT,
+                key,
+                request_hash,
+                product.name,
+                product.code,
+                product.description,
+                product.category,
+                product.price,
+                product.created_at
+            )
+            if product_id is None:
+                row = await PRODUCT_QUERIES.fetchrow(conn, sql.GET_IDEMPOTENCY_KEY, key)
+                return row["product_id"], row["request_hash"]
+        return product_id, None
+
+    async def purge_idempotency_keys(self, older_than: datetime) -> int:
+        async with self._write_pool().acquire() as conn:
+            result = await PRODUCT_QUERIES.execute(conn, sql.PURGE_IDEMPOTENCY_KEYS, older_than)
+        return int(result.split()[-1])
+
+    async def upsert_product(self, product: Product) -> Tuple[ProductRow, bool]:
+        async with self._write_pool().acquire() as conn:
+            async with conn.transaction():
+                product_id, inserted, row = (await self._upsert_chunk(conn, [product]))[product.code]
+                if row is None:
+                    # Unchanged: the locked row is returned as stored
+                    row = await PRODUCT_QUERIES.fetchrow(conn, sql.GET_PRODUCT_BY_ID, product_id)
+        return dict(row), inserted is True
+
+    async def upsert_products(self, products: Sequence[Product], chunk_size: int) -> List[ProductRow]:
+        written: Dict[str, ProductRow] = {}
+        async with self._write_pool().acquire() as conn:
+            async with conn.transaction():
+                for start in range(0, len(products), chunk_size):
+                    chunk = await self._upsert_chunk(conn, products[start:start + chunk_size])
+                    for code, (product_id, inserted, _) in chunk.items():
+                        written[code] = {"id": product_id, "code": code, "inserted": inserted}
+        return [written[p.code] for p in products]
+
+    @staticmethod
+    async def _upsert_chunk(
+        conn: asyncpg.Connection,
+        products: Sequence[Product]
+    ) -> Dict[str, Tuple[int, Optional[bool], Optional[ProductRow]]]:
+        """Lock the products holding the codes or claim the new ones, then insert the new ones and update the changed ones.
+
+        Must run in a transaction, which holds the locks. Returns the id, inserted
+        (None when already identical) and written row per code.
+        """
+        ids: Dict[str, int] = {}
+        claimed: Set[str] = set()
+        pending = sorted(p.code for p in products)
+        while pending:
+            rows = await PRODUCT_QUERIES.fetch(conn, sql.LOCK_CODED_PRODUCTS, pending)
+            ids.update((row["code"], row["id"]) for row in rows if row["current"])
+            taken = {row["code"] for row in rows}
+            new_codes = [code for code in pending if code not in taken]
+            if new_codes:
+                rows = await PRODUCT_QUERIES.fetch(conn, sql.CLAIM_PRODUCT_CODES, new_codes)
+                ids.update((row["code"], row["product_id"]) for row in rows)
+                claimed.update(row["code"] for row in rows)
+            # Codes that moved to another product, or were claimed by another transaction, are locked next
+            pending = [code for code in pending if code not in ids]
+        written: Dict[str, Tuple[int, Optional[bool], Optional[ProductRow]]] = {
+            code: (product_id, None, None) for code, product_id in ids.items()
+        }
+        new = [p for p in products if p.code in claimed]
+        if new:
+            rows = await PRODUCT_QUERIES.fetch(
+                conn,
+                sql.INSERT_CLAIMED_PRODUCTS,
+                [ids[p.code] for p in new],
+                [p.name for p in new],
+                [p.code for p in new],
+                [p.description for p in new],
+                [p.category for p in new],
+                [p.price for p in new],
+                [p.created_at for p in new]
+            )
+            written.update((row["code"], (row["id"], True, row)) for row in rows)
+        existing = [p for p in products if p.code not in claimed]
+        if len(existing) == 1:
+            p = existing[0]
+            rows = await PRODUCT_QUERIES.fetch(
+                conn, sql.UPDATE_CLAIMED_PRODUCT, ids[p.code], p.name, p.description, p.category, p.price, p.created_at
+            )
+            written.update((row["code"], (row["id"], False, row)) for row in rows)
+        elif existing:
+            rows = await PRODUCT_QUERIES.fetch(
+                conn,
+                sql.UPDATE_CLAIMED_PRODUCTS,
+                [ids[p.code] for p in existing],
+                [p.name for p in existing],
+                [p.description for p in existing],
+                [p.category for p in existing],
+                [p.price for p in existing],
+                [p.created_at for p in existing]
+            )
+            written.update((row["code"], (row["id"], False, row)) for row in rows)
+        return written
+
+    async def get_product(self, product_id: int) -> Optional[ProductRow]:
+        async with self._read_pool().acquire() as conn:
+            return await PRODUCT_QUERIES.fetchrow(conn, sql.GET_PRODUCT_BY_ID, product_id)
+
+    async def get_products(self, product_ids: Sequence[int]) -> List[ProductRow]:
+        async with self._read_pool().acquire() as conn:
+            return await PRODUCT_QUERIES.fetch(conn, sql.GET_PRODUCTS_BY_IDS, list(set(product_ids)))
+
+    async def update_product(self, product_id: int, product: Product) -> bool:
+        async with self._write_pool().acquire() as conn:
+            result = await PRODUCT_QUERIES.execute(
+                conn,
+                sql.UPDATE_PRODUCT,
+                product.name,
+                product.code,
+                product.description,
+                product.category,
+                product.price,
+                product.created_at,
+                product_id
+            )
+        return result == 'UPDATE 1'
+
+    async def delete_product(self, product_id: int) -> bool:
+        async with self._write_pool().acquire() as conn:
+            result = await PRODUCT_QUERIES.execute(conn, sql.DELETE_PRODUCT, product_id)
+        return result == 'DELETE 1'
+
+    async def patch_products(self, patches: Sequence[ProductPatchItem]) -> List[int]:
+        async with self._write_pool().acquire() as conn:
+            rows = await PRODUCT_QUERIES.fetch(
+                conn,
+                sql.PATCH_PRODUCTS,
+                [patch.id for patch in patches],
+                [patch.name for patch in patches],
+                [patch.code for patch in patches],
+                [patch.description for patch in patches],
+                [patch.category for patch in patches],
+                [patch.price for patch in patches],
+                [patch.created_at for patch in patches]
+            )
+        return [row["id"] for row in rows]
+
+    async def update_products_where(
+        self,
+        filters: ProductFilter,
+        values: Dict[str, Any],
+        price_change_percent: Optional[Decimal] = None
+    ) -> List[int]:
+        conditions, args = self._filter_conditions(filters)
+        assignments = []
+        for column, value in values.items():
+            args.append(value)
+            assignments.append(f"{column} = ${len(args)}")
+        if price_change_percent is not None:
+            args.append(price_change_percent)
+            assignments.append(f"price = round(price * (1 + ${len(args)}::decimal / 100), 2)")
+
+        query = Query("update_products_where", f"""
+        UPDATE products
+        SET {', '.join(assignments)}
+        WHERE {' AND '.join(conditions)}
+        RETURNING id;
+        """)
+        async with self._write_pool().acquire() as conn:
+            rows = await PRODUCT_QUERIES.fetch(conn, query, *args)
+        return [row["id"] for row in rows]
+
+    async def delete_products(self, product_ids: Sequence[int]) -> List[int]:
+        async with self._write_pool().acquire() as conn:
+            rows = await PRODUCT_QUERIES.fetch(conn, sql.DELETE_PRODUCTS, list(product_ids))
+        return [row["id"] for row in rows]
+
+    async def delete_products_where(self, filters: ProductFilter) -> List[int]:
+        conditions, args = self._filter_conditions(filters)
+        query = Query("delete_products_where", f"""
+        DELETE FROM products WHERE {' AND '.join(conditions)}
+        RETURNING id;
+        """)
+        async with self._write_pool().acquire() as conn:
+            rows = await PRODUCT_QUERIES.fetch(conn, query, *args)
+        return [row["id"] for row in rows]
+
+    async def list_products(
+        self,
+        filters: Optional[ProductFilter],
+        sort: ProductSortField,
+        order: SortOrder,
+        limit: int,
+        after: Optional[Tuple[Any, int]] = None
+    ) -> List[ProductRow]:
+        conditions, args = self._filter_conditions(filters)
+        direction = "ASC" if order == SortOrder.asc else "DESC"
+        comparator = ">" if order == SortOrder.asc else "<"
+
+        if after:
+            value, last_id = after
+            if sort == ProductSortField.id:
+                args.append(last_id)
+                conditions.append(f"id {comparator} ${len(args)}")
+            else:
+                args.extend([value, last_id])
+                conditions.append(f"({sort.value}, id) {comparator} (${len(args) - 1}, ${len(args)})")
+
+        order_by = f"id {direction}" if sort == ProductSortField.id else f"{sort.value} {direction}, id {direction}"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        args.append(limit)
+        query = Query("list_products_page", f"""
+        SELECT {sql.PRODUCT_COLUMNS}
+        FROM products
+        {where}
+        ORDER BY {order_by}
+        LIMIT ${len(args)};
+        """)
+        async with self._read_pool().acquire() as conn:
+            return await PRODUCT_QUERIES.fetch(conn, query, *args)
+
+    async def search_products(self, text: str, mode: SearchMode, limit: int, offset: int) -> List[ProductRow]:
+        if mode == SearchMode.fts:
+            query = sql.SEARCH_FTS
+            pattern = text
+        elif mode == SearchMode.prefix:
+            query = sql.SEARCH_PREFIX
+            escaped = text.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            pattern = escaped + "%"
+        else:
+            query = sql.SEARCH_FUZZY
+            pattern = text
+
+        async with self._read_pool().acquire() as conn:
+            return await PRODUCT_QUERIES.fetch(conn, query, pattern, limit, offset)
+
+    async def export_products(self, filters: Optional[ProductFilter], batch_size: int) -> AsyncIterator[List[ProductRow]]:
+        conditions, args = self._filter_conditions(filters)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+        SELECT id, name, code, description, category, price, created_at
+        FROM products
+        {where}
+        ORDER BY id;
+        """
+        async with self._read_pool().acquire() as conn:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(query, *args)
+                while True:
+                    rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    async def get_category_stats(self, recent_days: int, category: Optional[str] = None) -> List[ProductRow]:
+        async with self._read_pool().acquire() as conn:
+            return await PRODUCT_QUERIES.fetch(conn, sql.GET_CATEGORY_STATS, recent_days, category)
+
+    async def refresh_category_stats(self) -> None:
+        async with self._write_pool().acquire() as conn:
+            await PRODUCT_QUERIES.execute(conn, sql.REFRESH_CATEGORY_STATS)
+
+    async def get_changes(self, since: int, last_id: int, limit: int) -> Tuple[int, int, List[ProductRow]]:
+        # Always the primary: a replica's snapshot horizon says nothing about the primary's
+        async with self.pool.acquire() as conn:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                horizon, safe_version = await PRODUCT_QUERIES.fetchrow(conn, sql.GET_CHANGES_HORIZON)
+                if not horizon <= since < safe_version:
+                    return horizon, safe_version, []
+                rows = await PRODUCT_QUERIES.fetch(conn, sql.GET_CHANGES, since, last_id, safe_version, limit)
+        return horizon, safe_version, rows
+
+    async def purge_tombstones(self, older_than: datetime) -> int:
+        async with self._write_pool().acquire() as conn:
+            purged = await PRODUCT_QUERIES.fetchval(conn, sql.PURGE_TOMBSTONES, older_than)
+        return purged or 0
+
+    @staticmethod
+    def _filter_conditions(filters: Optional[ProductFilter]) -> Tuple[List[str], List[Any]]:
+        """Translate a ProductFilter into SQL conditions and their positional arguments."""
+        conditions: List[str] = []
+        args: List[Any] = []
+        if filters is None:
+            return conditions, args
+
+        for column, operator, value in (
+            ("category", "=", filters.category),
+            ("price", ">=", filters.min_price),
+            ("price", "<=", filters.max_price),
+            ("created_at", ">=", filters.created_after),
+            ("created_at", "<", filters.created_before),
+        ):
+            if value is not None:
+                args.append(value)
+                conditions.append(f"{column} {operator} ${len(args)}")
+        return conditions, args
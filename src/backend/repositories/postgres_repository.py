@@ -1,30 +1,84 @@
-import asyncpg
-from typing import Optional
+import asyncio, asyncpg, logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from .base_repository import BaseRepository
+from .metered_pool import MeteredPool
+from .pool_settings import PoolSettings
+from .read_router import ReadRouter, ReadRoutingSettings
+
+logger = logging.getLogger(__name__)
+
+ConnectionHook = Callable[[asyncpg.Connection], Awaitable[None]]
+# Receives each NOTIFY payload, or None after the listener reconnected and may have missed some
+NotificationHandler = Callable[[Optional[str]], None]
+
+LISTENER_RECONNECT_DELAYS = (0.5, 1.0, 2.0, 5.0, 10.0)
 
 class PostgresRepository(BaseRepository):
-    def __init__(self, user: str, password: str, database: str, host: str, port: str):
+    def __init__(
+        self,
+        user: str,
+        password: str,
+        database: str,
+        host: str,
+        port: str,
+        settings: Optional[PoolSettings] = None,
+        read_routing: Optional[ReadRoutingSettings] = None
+    ):
         self.user = user
         self.password = password
         self.database = database
         self.host = host
         self.port = port
-        self.pool: Optional[asyncpg.Pool] = None
+        self.settings = settings or PoolSettings()
+        self.read_routing = read_routing or ReadRoutingSettings()
+        self.init_hooks: List[ConnectionHook] = []
+        self.pool: Optional[MeteredPool] = None
+        self.replica_pools: List[MeteredPool] = []
+        self.reads: Optional[ReadRouter] = None
+        self.handlers: Dict[str, List[NotificationHandler]] = {}
+        self._listener: Optional[asyncpg.Connection] = None
+        self._listener_lock = asyncio.Lock()
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    def add_init_hook(self, hook: ConnectionHook) -> None:
+        """Register a coroutine run on every new pool connection; must be called before connect()."""
+        self.init_hooks.append(hook)
 
-    async def connect(self) -> Optional[asyncpg.Pool]:
-        """Establish a connection pool."""
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        for hook in self.init_hooks:
+            await hook(conn)
+
+    async def _create_pool(self, host: str, port: str) -> MeteredPool:
+        settings = self.settings
+        pool = await asyncpg.create_pool(
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            host=host,
+            port=port,
+            min_size=settings.min_size,
+            max_size=settings.max_size,
+            max_inactive_connection_lifetime=settings.max_inactive_connection_lifetime,
+            statement_cache_size=settings.statement_cache_size,
+            command_timeout=settings.command_timeout,
+            init=self._init_connection
+        )
+        return MeteredPool(pool, settings.acquire_timeout)
+
+    async def connect(self) -> Optional[MeteredPool]:
+        """Establish the primary connection pool, plus one pool per configured read replica."""
         try:
-            self.pool = await asyncpg.create_pool(
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                host=self.host,
-                port=self.port,
-                min_size=1,
-                max_size=10
-            )
-        except Exception as e:
-            print(f"Failed to create a connection pool: {e}")
+            self.pool = await self._create_pool(self.host, self.port)
+        except Exception:
+            logger.exception("Failed to create a connection pool for %s:%s/%s", self.host, self.port, self.database)
+            return None
+        for host, port in self.read_routing.replicas:
+            try:
+                self.replica_pools.append(await self._create_pool(host, port))
+            except Exception:
+                # A missing replica only costs read capacity; reads fall back to the primary
+                logger.exception("Failed to create a replica pool for %s:%s/%s", host, port, self.database)
+        self.reads = ReadRouter(self.pool, self.replica_pools, self.read_routing)
         return self.pool
 
     async def get_version(self) -> Optional[str]:
@@ -34,8 +88,96 @@ class PostgresRepository(BaseRepository):
                 return await conn.fetchval('SELECT version()')
         return None
 
+    def pool_stats(self) -> Optional[Dict[str, Any]]:
+        """Report pool size, idle/in-use connections and acquire wait times."""
+        if self.pool:
+            stats = self.pool.stats()
+            if self.replica_pools:
+                stats["replicas"] = [pool.stats() for pool in self.replica_pools]
+                stats["primary_reads"] = self.reads.primary_reads
+                stats["replica_reads"] = self.reads.replica_reads
+            return stats
+        return None
+
+    async def listen(self, channel: str, handler: NotificationHandler) -> None:
+        """Subscribe handler to a NOTIFY channel over one listener connection shared by all channels."""
+        async with self._listener_lock:
+            if self._listener is None:
+                self._listener = await self._connect_listener()
+            if channel not in self.handlers:
+                self.handlers[channel] = []
+                await self._listener.add_listener(channel, self._dispatch)
+            self.handlers[channel].append(handler)
+
+    async def unlisten(self, channel: str, handler: NotificationHandler) -> None:
+        """Remove a handler added with listen(), dropping the channel once it has none left."""
+        async with self._listener_lock:
+            handlers = self.handlers.get(channel, [])
+            if handler in handlers:
+                handlers.remove(handler)
+            if not handlers and channel in self.handlers:
+                del self.handlers[channel]
+                if self._listener is not None and not self._listener.is_closed():
+                    await self._listener.remove_listener(channel, self._dispatch)
+
+    async def _connect_listener(self) -> asyncpg.Connection:
+        # LISTEN needs a dedicated connection: pooled connections are reset on release
+        conn = await asyncpg.connect(
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            host=self.host,
+            port=self.port
+        )
+        conn.add_termination_listener(self._on_listener_lost)
+        return conn
+
+    def _dispatch(self, conn: asyncpg.Connection, pid: int, channel: str, payload: Optional[str]) -> None:
+        for handler in list(self.handlers.get(channel, [])):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception("Notification handler for %s failed", channel)
+
+    def _on_listener_lost(self, conn: asyncpg.Connection) -> None:
+        if conn is self._listener and self._reconnect_task is None:
+            logger.warning("Lost the LISTEN connection; reconnecting")
+            self._reconnect_task = asyncio.ensure_future(self._reconnect_listener())
+
+    async def _reconnect_listener(self) -> None:
+        attempt = 0
+        try:
+            while self.handlers:
+                try:
+                    async with self._listener_lock:
+                        conn = await self._connect_listener()
+                        for channel in self.handlers:
+                            await conn.add_listener(channel, self._dispatch)
+                        self._listener = conn
+                    break
+                except (OSError, asyncpg.PostgresError):
+                    delay = LISTENER_RECONNECT_DELAYS[min(attempt, len(LISTENER_RECONNECT_DELAYS) - 1)]
+                    attempt += 1
+                    logger.warning("LISTEN reconnect failed; retrying in %.1fs", delay)
+                    await asyncio.sleep(delay)
+            # Anything sent while disconnected is lost, so tell handlers to resynchronize
+            for channel in list(self.handlers):
+                self._dispatch(self._listener, 0, channel, None)
+        finally:
+            self._reconnect_task = None
+
     async def close(self) -> None:
-        """Close the connection pool."""
+        """Close the listener connection and the connection pool."""
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        self.handlers.clear()
+        if self._listener is not None:
+            listener, self._listener = self._listener, None
+            await listener.close()
+        for pool in self.replica_pools:
+            await pool.close()
+        self.replica_pools = []
+        self.reads = None
         if self.pool:
             await self.pool.close()
             self.pool = None
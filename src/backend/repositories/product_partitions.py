@@ -0,0 +1,139 @@
+import asyncio, asyncpg, gzip, logging, os, re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import BinaryIO, List, Optional
+from . import product_queries as sql
+from .product_queries import PRODUCT_COLUMNS, PRODUCT_QUERIES
+
+logger = logging.getLogger(__name__)
+
+MONTHLY_PARTITION = re.compile(r"^products_p(\d{4})(\d{2})$")
+
+def month_start(moment: datetime) -> datetime:
+    """First instant (UTC) of the month holding moment."""
+    moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+def add_months(month: datetime, months: int) -> datetime:
+    """The month start `months` after (or before, when negative) the month start month."""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+@dataclass(frozen=True)
+class ProductPartition:
+    name: str
+    # None for products_default, which holds rows outside every month
+    start: Optional[datetime]
+    row_estimate: int
+    bytes: int
+
+    @property
+    def end(self) -> Optional[datetime]:
+        return add_months(self.start, 1) if self.start else None
+
+class _ArchiveFile:
+    """Gzipped CSV written through a temporary name and fsynced before taking its final one."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.partial = path + ".partial"
+        self.raw: BinaryIO = open(self.partial, "wb")
+        self.gzip = gzip.GzipFile(fileobj=self.raw, mode="wb")
+
+    def write(self, data: bytes) -> None:
+        self.gzip.write(data)
+
+    def commit(self) -> None:
+        self.gzip.close()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.raw.close()
+        os.replace(self.partial, self.path)
+
+    def discard(self) -> None:
+        self.gzip.close()
+        self.raw.close()
+        os.unlink(self.partial)
+
+class ProductPartitions:
+    """Monthly partitions of products (migration 008): creating them ahead of time and archiving old ones.
+
+    Archiving a month detaches its partition, after which its rows are gone from
+    the API as if deleted (with tombstones for change feeds), exports it to
+    <directory>/products_pYYYYMM.csv.gz and drops it. A partition detached by a
+    run that failed to export it stays behind as products_archived_pYYYYMM and
+    is exported by the next run.
+    """
+
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool = pool
+
+    async def list_partitions(self) -> List[ProductPartition]:
+        """The partitions of products in month order, products_default first; empty before migration 008."""
+        async with self.pool.acquire() as conn:
+            rows = await PRODUCT_QUERIES.fetch(conn, sql.LIST_PRODUCT_PARTITIONS)
+        partitions = []
+        for row in rows:
+            match = MONTHLY_PARTITION.match(row["name"])
+            start = datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc) if match else None
+            partitions.append(ProductPartition(row["name"], start, row["row_estimate"], row["bytes"]))
+        return sorted(partitions, key=lambda partition: (partition.start is not None, partition.name))
+
+    async def create_partitions(self, start: datetime, until: datetime) -> int:
+        """Create the missing months from the one holding start up to until; return how many were created."""
+        async with self.pool.acquire() as conn:
+            return await PRODUCT_QUERIES.fetchval(conn, sql.CREATE_PRODUCT_PARTITIONS, start, until)
+
+    async def archive_partitions(self, before: datetime, directory: str) -> List[str]:
+        """Archive every month that ends on or before before; return the files written.
+
+        Does nothing when another process is archiving at the same time.
+        """
+        due = [p.name for p in await self.list_partitions() if p.end is not None and p.end <= before]
+        return await self._archive(due, directory)
+
+    async def archive_partition(self, name: str, directory: str) -> List[str]:
+        """Archive one monthly partition, e.g. products_p202401; return the files written."""
+        return await self._archive([name], directory)
+
+    async def _archive(self, names: List[str], directory: str) -> List[str]:
+        async with self.pool.acquire() as conn:
+            if not await PRODUCT_QUERIES.fetchval(conn, sql.TRY_LOCK_PRODUCT_ARCHIVE):
+                logger.info("Products partitions are being archived by another process")
+                return []
+            try:
+                for name in names:
+                    await PRODUCT_QUERIES.fetchval(conn, sql.ARCHIVE_PRODUCT_PARTITION, name)
+                os.makedirs(directory, exist_ok=True)
+                # Including tables left detached by earlier runs that failed to export them
+                return [
+                    await self._export(conn, row["relname"], directory)
+                    for row in await PRODUCT_QUERIES.fetch(conn, sql.LIST_ARCHIVED_PARTITIONS)
+                ]
+            finally:
+                await PRODUCT_QUERIES.fetchval(conn, sql.UNLOCK_PRODUCT_ARCHIVE)
+
+    @staticmethod
+    async def _export(conn: asyncpg.Connection, table: str, directory: str) -> str:
+        """Write a detached partition to a gzipped CSV file, then drop it."""
+        loop = asyncio.get_running_loop()
+        path = os.path.join(directory, table.replace("products_archived_", "products_") + ".csv.gz")
+        archive = await loop.run_in_executor(None, _ArchiveFile, path)
+
+        async def write(data: bytes) -> None:
+            await loop.run_in_executor(None, archive.write, data)
+
+        try:
+            status = await conn.copy_from_query(
+                f'SELECT {PRODUCT_COLUMNS} FROM "{table}" ORDER BY id', output=write, format="csv", header=True
+            )
+            expected = await conn.fetchval(f'SELECT count(*) FROM "{table}"')
+            if int(status.split()[-1]) != expected:
+                raise RuntimeError(f"Exported {status.split()[-1]} of the {expected} rows of {table}")
+        except BaseException:
+            await loop.run_in_executor(None, archive.discard)
+            raise
+        await loop.run_in_executor(None, archive.commit)
+        await conn.execute(f'DROP TABLE "{table}"')
+        logger.info("Archived %s rows of %s to %s", expected, table, path)
+        return path
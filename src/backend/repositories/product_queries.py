@@ -0,0 +1,281 @@
+"""SQL statements used by PostgresProductRepository, prepared on every pool connection."""
+from .query_registry import QueryRegistry
+
+PRODUCT_QUERIES = QueryRegistry()
+
+PRODUCT_COLUMNS = "id, name, code, description, category, price, created_at, version, updated_at"
+# The same columns of a products table aliased as p, for statements that join it
+P_PRODUCT_COLUMNS = ", ".join(f"p.{column}" for column in PRODUCT_COLUMNS.split(", "))
+
+# Statements that fit the repository's filters, sort orders and search modes are built
+# at call time; these are the fixed ones.
+
+INSERT_PRODUCT = PRODUCT_QUERIES.register("insert_product", """
+        INSERT INTO products (name, code, description, category, price, created_at)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING id;
+        """)
+
+INSERT_AND_FETCH_PRODUCT = PRODUCT_QUERIES.register("insert_and_fetch_product", f"""
+        INSERT INTO products (name, code, description, category, price, created_at)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING {PRODUCT_COLUMNS};
+        """)
+
+RESERVE_PRODUCT_IDS = PRODUCT_QUERIES.register("reserve_product_ids", """
+        SELECT nextval(pg_get_serial_sequence('products', 'id'))
+        FROM generate_series(1, $1);
+        """)
+
+INSERT_PRODUCTS = PRODUCT_QUERIES.register("insert_products", """
+        INSERT INTO products (name, code, description, category, price, created_at)
+        SELECT name, code, description, category, price, created_at
+        FROM unnest($1::varchar[], $2::varchar[], $3::varchar[], $4::varchar[], $5::decimal[], $6::timestamptz[])
+            WITH ORDINALITY AS t(name, code, description, category, price, created_at, ord)
+        ORDER BY ord
+        RETURNING id;
+        """)
+
+# Claim the key and insert the product in one statement; a concurrent request
+# with the same key blocks on the claim until the first one commits or rolls back
+INSERT_PRODUCT_IDEMPOTENT = PRODUCT_QUERIES.register("insert_product_idempotent", """
+        WITH claim AS (
+            INSERT INTO product_idempotency_keys (key, request_hash, product_id)
+            VALUES ($1, $2, nextval(pg_get_serial_sequence('products', 'id')))
+            ON CONFLICT (key) DO NOTHING
+            RETURNING product_id
+        )
+        INSERT INTO products (id, name, code, description, category, price, created_at)
+        SELECT product_id, $3, $4, $5, $6, $7, $8 FROM claim
+        RETURNING id;
+        """)
+
+GET_IDEMPOTENCY_KEY = PRODUCT_QUERIES.register("get_idempotency_key", """
+        SELECT request_hash, product_id FROM product_idempotency_keys WHERE key = $1;
+        """)
+
+PURGE_IDEMPOTENCY_KEYS = PRODUCT_QUERIES.register("purge_idempotency_keys", """
+        DELETE FROM product_idempotency_keys WHERE created_at < $1;
+        """)
+
+# products is partitioned by created_at and cannot carry a unique index on code alone, so
+# codes are unique through the product_codes registry. Upserts first lock the products that
+# hold the codes already taken, in id order. Deletes and code changes lock the product row
+# before their trigger touches the registry, so taking the same row first keeps them from
+# deadlocking; concurrent upserts of a code take turns on it too. A product whose code changed
+# while the lock was awaited comes back with current false. New codes are then claimed in the
+# registry, each under a fresh id to insert the product with. An identical retry writes nothing.
+LOCK_CODED_PRODUCTS = PRODUCT_QUERIES.register("lock_coded_products", """
+        SELECT c.code, p.id, p.code = c.code AS current
+        FROM product_codes c
+        JOIN products p ON p.id = c.product_id
+        WHERE c.code = ANY($1::varchar[])
+        ORDER BY p.id
+        FOR UPDATE OF p;
+        """)
+
+# Codes another transaction claimed since they were looked up are skipped, and locked next
+CLAIM_PRODUCT_CODES = PRODUCT_QUERIES.register("claim_product_codes", """
+        INSERT INTO product_codes (code, product_id)
+        SELECT code, nextval(pg_get_serial_sequence('products', 'id'))
+        FROM unnest($1::varchar[]) AS t(code)
+        ORDER BY code
+        ON CONFLICT (code) DO NOTHING
+        RETURNING code, product_id;
+        """)
+
+INSERT_CLAIMED_PRODUCTS = PRODUCT_QUERIES.register("insert_claimed_products", f"""
+        INSERT INTO products (id, name, code, description, category, price, created_at)
+        SELECT id, name, code, description, category, price, created_at
+        FROM unnest($1::bigint[], $2::varchar[], $3::varchar[], $4::varchar[], $5::varchar[], $6::decimal[], $7::timestamptz[])
+            AS t(id, name, code, description, category, price, created_at)
+        RETURNING {PRODUCT_COLUMNS};
+        """)
+
+UPDATE_CLAIMED_PRODUCTS = PRODUCT_QUERIES.register("update_claimed_products", f"""
+        UPDATE products AS p
+        SET name = v.name, description = v.description, category = v.category, price = v.price, created_at = v.created_at
+        FROM unnest($1::bigint[], $2::varchar[], $3::varchar[], $4::varchar[], $5::decimal[], $6::timestamptz[])
+            AS v(id, name, description, category, price, created_at)
+        WHERE p.id = v.id
+        AND (p.name, p.description, p.category, p.price, p.created_at)
+            IS DISTINCT FROM (v.name, v.description, v.category, v.price, v.created_at)
+        RETURNING {P_PRODUCT_COLUMNS};
+        """)
+
+# The same for one product. Planning an UPDATE touches every partition, and a
+# prepared statement over arrays keeps being replanned per call, since its
+# generic plan is costed for 100 elements; this one settles on a generic plan.
+UPDATE_CLAIMED_PRODUCT = PRODUCT_QUERIES.register("update_claimed_product", f"""
+        UPDATE products
+        SET name = $2, description = $3, category = $4, price = $5, created_at = $6
+        WHERE id = $1
+        AND (name, description, category, price, created_at) IS DISTINCT FROM ($2, $3, $4, $5, $6)
+        RETURNING {PRODUCT_COLUMNS};
+        """)
+
+GET_PRODUCT_BY_CODE = PRODUCT_QUERIES.register("get_product_by_code", f"""
+        SELECT {P_PRODUCT_COLUMNS}
+        FROM product_codes c
+        JOIN products p ON p.id = c.product_id
+        WHERE c.code = $1;
+        """)
+
+GET_PRODUCT_BY_ID = PRODUCT_QUERIES.register("get_product_by_id", f"""
+        SELECT {PRODUCT_COLUMNS}
+        FROM products
+        WHERE id = $1;
+        """)
+
+GET_PRODUCTS_BY_IDS = PRODUCT_QUERIES.register("get_products_by_ids", f"""
+        SELECT {PRODUCT_COLUMNS}
+        FROM products
+        WHERE id = ANY($1::bigint[]);
+        """)
+
+UPDATE_PRODUCT = PRODUCT_QUERIES.register("update_product", """
+        UPDATE products
+        SET name = $1, code = $2, description = $3, category = $4, price = $5, created_at = $6
+        WHERE id = $7;
+        """)
+
+DELETE_PRODUCT = PRODUCT_QUERIES.register("delete_product", """
+        DELETE FROM products WHERE id = $1;
+        """)
+
+# Lock the target rows in id order first so concurrent batches cannot deadlock
+PATCH_PRODUCTS = PRODUCT_QUERIES.register("patch_products", """
+        WITH locked AS (
+            SELECT id FROM products WHERE id = ANY($1::bigint[]) ORDER BY id FOR UPDATE
+        )
+        UPDATE products AS p
+        SET name = COALESCE(v.name, p.name),
+            code = COALESCE(v.code, p.code),
+            description = COALESCE(v.description, p.description),
+            category = COALESCE(v.category, p.category),
+            price = COALESCE(v.price, p.price),
+            created_at = COALESCE(v.created_at, p.created_at)
+        FROM unnest($1::bigint[], $2::varchar[], $3::varchar[], $4::varchar[], $5::varchar[], $6::decimal[], $7::timestamptz[])
+            AS v(id, name, code, description, category, price, created_at)
+        WHERE p.id = v.id AND p.id IN (SELECT id FROM locked)
+        RETURNING p.id;
+        """)
+
+DELETE_PRODUCTS = PRODUCT_QUERIES.register("delete_products", """
+        WITH locked AS (
+            SELECT id FROM products WHERE id = ANY($1::bigint[]) ORDER BY id FOR UPDATE
+        )
+        DELETE FROM products WHERE id IN (SELECT id FROM locked)
+        RETURNING id;
+        """)
+
+GET_CATEGORY_STATS = PRODUCT_QUERIES.register("get_category_stats", """
+        SELECT s.category, s.product_count, s.min_price, s.max_price,
+            round(s.price_sum / NULLIF(s.product_count, 0), 2) AS avg_price,
+            COALESCE((
+                SELECT sum(d.created_count)
+                FROM product_category_daily d
+                WHERE d.category = s.category
+                AND d.day > (now() AT TIME ZONE 'UTC')::date - $1::int
+            ), 0) AS recent_count
+        FROM product_category_stats s
+        WHERE $2::varchar IS NULL OR s.category = $2
+        ORDER BY s.category;
+        """)
+
+REFRESH_CATEGORY_STATS = PRODUCT_QUERIES.register("refresh_category_stats", """
+        SELECT refresh_product_category_stats();
+        """)
+
+GET_CHANGES_HORIZON = PRODUCT_QUERIES.register("get_changes_horizon", """
+        SELECT version, pg_snapshot_xmin(pg_current_snapshot())::text::bigint
+        FROM product_changes_horizon;
+        """)
+
+GET_CHANGES = PRODUCT_QUERIES.register("get_changes", """
+        WITH changes AS (
+            (SELECT id, version, false AS deleted FROM products
+             WHERE (version, id) > ($1, $2) AND version < $3
+             ORDER BY version, id LIMIT $4)
+            UNION ALL
+            (SELECT id, version, true AS deleted FROM product_tombstones
+             WHERE (version, id) > ($1, $2) AND version < $3
+             ORDER BY version, id LIMIT $4)
+            ORDER BY version, id
+            LIMIT $4
+        )
+        SELECT c.id, c.version, c.deleted, p.name, p.code, p.description, p.category, p.price, p.created_at, p.updated_at
+        FROM changes c
+        LEFT JOIN products p ON p.id = c.id AND NOT c.deleted
+        ORDER BY c.version, c.id;
+        """)
+
+PURGE_TOMBSTONES = PRODUCT_QUERIES.register("purge_tombstones", """
+        WITH purged AS (
+            DELETE FROM product_tombstones WHERE deleted_at < $1 RETURNING version
+        )
+        UPDATE product_changes_horizon
+        SET version = GREATEST(version, (SELECT max(version) FROM purged))
+        WHERE EXISTS (SELECT 1 FROM purged)
+        RETURNING (SELECT count(*) FROM purged);
+        """)
+
+SEARCH_FTS = PRODUCT_QUERIES.register("search_fts", f"""
+        SELECT {PRODUCT_COLUMNS},
+               ts_rank(search_vector, websearch_to_tsquery('simple', $1)) AS rank
+        FROM products
+        WHERE search_vector @@ websearch_to_tsquery('simple', $1)
+        ORDER BY rank DESC, id
+        LIMIT $2 OFFSET $3;
+        """)
+
+SEARCH_PREFIX = PRODUCT_QUERIES.register("search_prefix", f"""
+        SELECT {PRODUCT_COLUMNS}, 1.0::real AS rank
+        FROM products
+        WHERE lower(name) LIKE $1
+        ORDER BY lower(name), id
+        LIMIT $2 OFFSET $3;
+        """)
+
+SEARCH_FUZZY = PRODUCT_QUERIES.register("search_fuzzy", f"""
+        SELECT {PRODUCT_COLUMNS},
+               similarity(name, $1) AS rank
+        FROM products
+        WHERE name % $1
+        ORDER BY rank DESC, id
+        LIMIT $2 OFFSET $3;
+        """)
+
+# Partition maintenance (migration 008); products is partitioned by UTC month of created_at
+LIST_PRODUCT_PARTITIONS = PRODUCT_QUERIES.register("list_product_partitions", """
+        SELECT c.relname AS name, GREATEST(c.reltuples, 0)::bigint AS row_estimate, pg_total_relation_size(c.oid) AS bytes
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'products'::regclass
+        ORDER BY c.relname;
+        """)
+
+# Partitions detached by an archive run that did not finish exporting them
+LIST_ARCHIVED_PARTITIONS = PRODUCT_QUERIES.register("list_archived_partitions", """
+        SELECT relname
+        FROM pg_class
+        WHERE relkind = 'r' AND relname ~ '^products_archived_p[0-9]{6}$' AND pg_table_is_visible(oid)
+        ORDER BY relname;
+        """)
+
+CREATE_PRODUCT_PARTITIONS = PRODUCT_QUERIES.register("create_product_partitions", """
+        SELECT products_create_partitions($1, $2);
+        """)
+
+ARCHIVE_PRODUCT_PARTITION = PRODUCT_QUERIES.register("archive_product_partition", """
+        SELECT products_archive_partition($1);
+        """)
+
+# Session lock held by the one worker exporting archived partitions at a time
+TRY_LOCK_PRODUCT_ARCHIVE = PRODUCT_QUERIES.register("try_lock_product_archive", """
+        SELECT pg_try_advisory_lock(hashtext('products_archive'));
+        """)
+
+UNLOCK_PRODUCT_ARCHIVE = PRODUCT_QUERIES.register("unlock_product_archive", """
+        SELECT pg_advisory_unlock(hashtext('products_archive'));
+        """)
@@ -0,0 +1,132 @@
+from abc import abstractmethod
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+from models import Product, ProductFilter, ProductPatchItem, ProductSortField, SearchMode, SortOrder
+from .base_repository import BaseRepository
+
+# A stored product as returned by a backend: an asyncpg.Record or a plain dict with the
+# Product fields, plus "rank" for search hits and "deleted" for change feed entries
+ProductRow = Mapping[str, Any]
+CsvSource = Union[bytes, Iterable[bytes], AsyncIterable[bytes]]
+
+class ProductRepository(BaseRepository):
+    """Product storage used by ProductService.
+
+    Backends return rows rather than models, so the service decides when to pay
+    for validation. Multi-row writes are atomic: either every row is written or,
+    when one fails (e.g. a duplicate code), none is.
+    """
+
+    @abstractmethod
+    async def insert_product(self, product: Product) -> int:
+        """Store a new product and return its ID."""
+
+    @abstractmethod
+    async def insert_and_fetch_product(self, product: Product) -> ProductRow:
+        """Store a new product and return it as stored."""
+
+    @abstractmethod
+    async def insert_products(self, products: Sequence[Product], chunk_size: int, use_copy: bool = True) -> List[int]:
+        """Store many products and return their IDs in input order."""
+
+    @abstractmethod
+    async def copy_products_csv(self, source: CsvSource) -> int:
+        """Load headerless CSV rows in BATCH_COLUMNS order and return the number of rows loaded."""
+
+    @abstractmethod
+    async def insert_product_idempotent(self, product: Product, key: str, request_hash: bytes) -> Tuple[int, Optional[bytes]]:
+        """Store a product once per key; return its ID and, when the key was already used, that request's hash."""
+
+    @abstractmethod
+    async def purge_idempotency_keys(self, older_than: datetime) -> int:
+        """Forget idempotency keys recorded before older_than and return how many were dropped."""
+
+    @abstractmethod
+    async def upsert_product(self, product: Product) -> Tuple[ProductRow, bool]:
+        """Insert a product or update the one with the same code; return the stored row and whether it was inserted."""
+
+    @abstractmethod
+    async def upsert_products(self, products: Sequence[Product], chunk_size: int) -> List[ProductRow]:
+        """Insert or update products with distinct codes.
+
+        Returns one row per product with its id, code and inserted: True for new
+        rows, False for updated ones and None for rows that were already identical.
+        """
+
+    @abstractmethod
+    async def get_product(self, product_id: int) -> Optional[ProductRow]:
+        """Return a product by ID."""
+
+    @abstractmethod
+    async def get_products(self, product_ids: Sequence[int]) -> List[ProductRow]:
+        """Return the products that exist among product_ids, in no particular order."""
+
+    @abstractmethod
+    async def update_product(self, product_id: int, product: Product) -> bool:
+        """Replace a product's fields; False when it does not exist."""
+
+    @abstractmethod
+    async def delete_product(self, product_id: int) -> bool:
+        """Delete a product; False when it does not exist."""
+
+    @abstractmethod
+    async def patch_products(self, patches: Sequence[ProductPatchItem]) -> List[int]:
+        """Apply the non-null fields of each patch and return the updated IDs."""
+
+    @abstractmethod
+    async def update_products_where(
+        self,
+        filters: ProductFilter,
+        values: Dict[str, Any],
+        price_change_percent: Optional[Decimal] = None
+    ) -> List[int]:
+        """Set values (and optionally scale the price) on every product matching filters; return the updated IDs."""
+
+    @abstractmethod
+    async def delete_products(self, product_ids: Sequence[int]) -> List[int]:
+        """Delete many products and return the deleted IDs."""
+
+    @abstractmethod
+    async def delete_products_where(self, filters: ProductFilter) -> List[int]:
+        """Delete every product matching filters and return the deleted IDs."""
+
+    @abstractmethod
+    async def list_products(
+        self,
+        filters: Optional[ProductFilter],
+        sort: ProductSortField,
+        order: SortOrder,
+        limit: int,
+        after: Optional[Tuple[Any, int]] = None
+    ) -> List[ProductRow]:
+        """Return up to limit matching products ordered by (sort, id), starting after the (value, id) keyset position."""
+
+    @abstractmethod
+    async def search_products(self, text: str, mode: SearchMode, limit: int, offset: int) -> List[ProductRow]:
+        """Return a page of products matching text, best rank first, each with a rank."""
+
+    @abstractmethod
+    def export_products(self, filters: Optional[ProductFilter], batch_size: int) -> AsyncIterator[List[ProductRow]]:
+        """Stream matching products in id order, batch_size rows at a time."""
+
+    @abstractmethod
+    async def get_category_stats(self, recent_days: int, category: Optional[str] = None) -> List[ProductRow]:
+        """Per-category product_count, min/avg/max price and recent_count, ordered by category."""
+
+    @abstractmethod
+    async def refresh_category_stats(self) -> None:
+        """Rebuild any precomputed category statistics."""
+
+    @abstractmethod
+    async def get_changes(self, since: int, last_id: int, limit: int) -> Tuple[int, int, List[ProductRow]]:
+        """Read the change feed after the (since, last_id) keyset position.
+
+        Returns the purge horizon, the first version that may still be in flight,
+        and up to limit rows below that version ordered by (version, id). Rows are
+        only read when since lies between the two.
+        """
+
+    @abstractmethod
+    async def purge_tombstones(self, older_than: datetime) -> int:
+        """Drop deletion records older than older_than, advancing the purge horizon; return how many were dropped."""
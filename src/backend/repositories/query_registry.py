@@ -0,0 +1,177 @@
+import asyncpg, logging, os, re, time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+from utils.metrics import MetricsRegistry, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SEQ_SCAN_PATTERN = re.compile(r"Seq Scan on (\w+)")
+# Partitions such as products_p202401 and products_default are reported as their parent table
+PARTITION_SUFFIX = re.compile(r"_(?:p\d{6}|default)$")
+
+@dataclass(frozen=True)
+class Query:
+    """A named SQL statement; the name labels its timings, metrics and logs."""
+    name: str
+    sql: str
+
+@dataclass
+class QueryPlanSettings:
+    slow_query_seconds: Optional[float] = None
+    explain_slow_queries: bool = False
+    explain_interval: float = 60.0
+    seq_scan_tables: Tuple[str, ...] = ("products",)
+
+    @classmethod
+    def from_env(cls) -> "QueryPlanSettings":
+        """Build settings from DB_SLOW_QUERY_SECONDS, DB_EXPLAIN_SLOW_QUERIES and DB_EXPLAIN_INTERVAL."""
+        defaults = cls()
+        slow = os.getenv("DB_SLOW_QUERY_SECONDS")
+        return cls(
+            slow_query_seconds=float(slow) if slow else defaults.slow_query_seconds,
+            explain_slow_queries=os.getenv("DB_EXPLAIN_SLOW_QUERIES", "0") == "1",
+            explain_interval=float(os.getenv("DB_EXPLAIN_INTERVAL", defaults.explain_interval)),
+        )
+
+@dataclass
+class QueryStats:
+    calls: int = 0
+    errors: int = 0
+    slow: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+class QueryRegistry:
+    """Central catalogue of SQL statements with per-statement timings and slow-query plans.
+
+    Registered statements are prepared on every new pool connection through
+    prepare(), used as a pool init hook, so requests never pay for parsing and
+    planning them. Ad-hoc Query objects (e.g. SQL built from filters) run through
+    the same methods and are timed under their name, but are prepared lazily by
+    asyncpg's statement cache.
+    """
+
+    def __init__(self, settings: Optional[QueryPlanSettings] = None, registry: MetricsRegistry = REGISTRY):
+        self.settings = settings or QueryPlanSettings()
+        self.queries: Dict[str, Query] = {}
+        self._stats: Dict[str, QueryStats] = {}
+        self._last_explained: Dict[str, float] = {}
+        self._unpreparable: Set[str] = set()
+        self.duration = registry.histogram(
+            "db_statement_duration_seconds", "Execution time of SQL statements, excluding pool acquire.", ("statement",)
+        )
+        self.slow_queries = registry.counter(
+            "db_statement_slow_total", "Statements slower than the slow query threshold.", ("statement",)
+        )
+        self.seq_scans = registry.counter(
+            "db_statement_seq_scans_total", "Slow statements whose plan scanned a watched table sequentially.", ("statement", "table")
+        )
+
+    def register(self, name: str, sql: str) -> Query:
+        """Add a statement to be prepared on every pool connection."""
+        if name in self.queries:
+            raise ValueError(f"Query {name!r} is already registered")
+        query = self.queries[name] = Query(name, sql)
+        return query
+
+    async def prepare(self, conn: asyncpg.Connection) -> None:
+        """Pool init hook: prepare every registered statement into the connection's statement cache."""
+        for query in self.queries.values():
+            try:
+                # executemany with no argument sets prepares and caches the statement without running it
+                await conn.executemany(query.sql, [])
+            except asyncpg.PostgresError as e:
+                # e.g. an optional extension is missing; the statement fails when used instead
+                if query.name not in self._unpreparable:
+                    self._unpreparable.add(query.name)
+                    logger.warning("Could not prepare query %s: %s", query.name, e)
+
+    async def fetch(self, conn: asyncpg.Connection, query: Query, *args: Any) -> List[asyncpg.Record]:
+        return await self._run(conn, query, conn.fetch, args)
+
+    async def fetchrow(self, conn: asyncpg.Connection, query: Query, *args: Any) -> Optional[asyncpg.Record]:
+        return await self._run(conn, query, conn.fetchrow, args)
+
+    async def fetchval(self, conn: asyncpg.Connection, query: Query, *args: Any) -> Any:
+        return await self._run(conn, query, conn.fetchval, args)
+
+    async def execute(self, conn: asyncpg.Connection, query: Query, *args: Any) -> str:
+        return await self._run(conn, query, conn.execute, args)
+
+    async def _run(self, conn: asyncpg.Connection, query: Query, method: Any, args: Tuple[Any, ...]) -> Any:
+        stats = self._stats.get(query.name)
+        if stats is None:
+            stats = self._stats[query.name] = QueryStats()
+        stats.calls += 1
+        started = time.perf_counter()
+        try:
+            result = await method(query.sql, *args)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            self.duration.labels(query.name).observe(elapsed)
+
+        threshold = self.settings.slow_query_seconds
+        if threshold is not None and elapsed >= threshold:
+            stats.slow += 1
+            self.slow_queries.labels(query.name).inc()
+            logger.warning("Slow query %s took %.1f ms", query.name, elapsed * 1000)
+            if self.settings.explain_slow_queries and self._should_explain(query.name):
+                await self._log_plan(conn, query, args)
+        return result
+
+    def _should_explain(self, name: str) -> bool:
+        now = time.monotonic()
+        last = self._last_explained.get(name)
+        if last is not None and now - last < self.settings.explain_interval:
+            return False
+        self._last_explained[name] = now
+        return True
+
+    async def _log_plan(self, conn: asyncpg.Connection, query: Query, args: Tuple[Any, ...]) -> None:
+        try:
+            plan = await self.explain(conn, query, *args, analyze=True)
+        except asyncpg.PostgresError:
+            logger.exception("Could not explain slow query %s", query.name)
+            return
+        for table in self.seq_scan_tables(plan):
+            self.seq_scans.labels(query.name, table).inc()
+            logger.warning("Slow query %s scans %s sequentially", query.name, table)
+        logger.warning("Plan for slow query %s:\n%s", query.name, plan)
+
+    def seq_scan_tables(self, plan: str) -> List[str]:
+        """Watched tables that a plan reads with a sequential scan."""
+        tables = dict.fromkeys(PARTITION_SUFFIX.sub("", table) for table in SEQ_SCAN_PATTERN.findall(plan))
+        return [table for table in tables if table in self.settings.seq_scan_tables]
+
+    async def explain(self, conn: asyncpg.Connection, query: Query, *args: Any, analyze: bool = False) -> str:
+        """Return the query plan as text; with analyze, the statement runs inside a transaction that is rolled back."""
+        if not analyze:
+            rows = await conn.fetch(f"EXPLAIN {query.sql}", *args)
+        else:
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {query.sql}", *args)
+            finally:
+                await transaction.rollback()
+        return "\n".join(row[0] for row in rows)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-statement call counts and timings, slowest total first."""
+        report = {}
+        for name, stats in sorted(self._stats.items(), key=lambda item: -item[1].total_seconds):
+            report[name] = {
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "slow": stats.slow,
+                "total_ms": round(stats.total_seconds * 1000, 3),
+                "mean_ms": round(stats.total_seconds * 1000 / stats.calls, 3) if stats.calls else 0.0,
+                "max_ms": round(stats.max_seconds * 1000, 3),
+                "prepared": name in self.queries and name not in self._unpreparable,
+            }
+        return report
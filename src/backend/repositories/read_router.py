@@ -0,0 +1,87 @@
+import itertools, os, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Tuple
+from .metered_pool import MeteredPool
+
+READ_STRATEGIES = ("round_robin", "least_busy")
+
+@dataclass
+class ReadRoutingSettings:
+    replicas: List[Tuple[str, str]] = field(default_factory=list)
+    strategy: str = "round_robin"
+    read_your_writes_seconds: float = 0.0
+
+    def __post_init__(self):
+        if self.strategy not in READ_STRATEGIES:
+            raise ValueError(f"Unknown read strategy {self.strategy!r}; expected one of {READ_STRATEGIES}")
+
+    @classmethod
+    def from_env(cls) -> "ReadRoutingSettings":
+        """Build read routing settings from DB_REPLICA_HOSTS ("host:port,host:port"), DB_READ_STRATEGY and DB_READ_YOUR_WRITES_SECONDS."""
+        replicas = []
+        for entry in os.getenv("DB_REPLICA_HOSTS", "").split(","):
+            entry = entry.strip()
+            if entry:
+                host, _, port = entry.rpartition(":") if ":" in entry else (entry, "", os.getenv("DB_PORT", "5432"))
+                replicas.append((host, port))
+        return cls(
+            replicas=replicas,
+            strategy=os.getenv("DB_READ_STRATEGY", "round_robin"),
+            read_your_writes_seconds=float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "0")),
+        )
+
+@dataclass
+class ReadConsistency:
+    """Per-request routing state: reads use the primary until primary_until (a UNIX timestamp)."""
+    primary_until: float = 0.0
+    wrote: bool = False
+
+_consistency: ContextVar[Optional[ReadConsistency]] = ContextVar("read_consistency", default=None)
+_force_primary: ContextVar[bool] = ContextVar("force_primary_reads", default=False)
+
+def bind_read_consistency(state: ReadConsistency) -> None:
+    """Attach routing state to the current request; the object is mutated in place by writes."""
+    _consistency.set(state)
+
+@contextmanager
+def primary_reads() -> Iterator[None]:
+    """Route every read inside the block to the primary, e.g. when filling a cache that must not go stale."""
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+class ReadRouter:
+    """Chooses the pool for read-only queries: a replica, or the primary after a recent write."""
+
+    def __init__(self, primary: MeteredPool, replicas: Sequence[MeteredPool], settings: ReadRoutingSettings):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.settings = settings
+        self._next = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self.primary_reads = 0
+        self.replica_reads = 0
+
+    def for_read(self) -> MeteredPool:
+        """Return the pool a read should use."""
+        state = _consistency.get()
+        if not self.replicas or _force_primary.get() or (state is not None and state.primary_until > time.time()):
+            self.primary_reads += 1
+            return self.primary
+        self.replica_reads += 1
+        if self.settings.strategy == "least_busy":
+            return min(self.replicas, key=_busy)
+        return self.replicas[next(self._next)]
+
+    def note_write(self) -> None:
+        """Send this request's (and, via the middleware cookie, the client's) next reads to the primary."""
+        state = _consistency.get()
+        if state is not None and self.settings.read_your_writes_seconds > 0:
+            state.primary_until = time.time() + self.settings.read_your_writes_seconds
+            state.wrote = True
+
+def _busy(pool: MeteredPool) -> int:
+    return pool.get_size() - pool.get_idle_size() + pool.waiting
@@ -0,0 +1,259 @@
+import asyncio, logging, time
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from models import Product, ProductFilter, ProductPatchItem, ProductSortField, SearchMode, SortOrder
+from .catalog_snapshot import CatalogSnapshot
+from .product_repository import CsvSource, ProductRepository, ProductRow
+from .read_router import primary_reads
+
+logger = logging.getLogger(__name__)
+
+LOAD_BATCH_SIZE = 20000
+CHANGES_BATCH_SIZE = 5000
+# Sorts after every product id, so a (version, MAX_PRODUCT_ID) position is past that whole version
+MAX_PRODUCT_ID = 2 ** 63 - 1
+
+class SnapshotProductRepository(ProductRepository):
+    """Serves listing pages and category statistics from a CatalogSnapshot of another repository.
+
+    Every other call, and every read while the snapshot is not loaded, goes to
+    the inner repository. The snapshot catches up from the inner repository's
+    change feed before a read once a write was made through this process, a
+    change notification arrived, or refresh_seconds have passed since it last
+    caught up, so writes are visible to this process's next read and other
+    processes' writes within refresh_seconds.
+    """
+
+    def __init__(self, inner: ProductRepository, refresh_seconds: float = 1.0):
+        self.inner = inner
+        self.refresh_seconds = refresh_seconds
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self.stale = True
+        # Counts mark_stale calls, so a refresh can tell whether a write landed while it ran
+        self.stale_marks = 0
+        self.refreshed_at = 0.0
+        self.refreshes = 0
+        self.reloads = 0
+        self._lock = asyncio.Lock()
+
+    async def connect(self) -> Any:
+        return await self.inner.connect()
+
+    async def get_version(self) -> Optional[str]:
+        return await self.inner.get_version()
+
+    async def close(self) -> None:
+        self.snapshot = None
+        await self.inner.close()
+
+    async def load(self) -> None:
+        """Build the snapshot from a full scan of the inner repository, in id order."""
+        async with self._lock:
+            await self._load()
+
+    async def _load(self) -> None:
+        marks, started = self.stale_marks, time.monotonic()
+        # Every version below safe_version is committed, so the scan that follows sees all of them;
+        # writes that land during the scan are replayed from the change feed afterwards
+        _, safe_version, _ = await self.inner.get_changes(0, MAX_PRODUCT_ID, 0)
+        snapshot = CatalogSnapshot()
+        after: Optional[Tuple[Any, int]] = None
+        try:
+            # safe_version is the primary's; a replica may not have replayed every version below it yet
+            with primary_reads():
+                while True:
+                    rows = await self.inner.list_products(None, ProductSortField.id, SortOrder.asc, LOAD_BATCH_SIZE, after)
+                    snapshot.extend(rows)
+                    if len(rows) < LOAD_BATCH_SIZE:
+                        break
+                    after = (rows[-1]["id"], rows[-1]["id"])
+            snapshot.reindex()
+        except ValueError:
+            logger.exception("Products cannot be held in the catalog snapshot; serving reads from the database")
+            self.snapshot = None
+            return
+        snapshot.version = safe_version - 1
+        self.snapshot = snapshot
+        self.reloads += 1
+        self._caught_up(marks, started)
+
+    def _caught_up(self, marks: int, started: float) -> None:
+        # Writes that finished while the changes were read may be missing, so they keep the snapshot stale
+        self.refreshed_at = started
+        self.stale = self.stale_marks != marks
+
+    async def refresh(self) -> None:
+        """Apply the changes made since the snapshot was last brought up to date."""
+        async with self._lock:
+            await self._refresh()
+
+    async def _refresh(self) -> None:
+        if self.snapshot is None:
+            return
+        marks, started = self.stale_marks, time.monotonic()
+        since, last_id = self.snapshot.version, MAX_PRODUCT_ID
+        while True:
+            horizon, safe_version, rows = await self.inner.get_changes(since, last_id, CHANGES_BATCH_SIZE)
+            if not horizon <= since < safe_version:
+                if since < horizon:
+                    # Tombstones the snapshot never saw were purged
+                    await self._load()
+                else:
+                    self._caught_up(marks, started)
+                return
+            try:
+                self.snapshot.apply(
+                    [row for row in rows if not row["deleted"]],
+                    [row["id"] for row in rows if row["deleted"]],
+                )
+            except ValueError:
+                logger.exception("Products cannot be held in the catalog snapshot; serving reads from the database")
+                self.snapshot = None
+                return
+            if len(rows) < CHANGES_BATCH_SIZE:
+                self.snapshot.version = max(self.snapshot.version, safe_version - 1)
+                break
+            since, last_id = rows[-1]["version"], rows[-1]["id"]
+            # Rows of this version past last_id are still to come; replaying the ones applied is harmless
+            self.snapshot.version = since - 1
+        self.refreshes += 1
+        self._caught_up(marks, started)
+
+    def mark_stale(self) -> None:
+        self.stale = True
+        self.stale_marks += 1
+
+    def handle_change_notification(self, payload: Optional[str]) -> None:
+        """LISTEN callback: another process wrote products, so catch up before the next read."""
+        self.mark_stale()
+
+    def _due(self) -> bool:
+        return self.snapshot is not None and (self.stale or time.monotonic() - self.refreshed_at >= self.refresh_seconds)
+
+    async def _current(self) -> Optional[CatalogSnapshot]:
+        if self._due():
+            # Readers arriving during a refresh wait for it rather than read the snapshot it is updating
+            async with self._lock:
+                # The refresh they waited for usually caught up already
+                if self._due():
+                    await self._refresh()
+        return self.snapshot
+
+    def stats(self) -> Dict[str, int]:
+        stats = self.snapshot.stats() if self.snapshot is not None else {}
+        return {"loaded": int(self.snapshot is not None), **stats, "refreshes": self.refreshes, "reloads": self.reloads}
+
+    async def list_products(
+        self,
+        filters: Optional[ProductFilter],
+        sort: ProductSortField,
+        order: SortOrder,
+        limit: int,
+        after: Optional[Tuple[Any, int]] = None
+    ) -> List[ProductRow]:
+        snapshot = await self._current()
+        if snapshot is None:
+            return await self.inner.list_products(filters, sort, order, limit, after)
+        return snapshot.list_products(filters, sort, order, limit, after)
+
+    async def get_category_stats(self, recent_days: int, category: Optional[str] = None) -> List[ProductRow]:
+        snapshot = await self._current()
+        if snapshot is None:
+            return await self.inner.get_category_stats(recent_days, category)
+        return snapshot.category_stats(recent_days, category)
+
+    async def refresh_category_stats(self) -> None:
+        """The snapshot computes statistics from its own columns; only the inner repository's rollups need rebuilding."""
+        await self.inner.refresh_category_stats()
+
+    async def insert_product(self, product: Product) -> int:
+        product_id = await self.inner.insert_product(product)
+        self.mark_stale()
+        return product_id
+
+    async def insert_and_fetch_product(self, product: Product) -> ProductRow:
+        row = await self.inner.insert_and_fetch_product(product)
+        self.mark_stale()
+        return row
+
+    async def insert_products(self, products: Sequence[Product], chunk_size: int, use_copy: bool = True) -> List[int]:
+        ids = await self.inner.insert_products(products, chunk_size, use_copy)
+        self.mark_stale()
+        return ids
+
+    async def copy_products_csv(self, source: CsvSource) -> int:
+        count = await self.inner.copy_products_csv(source)
+        self.mark_stale()
+        return count
+
+    async def insert_product_idempotent(self, product: Product, key: str, request_hash: bytes) -> Tuple[int, Optional[bytes]]:
+        result = await self.inner.insert_product_idempotent(product, key, request_hash)
+        self.mark_stale()
+        return result
+
+    async def purge_idempotency_keys(self, older_than: datetime) -> int:
+        return await self.inner.purge_idempotency_keys(older_than)
+
+    async def upsert_product(self, product: Product) -> Tuple[ProductRow, bool]:
+        result = await self.inner.upsert_product(product)
+        self.mark_stale()
+        return result
+
+    async def upsert_products(self, products: Sequence[Product], chunk_size: int) -> List[ProductRow]:
+        rows = await self.inner.upsert_products(products, chunk_size)
+        self.mark_stale()
+        return rows
+
+    async def get_product(self, product_id: int) -> Optional[ProductRow]:
+        return await self.inner.get_product(product_id)
+
+    async def get_products(self, product_ids: Sequence[int]) -> List[ProductRow]:
+        return await self.inner.get_products(product_ids)
+
+    async def update_product(self, product_id: int, product: Product) -> bool:
+        updated = await self.inner.update_product(product_id, product)
+        self.mark_stale()
+        return updated
+
+    async def delete_product(self, product_id: int) -> bool:
+        deleted = await self.inner.delete_product(product_id)
+        self.mark_stale()
+        return deleted
+
+    async def patch_products(self, patches: Sequence[ProductPatchItem]) -> List[int]:
+        ids = await self.inner.patch_products(patches)
+        self.mark_stale()
+        return ids
+
+    async def update_products_where(
+        self,
+        filters: ProductFilter,
+        values: Dict[str, Any],
+        price_change_percent: Optional[Decimal] = None
+    ) -> List[int]:
+        ids = await self.inner.update_products_where(filters, values, price_change_percent)
+        self.mark_stale()
+        return ids
+
+    async def delete_products(self, product_ids: Sequence[int]) -> List[int]:
+        ids = await self.inner.delete_products(product_ids)
+        self.mark_stale()
+        return ids
+
+    async def delete_products_where(self, filters: ProductFilter) -> List[int]:
+        ids = await self.inner.delete_products_where(filters)
+        self.mark_stale()
+        return ids
+
+    async def search_products(self, text: str, mode: SearchMode, limit: int, offset: int) -> List[ProductRow]:
+        return await self.inner.search_products(text, mode, limit, offset)
+
+    def export_products(self, filters: Optional[ProductFilter], batch_size: int) -> AsyncIterator[List[ProductRow]]:
+        return self.inner.export_products(filters, batch_size)
+
+    async def get_changes(self, since: int, last_id: int, limit: int) -> Tuple[int, int, List[ProductRow]]:
+        return await self.inner.get_changes(since, last_id, limit)
+
+    async def purge_tombstones(self, older_than: datetime) -> int:
+        return await self.inner.purge_tombstones(older_than)
@@ -0,0 +1,79 @@
+"""Production entry point: run server:app in several uvicorn worker processes.
+
+Configuration comes from the environment:
+
+    WEB_CONCURRENCY            worker processes (default: one per CPU)
+    HOST / PORT                bind address (default 0.0.0.0:3000)
+    DB_MAX_CONNECTIONS         connection budget shared by all workers; read from
+                               the server's max_connections when unset
+    DB_RESERVED_CONNECTIONS    connections left free for admin tools (default 5)
+    GRACEFUL_SHUTDOWN_SECONDS  time allowed for in-flight requests to drain (default 25)
+    KEEPALIVE_SECONDS          how long an idle client connection stays open (default 75,
+                               above the 60s idle timeout of common load balancers, so
+                               they never reuse a connection the server is closing)
+    UVICORN_LOOP / UVICORN_HTTP  event loop and HTTP parser ("auto" uses uvloop and
+                               httptools when they are installed)
+    ACCESS_LOG                 set to 1 to enable per-request access logging
+    RATE_LIMIT_PER_SECOND / RATE_LIMIT_BURST  per-client limits for the whole server;
+                               each worker enforces 1/WEB_CONCURRENCY of them
+
+Every worker keeps its own metrics, caches, rate limits and query statistics. /metrics
+labels each sample with worker="<pid>" and the JSON stats endpoints name the worker in an
+X-Worker-Id header. A scrape is answered by whichever worker accepts it, so dashboards
+must keep the latest sample of each worker and sum them across the worker label.
+
+Usage (from src/backend):
+
+    WEB_CONCURRENCY=4 python serve.py
+"""
+import asyncio, asyncpg, logging, os
+from typing import Optional
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+async def detect_max_connections() -> Optional[int]:
+    """Read max_connections from the primary, or return None if it cannot be reached."""
+    try:
+        conn = await asyncpg.connect(
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            database=os.getenv("DB_NAME"),
+            host=os.getenv("DB_HOST"),
+            port=os.getenv("DB_PORT"),
+            timeout=5
+        )
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError):
+        logger.warning("Could not read max_connections; worker pools keep their configured size")
+        return None
+    try:
+        return int(await conn.fetchval("SHOW max_connections"))
+    finally:
+        await conn.close()
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    workers = int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+    # Workers inherit the environment, so each sizes its pool from the same budget
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    if not os.getenv("DB_MAX_CONNECTIONS"):
+        max_connections = asyncio.run(detect_max_connections())
+        if max_connections:
+            os.environ["DB_MAX_CONNECTIONS"] = str(max_connections)
+    logger.info("Starting %d workers with a budget of %s database connections", workers, os.getenv("DB_MAX_CONNECTIONS", "unlimited"))
+
+    uvicorn.run(
+        "server:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "3000")),
+        workers=workers,
+        loop=os.getenv("UVICORN_LOOP", "auto"),
+        http=os.getenv("UVICORN_HTTP", "auto"),
+        timeout_graceful_shutdown=float(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "25")),
+        timeout_keep_alive=int(os.getenv("KEEPALIVE_SECONDS", "75")),
+        access_log=os.getenv("ACCESS_LOG", "0") == "1",
+        proxy_headers=True,
+    )
+
+if __name__ == "__main__":
+    main()
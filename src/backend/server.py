@@ -1,23 +1,150 @@
-import os
-from fastapi import Body, FastAPI, HTTPException, Path, status
+import asyncio, asyncpg, logging, os, signal, threading
+from datetime import datetime
+from decimal import Decimal
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, Path, Query, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any, List,  AsyncGenerator
-from models import Product
-from repositories import PostgresRepository
-from services import ProductService
-from utils import random_product
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from typing import Dict, Any, Callable, List, Optional, AsyncGenerator
+from models import (
+    BulkInsertResult,
+    BulkWriteResult,
+    CatalogStats,
+    ExportFormat,
+    Product,
+    ProductBatch,
+    ProductChanges,
+    ProductBulkDelete,
+    ProductBulkUpdate,
+    ProductFilter,
+    ProductIds,
+    ProductPage,
+    ProductPatch,
+    ProductPatchItem,
+    ProductSearchPage,
+    ProductSortField,
+    SearchMode,
+    SortOrder,
+)
+from cache import LRUCache
+from middleware import (
+    AdmissionControlMiddleware,
+    AdmissionController,
+    AdmissionSettings,
+    CompressionMiddleware,
+    CompressionSettings,
+    MetricsMiddleware,
+    ReadYourWritesMiddleware,
+)
+from repositories import (
+    PRODUCT_QUERIES,
+    PoolAcquireTimeout,
+    PoolSettings,
+    PostgresProductRepository,
+    PostgresRepository,
+    ProductPartitions,
+    QueryPlanSettings,
+    ReadRoutingSettings,
+    SnapshotProductRepository,
+)
+from services import (
+    PRODUCT_CHANGES_CHANNEL,
+    CachedProductService,
+    ChangesExpired,
+    IdempotencyKeyReused,
+    InsertBatcher,
+    InsertBatchSettings,
+    PartitionMaintainer,
+    PartitionSettings,
+    ProductEventBroadcaster,
+    ProductService,
+)
+from services.product_import import parse_products
+from services.product_service import DEFAULT_CHANGES_LIMIT, DEFAULT_PAGE_SIZE, DEFAULT_RECENT_DAYS, MAX_PAGE_SIZE, MAX_SEARCH_OFFSET
+from utils import (
+    FastJSONResponse,
+    csv_chunk,
+    csv_header,
+    http_date,
+    is_not_modified,
+    ndjson_chunk,
+    page_etag,
+    product_etag,
+    random_product,
+)
+from utils.metrics import REGISTRY, render_gauge, render_gauges, render_histogram
+
+logger = logging.getLogger(__name__)
 
 async def lifespan(app: FastAPI) -> AsyncGenerator:
     """Lifespan context manager to manage startup and shutdown events."""
+    # serve.py runs several worker processes, each with its own counters; label them apart
+    REGISTRY.const_labels["worker"] = WORKER_ID
     await repo.connect()
-    global product_service
-    product_service = ProductService(repo.pool)
+    global product_service, partition_maintainer
+    products = PostgresProductRepository(repo.pool, repo.reads)
+    if CATALOG_SNAPSHOT and repo.pool:
+        products = SnapshotProductRepository(products, CATALOG_SNAPSHOT_REFRESH_SECONDS)
+        await products.load()
+    insert_batcher = None
+    if WRITE_BEHIND.enabled and repo.pool:
+        # Batched rows are written by a background task; reads after them must still see them
+        insert_batcher = InsertBatcher(products, WRITE_BEHIND, repo.reads.note_write if repo.reads else None)
+        insert_batcher.start()
+    if PRODUCT_CACHE_SIZE > 0:
+        product_service = CachedProductService(products, LRUCache(PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL), insert_batcher=insert_batcher)
+    else:
+        product_service = ProductService(products, insert_batcher=insert_batcher)
+    if repo.pool:
+        try:
+            await repo.listen(PRODUCT_CHANGES_CHANNEL, product_events.handle_notification)
+            if isinstance(product_service, CachedProductService):
+                # Other worker processes write too; their changes must evict our cached copies
+                await repo.listen(PRODUCT_CHANGES_CHANNEL, product_service.handle_change_notification)
+            if isinstance(products, SnapshotProductRepository):
+                await repo.listen(PRODUCT_CHANGES_CHANNEL, products.handle_change_notification)
+        except (OSError, asyncpg.PostgresError):
+            logger.exception("Product change notifications are unavailable")
+    if PARTITIONS.enabled and repo.pool:
+        partition_maintainer = PartitionMaintainer(ProductPartitions(repo.pool), PARTITIONS)
+        partition_maintainer.start()
+    end_streams_on_shutdown_signal()
     yield
+    product_events.close()
+    if partition_maintainer is not None:
+        await partition_maintainer.close()
+    if insert_batcher is not None:
+        # Requests have drained by now; write whatever they left queued before the pool closes
+        await insert_batcher.close()
+    await products.close()
     await repo.close()
 
+def end_streams_on_shutdown_signal() -> None:
+    """Chain onto the server's SIGTERM/SIGINT handlers so open SSE/WebSocket streams end while requests drain."""
+    if threading.current_thread() is not threading.main_thread():
+        # Only the main thread may install handlers (e.g. not under TestClient)
+        return
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(signum)
+        if not callable(previous):
+            continue
+
+        def handler(received: int, frame: Any, previous: Callable = previous) -> None:
+            loop.call_soon_threadsafe(product_events.close)
+            previous(received, frame)
+
+        signal.signal(signum, handler)
+
 
 app = FastAPI(lifespan=lifespan)
 
+POOL_SETTINGS = PoolSettings.from_env()
+ADMISSION = AdmissionSettings.from_env(POOL_SETTINGS.max_size)
+admission = AdmissionController(ADMISSION)
+if ADMISSION.max_concurrency > 0:
+    # Added first so it runs inside CORS: shed responses still carry CORS headers
+    app.add_middleware(AdmissionControlMiddleware, controller=admission)
+
 origins = [
     "*",
 ]
@@ -30,6 +157,16 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+READ_ROUTING = ReadRoutingSettings.from_env()
+if READ_ROUTING.replicas and READ_ROUTING.read_your_writes_seconds > 0:
+    app.add_middleware(ReadYourWritesMiddleware, sticky_seconds=READ_ROUTING.read_your_writes_seconds)
+
+COMPRESSION = CompressionSettings.from_env()
+if COMPRESSION.encodings:
+    # Outermost, so admission slots and request metrics are not held while large bodies compress
+    app.add_middleware(CompressionMiddleware, settings=COMPRESSION)
 
 repo = PostgresRepository(
     user=os.getenv("DB_USER"),
@@ -37,9 +174,94 @@ repo = PostgresRepository(
     database=os.getenv("DB_NAME"),
     host=os.getenv("DB_HOST"),
     port=os.getenv("DB_PORT"),
+    settings=POOL_SETTINGS,
+    read_routing=READ_ROUTING,
 )
+# Prepare ProductService statements once per connection instead of on first use
+PRODUCT_QUERIES.settings = QueryPlanSettings.from_env()
+repo.add_init_hook(PRODUCT_QUERIES.prepare)
+
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "30"))
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "0") == "1"
+# Serve listings and category statistics from an in-process columnar copy of the catalog
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "0") == "1"
+CATALOG_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_REFRESH_SECONDS", "1"))
+WRITE_BEHIND = InsertBatchSettings.from_env()
+PARTITIONS = PartitionSettings.from_env()
+PRODUCT_EVENTS_QUEUE_SIZE = int(os.getenv("PRODUCT_EVENTS_QUEUE_SIZE", "100"))
+SSE_KEEPALIVE_SECONDS = 15.0
+# Metrics and stats are kept per worker process; responses say which worker produced them
+WORKER_ID = str(os.getpid())
+
+product_events = ProductEventBroadcaster(PRODUCT_EVENTS_QUEUE_SIZE)
+
+product_service = ProductService(PostgresProductRepository(repo.pool))
+partition_maintainer: Optional[PartitionMaintainer] = None
 
-product_service = ProductService(pool=repo.pool)
+def collect_runtime_metrics() -> List[str]:
+    """Expose pool and cache statistics as Prometheus gauges at scrape time."""
+    lines: List[str] = []
+    if repo.pool:
+        stats = repo.pool.stats()
+        for key in ("size", "idle", "in_use", "waiting", "max_size"):
+            lines += render_gauge(f"db_pool_{key}", f"Database pool {key.replace('_', ' ')} connections.", stats[key])
+        lines += render_gauge("db_pool_acquire_timeouts", "Pool acquire attempts that timed out.", stats["acquire_timeouts"])
+        lines += render_histogram(
+            "db_pool_acquire_wait_seconds", "Time spent waiting for a pool connection.", repo.pool.acquire_wait
+        )
+    if isinstance(product_service, CachedProductService):
+        for key, value in product_service.cache_stats().items():
+            lines += render_gauge(f"product_cache_{key}", f"Product cache {key}.", value)
+    if isinstance(product_service.repository, SnapshotProductRepository):
+        for key, value in product_service.repository.stats().items():
+            lines += render_gauge(f"catalog_snapshot_{key}", f"Catalog snapshot {key.replace('_', ' ')}.", value)
+    if product_service.insert_batcher is not None:
+        for key, value in product_service.insert_batcher.stats().items():
+            lines += render_gauge(f"write_behind_{key}", f"Write-behind inserts {key.replace('_', ' ')}.", value)
+    if partition_maintainer is not None:
+        for key, value in partition_maintainer.stats().items():
+            lines += render_gauge(f"product_partitions_{key}", f"Product partition maintenance {key}.", value)
+    for key, value in product_events.stats().items():
+        lines += render_gauge(f"product_events_{key}", f"Product change events {key}.", value)
+    if ADMISSION.max_concurrency > 0:
+        limiters = admission.stats()
+        for key in ("limit", "active", "queued", "rejected", "timed_out"):
+            samples = [({"route": route}, stats[key]) for route, stats in limiters.items()]
+            lines += render_gauges(f"http_admission_{key}", f"Admission control {key.replace('_', ' ')} requests per limiter.", samples)
+    return lines
+
+REGISTRY.register_collector(collect_runtime_metrics)
+
+@app.exception_handler(PoolAcquireTimeout)
+async def pool_acquire_timeout_handler(request: Request, exc: PoolAcquireTimeout) -> JSONResponse:
+    """Fail fast with 503 when the database pool is saturated."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(asyncpg.UniqueViolationError)
+async def unique_violation_handler(request: Request, exc: asyncpg.UniqueViolationError) -> JSONResponse:
+    """Report writes that collide with an existing product code as 409 Conflict."""
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": exc.detail or str(exc)})
+
+def product_filter(
+    category: Optional[str] = None,
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+) -> ProductFilter:
+    """Build a ProductFilter from the query string of listing endpoints."""
+    return ProductFilter(
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        created_after=created_after,
+        created_before=created_before
+    )
 
 @app.post("/api/hello_test")
 async def post_message(data: Dict[str, Any]) -> Dict[str, str]:
@@ -60,33 +282,224 @@ async def create_random_product() -> Dict[str, int]:
         price=random_p["price"],
         created_at=random_p["created_at"]
     )
-    product_id = await product_service.create_product(new_product)
-    if product_id:
-        product = await product_service.get_product_by_id(product_id)
-        if product:
-            return product
-        
-    else:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Product creation failed")
+    product = await product_service.create_and_fetch_product(new_product)
+    if product:
+        return product
+    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Product creation failed")
 
 @app.post("/api/products/")
-async def create_product(product: Product) -> Dict[str, int]:
-    """Create a new product."""
+async def create_product(
+    product: Product,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+) -> Dict[str, int]:
+    """Create a new product; retries carrying the same Idempotency-Key return the original ID."""
     if not product_service:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service not available")
     
-    product_id = await product_service.create_product(product)
+    if idempotency_key is not None:
+        try:
+            product_id, replayed = await product_service.create_product_idempotent(product, idempotency_key)
+        except IdempotencyKeyReused as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        response.headers["Idempotent-Replayed"] = "true" if replayed else "false"
+    else:
+        product_id = await product_service.create_product(product)
     if product_id:
         return {"id": product_id}
     else:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Product creation failed")
 
+@app.put("/api/products/upsert", response_model=Product)
+async def upsert_product(product: Product, response: Response) -> Product:
+    """Create a product, or update the product with the same code; 201 when a new row was inserted."""
+    if not product_service:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service not available")
+    stored, inserted = await product_service.upsert_product(product)
+    if inserted:
+        response.status_code = status.HTTP_201_CREATED
+    return stored
+
+@app.post("/api/products/bulk", response_model=BulkInsertResult)
+async def create_products_bulk(request: Request, upsert: bool = False) -> BulkInsertResult:
+    """Create many products from a JSON array, NDJSON or CSV body in a single transaction.
+
+    With upsert=true, rows whose code already exists update that product instead of conflicting.
+    """
+    if not product_service:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Service not available")
+
+    content_type = request.headers.get("content-type", "application/json")
+    try:
+        products, failed = parse_products(await request.body(), content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if upsert:
+        result = await product_service.upsert_products_bulk(products)
+        result.failed = failed
+        return result
+    product_ids = await product_service.create_products_bulk(products) if products else []
+    return BulkInsertResult(inserted=len(product_ids), ids=product_ids, failed=failed)
+
+@app.patch("/api/products/bulk", response_model=BulkWriteResult)
+async def patch_products_bulk(patches: List[ProductPatchItem]) -> BulkWriteResult:
+    """Partially update many products by ID in a single statement."""
+    if not patches:
+        return BulkWriteResult(affected=0)
+    product_ids = await product_service.patch_products(patches)
+    return BulkWriteResult(affected=len(product_ids))
+
+@app.patch("/api/products/", response_model=BulkWriteResult)
+async def update_products_where(update: ProductBulkUpdate) -> BulkWriteResult:
+    """Apply a set-based update, such as a percentage price change, to every matching product."""
+    try:
+        product_ids = await product_service.update_products_where(
+            update.filter, update.set, update.price_change_percent
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return BulkWriteResult(affected=len(product_ids))
+
+@app.post("/api/products/bulk-delete", response_model=BulkWriteResult)
+async def delete_products_bulk(delete: ProductBulkDelete) -> BulkWriteResult:
+    """Delete products by ID list or by filter in a single statement."""
+    if (delete.ids is None) == (delete.filter is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide either ids or filter")
+    try:
+        if delete.ids is not None:
+            product_ids = await product_service.delete_products(delete.ids)
+        else:
+            product_ids = await product_service.delete_products_where(delete.filter)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return BulkWriteResult(affected=len(product_ids))
+
+@app.post("/api/products/batch-get", response_model=ProductBatch)
+async def read_products_batch(body: ProductIds) -> ProductBatch:
+    """Fetch many products by ID in a single round trip."""
+    return await product_service.get_products_by_ids(body.ids)
+
+@app.get("/api/products/search", response_model=ProductSearchPage)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    mode: SearchMode = SearchMode.fts,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+) -> ProductSearchPage:
+    """Full-text, prefix or fuzzy search over product names and descriptions."""
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(await product_service.search_product_rows(q, mode, limit, offset))
+    return await product_service.search_products(q, mode, limit, offset)
+
+@app.get("/api/products/export")
+async def export_products(
+    filters: ProductFilter = Depends(product_filter),
+    format: ExportFormat = ExportFormat.ndjson,
+) -> StreamingResponse:
+    """Stream the catalog as NDJSON or CSV without materializing it in memory."""
+    async def stream() -> AsyncGenerator[bytes, None]:
+        if format == ExportFormat.csv:
+            yield csv_header()
+        async for rows in product_service.export_products(filters):
+            yield csv_chunk(rows) if format == ExportFormat.csv else ndjson_chunk(rows)
+
+    media_type = "text/csv" if format == ExportFormat.csv else "application/x-ndjson"
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="products.{format.value}"'}
+    )
+
+@app.get("/api/products/stats", response_model=CatalogStats)
+async def product_stats(
+    recent_days: int = Query(DEFAULT_RECENT_DAYS, ge=1, le=366),
+    category: Optional[str] = None,
+) -> CatalogStats:
+    """Per-category product counts, price range and average, and products created in the last recent_days days."""
+    return await product_service.get_category_stats(recent_days, category)
+
+@app.get("/api/products/changes", response_model=ProductChanges)
+async def product_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_CHANGES_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+) -> ProductChanges:
+    """Products written and IDs deleted after version since, for incremental sync."""
+    try:
+        return await product_service.get_changes(since, limit, cursor)
+    except ChangesExpired as e:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@app.get("/api/products/events")
+async def product_events_stream(request: Request) -> StreamingResponse:
+    """Server-Sent Events stream of product changes; a resync event means reload or use the change feed."""
+    async def stream() -> AsyncGenerator[bytes, None]:
+        with product_events.subscribe() as subscription:
+            yield b": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if message is None:
+                    break
+                event, data = message
+                yield f"event: {event}\ndata: {data}\n\n".encode()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/api/products/ws")
+async def product_events_socket(websocket: WebSocket) -> None:
+    """WebSocket stream of product changes, one JSON message per change or resync."""
+    await websocket.accept()
+    with product_events.subscribe() as subscription:
+        # Watch for the client going away while no events are flowing
+        receiver = asyncio.ensure_future(websocket.receive())
+        try:
+            while True:
+                getter = asyncio.ensure_future(subscription.get())
+                await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if receiver.done() and receiver.result()["type"] == "websocket.disconnect":
+                    getter.cancel()
+                    break
+                if getter.done():
+                    message = getter.result()
+                    if message is None:
+                        # 1012: service restart; clients should reconnect
+                        await websocket.close(code=1012)
+                        break
+                    await websocket.send_text(message[1])
+                else:
+                    getter.cancel()
+                if receiver.done():
+                    receiver = asyncio.ensure_future(websocket.receive())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
+
 @app.get("/api/products/{product_id}", response_model=Product)
-async def read_product(product_id: int = Path(..., gt=0)) -> Product:
+async def read_product(request: Request, response: Response, product_id: int = Path(..., gt=0)) -> Product:
     product = await product_service.get_product_by_id(product_id)
-    if product:
-        return product
-    raise HTTPException(status_code=404, detail="Product not found")
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    headers = {
+        "ETag": product_etag(product.version),
+        "Last-Modified": http_date(product.updated_at),
+        "Cache-Control": "no-cache",
+    }
+    if is_not_modified(request.headers, headers["ETag"], product.updated_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return product
 
 @app.put("/api/products/{product_id}", response_model=Dict[str, str])
 async def update_product(product_id: int, product: Product) -> Dict[str, str]:
@@ -95,6 +508,14 @@ async def update_product(product_id: int, product: Product) -> Dict[str, str]:
         return {"detail": "Product updated successfully"}
     raise HTTPException(status_code=404, detail="Product not found")
 
+@app.patch("/api/products/{product_id}", response_model=Dict[str, str])
+async def patch_product(product_id: int, patch: ProductPatch) -> Dict[str, str]:
+    """Partially update a product, leaving omitted fields unchanged."""
+    product_ids = await product_service.patch_products([ProductPatchItem(id=product_id, **patch.model_dump())])
+    if product_ids:
+        return {"detail": "Product updated successfully"}
+    raise HTTPException(status_code=404, detail="Product not found")
+
 @app.delete("/api/products/{product_id}", response_model=Dict[str, str])
 async def delete_product(product_id: int) -> Dict[str, str]:
     success = await product_service.delete_product(product_id)
@@ -102,10 +523,65 @@ async def delete_product(product_id: int) -> Dict[str, str]:
         return {"detail": "Product deleted successfully"}
     raise HTTPException(status_code=404, detail="Product not found")
 
-@app.get("/api/products/", response_model=List[Product])
-async def list_products() -> List[Product]:
-    products = await product_service.list_products()
-    return products
+@app.get("/api/products/", response_model=ProductPage)
+async def list_products(
+    request: Request,
+    response: Response,
+    filters: ProductFilter = Depends(product_filter),
+    sort: ProductSortField = ProductSortField.id,
+    order: SortOrder = SortOrder.asc,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+) -> ProductPage:
+    try:
+        if FAST_JSON_RESPONSES:
+            page = await product_service.list_product_rows(filters, sort, order, limit, cursor)
+            etag = page_etag(((row["id"], row["version"]) for row in page["items"]), page["next_cursor"])
+        else:
+            page = await product_service.list_products_page(filters, sort, order, limit, cursor)
+            etag = page_etag(((item.id, item.version) for item in page.items), page.next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    # Pages only carry an ETag: deletions would not move a Last-Modified date forward
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request.headers, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(page, headers=headers)
+    response.headers.update(headers)
+    return page
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Serve request, query, pool and cache metrics in the Prometheus text format.
+
+    Each sample covers only the worker that answered the scrape and carries its pid as the
+    worker label; dashboards must sum over that label to report the whole server.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/pool/stats", response_model=Dict[str, Any])
+async def pool_stats(response: Response) -> Dict[str, Any]:
+    """Report database pool occupancy and acquire wait-time histogram for the answering worker."""
+    response.headers["X-Worker-Id"] = WORKER_ID
+    stats = repo.pool_stats()
+    if stats is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database pool not available")
+    return stats
+
+@app.get("/api/queries/stats", response_model=Dict[str, Dict[str, Any]])
+async def query_stats(response: Response) -> Dict[str, Dict[str, Any]]:
+    """Report per-statement call counts and execution times of the answering worker, slowest total first."""
+    response.headers["X-Worker-Id"] = WORKER_ID
+    return PRODUCT_QUERIES.stats()
+
+@app.get("/api/cache/stats", response_model=Dict[str, int])
+async def cache_stats(response: Response) -> Dict[str, int]:
+    """Report product cache hit/miss counters of the answering worker."""
+    response.headers["X-Worker-Id"] = WORKER_ID
+    if not isinstance(product_service, CachedProductService):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product cache is disabled")
+    return product_service.cache_stats()
 
 if __name__ == "__main__":
     import uvicorn
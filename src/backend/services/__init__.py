@@ -1 +1,5 @@
-from .product_service import ProductService
\ No newline at end of file
+from .insert_batcher import InsertBatcher, InsertBatchSettings
+from .partition_maintenance import PartitionMaintainer, PartitionSettings
+from .product_service import ChangesExpired, IdempotencyKeyReused, ProductService
+from .cached_product_service import CachedProductService
+from .product_events import PRODUCT_CHANGES_CHANNEL, ProductEventBroadcaster, Subscription
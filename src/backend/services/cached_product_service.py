@@ -0,0 +1,195 @@
+import asyncio, asyncpg, json
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from cache import BaseCache
+from models import BulkInsertResult, Product, ProductBatch, ProductFilter, ProductPatch, ProductPatchItem
+from repositories import ProductRepository, ReadRouter, primary_reads
+from .insert_batcher import InsertBatcher
+from .product_service import BULK_CHUNK_SIZE, ProductService
+
+class CachedProductService(ProductService):
+    """ProductService with a read-through cache on lookups by ID.
+
+    Writes through this service invalidate the affected entries, and concurrent
+    misses on the same ID share a single database query.
+    """
+
+    def __init__(
+        self,
+        repository: Union[ProductRepository, asyncpg.Pool],
+        cache: BaseCache,
+        reads: Optional[ReadRouter] = None,
+        insert_batcher: Optional[InsertBatcher] = None
+    ):
+        super().__init__(repository, reads, insert_batcher)
+        self.cache = cache
+        self._inflight: Dict[int, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self._generation = 0
+
+    @staticmethod
+    def _key(product_id: int) -> str:
+        return f"product:{product_id}"
+
+    async def get_product_by_id(self, product_id: int) -> Optional[Product]:
+        """Retrieve a product by its ID, from the cache when possible."""
+        product = await self.cache.get(self._key(product_id))
+        if product is not None:
+            self.hits += 1
+            return product
+
+        task = self._inflight.get(product_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(product_id))
+            self._inflight[product_id] = task
+        # Shield the shared load so one cancelled caller does not fail the others
+        return await asyncio.shield(task)
+
+    async def _load(self, product_id: int) -> Optional[Product]:
+        task = asyncio.current_task()
+        try:
+            # Fill from the primary: a lagging replica could re-cache a row just invalidated
+            with primary_reads():
+                product = await super().get_product_by_id(product_id)
+            # Skip caching if the entry was invalidated while the query was running
+            if product is not None and self._inflight.get(product_id) is task:
+                await self.cache.set(self._key(product_id), product)
+            return product
+        finally:
+            if self._inflight.get(product_id) is task:
+                del self._inflight[product_id]
+
+    async def get_products_by_ids(self, product_ids: Sequence[int]) -> ProductBatch:
+        """Retrieve many products, querying the database only for IDs missing from the cache."""
+        found: Dict[int, Product] = {}
+        uncached = []
+        for product_id in dict.fromkeys(product_ids):
+            product = await self.cache.get(self._key(product_id))
+            if product is not None:
+                found[product_id] = product
+            else:
+                uncached.append(product_id)
+        self.hits += len(found)
+
+        if uncached:
+            self.misses += len(uncached)
+            generation = self._generation
+            with primary_reads():
+                fetched = await super().get_products_by_ids(uncached)
+            for product in fetched.items:
+                found[product.id] = product
+                # Do not write back rows that may have been invalidated during the query
+                if self._generation == generation:
+                    await self.cache.set(self._key(product.id), product)
+        return self._ordered_batch(product_ids, found)
+
+    async def invalidate(self, product_id: int) -> None:
+        """Drop a product from the cache and detach any in-flight load."""
+        self._generation += 1
+        self._inflight.pop(product_id, None)
+        await self.cache.delete(self._key(product_id))
+        self.invalidations += 1
+
+    async def invalidate_many(self, product_ids: Iterable[int]) -> None:
+        """Drop several products from the cache."""
+        for product_id in product_ids:
+            await self.invalidate(product_id)
+
+    async def clear(self) -> None:
+        """Drop every cached product."""
+        self._generation += 1
+        self._inflight.clear()
+        await self.cache.clear()
+        self.invalidations += 1
+
+    def handle_change_notification(self, payload: Optional[str]) -> None:
+        """LISTEN callback: invalidate products changed by any process, or everything when the ids are unknown."""
+        change = json.loads(payload) if payload is not None else {"op": "resync", "ids": None}
+        # New rows cannot be stale in the cache
+        if change["op"] == "insert":
+            return
+        if change["ids"] is None:
+            asyncio.ensure_future(self.clear())
+        else:
+            asyncio.ensure_future(self.invalidate_many(change["ids"]))
+
+    async def create_and_fetch_product(self, product: Product) -> Optional[Product]:
+        """Insert a new product and prime the cache with the stored row."""
+        created = await super().create_and_fetch_product(product)
+        if created is not None:
+            await self.cache.set(self._key(created.id), created)
+        return created
+
+    async def upsert_product(self, product: Product) -> Tuple[Product, bool]:
+        """Insert or update a product by code and invalidate its cache entry."""
+        stored, inserted = await super().upsert_product(product)
+        await self.invalidate(stored.id)
+        return stored, inserted
+
+    async def upsert_products_bulk(self, products: Sequence[Product], chunk_size: int = BULK_CHUNK_SIZE) -> BulkInsertResult:
+        """Insert or update many products by code and invalidate their cache entries."""
+        result = await super().upsert_products_bulk(products, chunk_size)
+        await self.invalidate_many(dict.fromkeys(result.ids))
+        return result
+
+    async def update_product(self, product_id: int, updated_product: Product) -> bool:
+        """Update an existing product and invalidate its cache entry."""
+        try:
+            return await super().update_product(product_id, updated_product)
+        finally:
+            await self.invalidate(product_id)
+
+    async def delete_product(self, product_id: int) -> bool:
+        """Delete a product and invalidate its cache entry."""
+        try:
+            return await super().delete_product(product_id)
+        finally:
+            await self.invalidate(product_id)
+
+    async def patch_products(self, patches: Sequence[ProductPatchItem]) -> List[int]:
+        """Apply partial updates and invalidate the updated products."""
+        try:
+            return await super().patch_products(patches)
+        finally:
+            await self.invalidate_many(patch.id for patch in patches)
+
+    async def update_products_where(
+        self,
+        filters: ProductFilter,
+        values: ProductPatch,
+        price_change_percent: Optional[Decimal] = None
+    ) -> List[int]:
+        """Apply a set-based update and invalidate the updated products."""
+        product_ids = await super().update_products_where(filters, values, price_change_percent)
+        await self.invalidate_many(product_ids)
+        return product_ids
+
+    async def delete_products(self, product_ids: Sequence[int]) -> List[int]:
+        """Delete many products and invalidate their cache entries."""
+        try:
+            return await super().delete_products(product_ids)
+        finally:
+            await self.invalidate_many(product_ids)
+
+    async def delete_products_where(self, filters: ProductFilter) -> List[int]:
+        """Delete matching products and invalidate their cache entries."""
+        product_ids = await super().delete_products_where(filters)
+        await self.invalidate_many(product_ids)
+        return product_ids
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Return hit/miss counters together with the backend statistics."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "inflight": len(self._inflight),
+            **self.cache.stats(),
+        }
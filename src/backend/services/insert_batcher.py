@@ -0,0 +1,200 @@
+import asyncio, asyncpg, logging, os, time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+from models import Product
+from repositories import ProductRepository, primary_reads
+from repositories.product_repository import ProductRow
+
+logger = logging.getLogger(__name__)
+
+# Errors caused by one row (a duplicate code, a value out of range); a batch failing with one
+# is split up so that only the offending rows fail. Anything else fails the whole batch.
+ROW_ERRORS = (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError)
+
+@dataclass
+class InsertBatchSettings:
+    enabled: bool = False
+    max_batch: int = 500
+    max_delay: float = 0.005
+    max_pending: int = 10000
+    # One round trip per batch; COPY takes a second one to reserve the IDs and gains little at a few hundred rows
+    use_copy: bool = False
+
+    @classmethod
+    def from_env(cls) -> "InsertBatchSettings":
+        """Build write-behind settings from WRITE_BEHIND_* environment variables."""
+        defaults = cls()
+        return cls(
+            enabled=os.getenv("WRITE_BEHIND_INSERTS", "0") == "1",
+            max_batch=int(os.getenv("WRITE_BEHIND_MAX_BATCH", defaults.max_batch)),
+            max_delay=float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", defaults.max_delay * 1000)) / 1000,
+            max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", defaults.max_pending)),
+            use_copy=os.getenv("WRITE_BEHIND_USE_COPY", "0") == "1",
+        )
+
+class PendingInsert:
+    """A queued product and the future its caller is waiting on."""
+
+    __slots__ = ("product", "fetch", "future", "queued_at")
+
+    def __init__(self, product: Product, fetch: bool):
+        self.product = product
+        self.fetch = fetch
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.monotonic()
+
+    def resolve(self, result: Union[int, ProductRow]) -> None:
+        # The caller may have given up (e.g. the client disconnected); its row is written regardless
+        if not self.future.done():
+            self.future.set_result(result)
+
+    def fail(self, exc: BaseException) -> None:
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+class InsertBatcher:
+    """Write-behind queue that coalesces single-product inserts into multi-row writes.
+
+    Callers wait on a future while a background task flushes the queue with one
+    insert_products call (COPY or a multi-row INSERT, on one pooled connection)
+    once max_batch products are waiting or the oldest has waited max_delay.
+    At most max_pending products wait at a time; further callers block until a
+    flush makes room. close() flushes everything still queued.
+    """
+
+    def __init__(
+        self,
+        repository: ProductRepository,
+        settings: InsertBatchSettings,
+        note_write: Optional[Callable[[], None]] = None
+    ):
+        self.repository = repository
+        self.settings = settings
+        # Runs in each caller's context once its row is written, e.g. ReadRouter.note_write for read-your-writes
+        self.note_write = note_write
+        self._pending: List[PendingInsert] = []
+        self._slots = asyncio.Semaphore(settings.max_pending)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.batches = 0
+        self.inserted = 0
+        self.splits = 0
+        self.failed = 0
+        self.largest_batch = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        """Stop accepting products and wait until every queued one is written."""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def insert(self, product: Product) -> int:
+        """Queue a product and return its ID once the batch holding it is written."""
+        return await self._submit(product, False)
+
+    async def insert_and_fetch(self, product: Product) -> ProductRow:
+        """Queue a product and return it as stored once the batch holding it is written."""
+        return await self._submit(product, True)
+
+    async def _submit(self, product: Product, fetch: bool) -> Union[int, ProductRow]:
+        if self._closing or self._task is None:
+            # Shutting down (or never started): write directly rather than into a queue nobody drains
+            if fetch:
+                return await self.repository.insert_and_fetch_product(product)
+            return await self.repository.insert_product(product)
+        async with self._slots:
+            pending = PendingInsert(product, fetch)
+            self._pending.append(pending)
+            if len(self._pending) == 1 or len(self._pending) >= self.settings.max_batch:
+                self._wakeup.set()
+            # Shielded: a cancelled caller must not cancel the future the flusher resolves
+            result = await asyncio.shield(pending.future)
+        if self.note_write is not None:
+            self.note_write()
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Hold a partial batch until it fills up or its oldest product reaches max_delay
+            while not self._closing and 0 < len(self._pending) < self.settings.max_batch:
+                remaining = self._pending[0].queued_at + self.settings.max_delay - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                self._wakeup.clear()
+            while self._pending:
+                batch = self._pending[:self.settings.max_batch]
+                del self._pending[:len(batch)]
+                await self._flush(batch)
+                if not self._closing and 0 < len(self._pending) < self.settings.max_batch:
+                    # Products queued during the flush wait out what is left of their own deadline
+                    self._wakeup.set()
+                    break
+            if self._closing and not self._pending:
+                return
+
+    async def _flush(self, batch: List[PendingInsert]) -> None:
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            ids = await self.repository.insert_products(
+                [pending.product for pending in batch], len(batch), self.settings.use_copy
+            )
+        except ROW_ERRORS as exc:
+            if len(batch) == 1:
+                self._fail(batch, exc)
+                return
+            # The batch was rolled back; bisect it so the rejected rows fail alone
+            # at a cost of a few extra writes, still one connection at a time
+            self.splits += 1
+            middle = len(batch) // 2
+            await self._flush(batch[:middle])
+            await self._flush(batch[middle:])
+            return
+        except Exception as exc:
+            logger.exception("Write-behind batch of %d products failed", len(batch))
+            self._fail(batch, exc)
+            return
+        await self._resolve(batch, ids)
+
+    async def _resolve(self, batch: List[PendingInsert], ids: List[int]) -> None:
+        self.inserted += len(ids)
+        rows: Dict[int, ProductRow] = {}
+        fetch_ids = [product_id for pending, product_id in zip(batch, ids) if pending.fetch]
+        if fetch_ids:
+            try:
+                # The rows were just written to the primary; a replica may not have them yet
+                with primary_reads():
+                    rows = {row["id"]: row for row in await self.repository.get_products(fetch_ids)}
+            except Exception as exc:
+                self._fail([pending for pending in batch if pending.fetch], exc)
+        for pending, product_id in zip(batch, ids):
+            # A fetched row can be missing only if another request already deleted it
+            pending.resolve(rows.get(product_id) if pending.fetch else product_id)
+
+    def _fail(self, batch: List[PendingInsert], exc: BaseException) -> None:
+        self.failed += len(batch)
+        for pending in batch:
+            pending.fail(exc)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "inserted": self.inserted,
+            "splits": self.splits,
+            "failed": self.failed,
+            "largest_batch": self.largest_batch,
+        }
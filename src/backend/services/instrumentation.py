@@ -0,0 +1,57 @@
+import functools, inspect, time
+from typing import Any, Callable
+from utils.metrics import REGISTRY
+
+QUERY_DURATION = REGISTRY.histogram(
+    "db_query_duration_seconds", "Latency of ProductService queries, including pool acquire.", ("query",)
+)
+QUERY_ROWS = REGISTRY.counter("db_query_rows_total", "Rows returned or affected by ProductService queries.", ("query",))
+QUERY_ERRORS = REGISTRY.counter("db_query_errors_total", "ProductService queries that raised an exception.", ("query",))
+
+def _row_count(result: Any) -> int:
+    if result is None or result is False:
+        return 0
+    if result is True:
+        return 1
+    items = result.get("items") if isinstance(result, dict) else getattr(result, "items", None)
+    if isinstance(items, list):
+        return len(items)
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return 1
+
+def instrumented(func: Callable) -> Callable:
+    """Record latency, row count and errors of a service coroutine or async generator."""
+    name = func.__name__
+    duration = QUERY_DURATION.labels(name)
+    rows = QUERY_ROWS.labels(name)
+    errors = QUERY_ERRORS.labels(name)
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def generator_wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                async for batch in func(*args, **kwargs):
+                    rows.inc(_row_count(batch))
+                    yield batch
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - started)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+        rows.inc(_row_count(result))
+        return result
+    return wrapper
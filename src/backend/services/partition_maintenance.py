@@ -0,0 +1,87 @@
+import asyncio, logging, os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from repositories.product_partitions import ProductPartitions, add_months, month_start
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PartitionSettings:
+    enabled: bool = True
+    # Empty months kept ahead of now, so inserts never land in products_default in normal operation
+    months_ahead: int = 3
+    interval: float = 3600.0
+    # Whole months of created_at kept in products; older ones are archived. 0 keeps everything
+    archive_after_months: int = 0
+    # Shared by every worker that may run the archive, e.g. a mounted volume
+    archive_directory: str = "archive"
+
+    @classmethod
+    def from_env(cls) -> "PartitionSettings":
+        """Build partition maintenance settings from PRODUCT_PARTITION_* and PRODUCT_ARCHIVE_* environment variables."""
+        defaults = cls()
+        return cls(
+            enabled=os.getenv("PRODUCT_PARTITION_MAINTENANCE", "1") == "1",
+            months_ahead=int(os.getenv("PRODUCT_PARTITION_MONTHS_AHEAD", defaults.months_ahead)),
+            interval=float(os.getenv("PRODUCT_PARTITION_CHECK_SECONDS", defaults.interval)),
+            archive_after_months=int(os.getenv("PRODUCT_ARCHIVE_AFTER_MONTHS", defaults.archive_after_months)),
+            archive_directory=os.getenv("PRODUCT_ARCHIVE_DIR", defaults.archive_directory),
+        )
+
+class PartitionMaintainer:
+    """Background task that creates the coming months' partitions of products and archives the oldest.
+
+    Runs at start and then every interval seconds. Every worker process may run
+    one: partition creation is serialized in the database and only one process
+    archives at a time.
+    """
+
+    def __init__(self, partitions: ProductPartitions, settings: PartitionSettings):
+        self.partitions = partitions
+        self.settings = settings
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.failures = 0
+        self.created = 0
+        self.archived = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self, now: Optional[datetime] = None) -> None:
+        """Create the partitions up to months_ahead after now's month and archive the expired ones."""
+        current = month_start(now or datetime.now(timezone.utc))
+        self.created += await self.partitions.create_partitions(current, add_months(current, self.settings.months_ahead + 1))
+        if self.settings.archive_after_months > 0:
+            cutoff = add_months(current, -self.settings.archive_after_months)
+            self.archived += len(await self.partitions.archive_partitions(cutoff, self.settings.archive_directory))
+
+    async def _run(self) -> None:
+        while True:
+            self.runs += 1
+            try:
+                await self.run_once()
+            except Exception:
+                # e.g. the database is down or migration 008 is not applied yet; try again next time
+                self.failures += 1
+                logger.exception("Product partition maintenance failed")
+            await asyncio.sleep(self.settings.interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "created": self.created,
+            "archived": self.archived,
+        }
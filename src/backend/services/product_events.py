@@ -0,0 +1,77 @@
+import asyncio, json
+from typing import Dict, Optional, Set, Tuple
+
+PRODUCT_CHANGES_CHANNEL = "product_changes"
+DEFAULT_SUBSCRIBER_QUEUE = 100
+RESYNC_EVENT = ("resync", json.dumps({"op": "resync"}))
+
+class Subscription:
+    """One subscriber's bounded queue of (event, JSON data) pairs."""
+
+    def __init__(self, broadcaster: "ProductEventBroadcaster", max_queue: int):
+        self.broadcaster = broadcaster
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.overflows = 0
+
+    def push(self, event: Tuple[str, str]) -> None:
+        """Queue an event without blocking; a full queue is replaced by a single resync event."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The client is too slow to keep up with individual changes; dropping
+            # them all and asking for a reload bounds memory and never skips silently
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+            self.overflows += 1
+            self.broadcaster.overflows += 1
+
+    async def get(self) -> Optional[Tuple[str, str]]:
+        """Wait for the next event; None means the server is shutting down and the stream should end."""
+        return await self.queue.get()
+
+    def end(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    def close(self) -> None:
+        self.broadcaster.subscribers.discard(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class ProductEventBroadcaster:
+    """Fans product change notifications out to any number of SSE/WebSocket subscribers."""
+
+    def __init__(self, max_queue: int = DEFAULT_SUBSCRIBER_QUEUE):
+        self.max_queue = max_queue
+        self.subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.overflows = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self, self.max_queue)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def handle_notification(self, payload: Optional[str]) -> None:
+        """Forward a NOTIFY payload as-is; None (missed notifications) becomes a resync event."""
+        self.publish(("change", payload) if payload is not None else RESYNC_EVENT)
+
+    def publish(self, event: Tuple[str, str]) -> None:
+        self.published += 1
+        for subscription in list(self.subscribers):
+            subscription.push(event)
+
+    def close(self) -> None:
+        """End every open stream so that graceful shutdown is not held up by idle subscribers."""
+        for subscription in list(self.subscribers):
+            subscription.end()
+        self.subscribers.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"subscribers": len(self.subscribers), "published": self.published, "overflows": self.overflows}
@@ -0,0 +1,57 @@
+import csv, io, json
+from pydantic import ValidationError
+from typing import Any, Iterable, List, Tuple
+from models import BulkRowError, Product
+
+class _InvalidRow:
+    def __init__(self, message: str):
+        self.message = message
+
+def _format_errors(error: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()]
+
+def validate_products(items: Iterable[Any]) -> Tuple[List[Product], List[BulkRowError]]:
+    """Validate raw items into products, collecting per-row errors instead of failing the batch."""
+    products: List[Product] = []
+    failed: List[BulkRowError] = []
+    for index, item in enumerate(items):
+        if isinstance(item, _InvalidRow):
+            failed.append(BulkRowError(index=index, errors=[item.message]))
+            continue
+        if not isinstance(item, dict):
+            failed.append(BulkRowError(index=index, errors=["Expected a JSON object"]))
+            continue
+        try:
+            products.append(Product(**item))
+        except ValidationError as e:
+            failed.append(BulkRowError(index=index, errors=_format_errors(e)))
+    return products, failed
+
+def _ndjson_items(text: str) -> Iterable[Any]:
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield _InvalidRow(f"Invalid JSON: {e.msg}")
+
+def _csv_items(text: str) -> Iterable[Any]:
+    for row in csv.DictReader(io.StringIO(text)):
+        # Exported files carry generated ids and may have ragged columns; neither is inserted
+        yield {key: value for key, value in row.items() if key not in (None, "id")}
+
+def parse_products(body: bytes, content_type: str) -> Tuple[List[Product], List[BulkRowError]]:
+    """Parse a JSON array, NDJSON or CSV upload into validated products and row errors."""
+    media_type = content_type.split(";")[0].strip().lower()
+    text = body.decode("utf-8-sig")
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return validate_products(_ndjson_items(text))
+    if media_type == "text/csv":
+        return validate_products(_csv_items(text))
+    if media_type == "application/json":
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of products")
+        return validate_products(items)
+    raise ValueError(f"Unsupported content type: {media_type}")
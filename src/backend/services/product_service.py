@@ -1,78 +1,356 @@
-import asyncpg
-from typing import Optional, List
-from models import Product
+import asyncpg, hashlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from models import (
+    BulkInsertResult,
+    CatalogStats,
+    CategoryStats,
+    Product,
+    ProductBatch,
+    ProductChanges,
+    ProductFilter,
+    ProductPage,
+    ProductPatch,
+    ProductPatchItem,
+    ProductSearchHit,
+    ProductSearchPage,
+    ProductSortField,
+    SearchMode,
+    SortOrder,
+)
+from repositories import PostgresProductRepository, ProductRepository, ReadRouter
+from repositories.product_repository import CsvSource, ProductRow
+from utils import decode_cursor, encode_cursor
+from .insert_batcher import InsertBatcher
+from .instrumentation import instrumented
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+BULK_CHUNK_SIZE = 10000
+MAX_SEARCH_OFFSET = 10000
+DEFAULT_RECENT_DAYS = 7
+DEFAULT_CHANGES_LIMIT = 500
+
+class ChangesExpired(Exception):
+    """Raised when a change feed asks for versions whose tombstones have been purged."""
+
+class IdempotencyKeyReused(Exception):
+    """Raised when an Idempotency-Key is replayed with a different request body."""
+
+def _request_hash(product: Product) -> bytes:
+    return hashlib.sha256(product.model_dump_json(exclude={"id", "version", "updated_at"}).encode()).digest()
 
 class ProductService:
-    def __init__(self, pool: asyncpg.Pool):
-        self.pool = pool
+    def __init__(
+        self,
+        repository: Union[ProductRepository, asyncpg.Pool],
+        reads: Optional[ReadRouter] = None,
+        insert_batcher: Optional[InsertBatcher] = None
+    ):
+        if not isinstance(repository, ProductRepository):
+            # A bare pool means PostgreSQL storage on that pool
+            repository = PostgresProductRepository(repository, reads)
+        self.repository = repository
+        self.insert_batcher = insert_batcher
 
+    @instrumented
     async def create_product(self, product: Product) -> Optional[int]:
         """Insert a new product into the database and return the product's ID."""
-        query = """
-        INSERT INTO products (name, code, description, category, price, created_at)
-        VALUES ($1, $2, $3, $4, $5, $6)
-        RETURNING id;
+        if self.insert_batcher is not None:
+            return await self.insert_batcher.insert(product)
+        return await self.repository.insert_product(product)
+
+    @instrumented
+    async def create_and_fetch_product(self, product: Product) -> Optional[Product]:
+        """Insert a new product and return it as stored, in a single round trip unless inserts are batched."""
+        if self.insert_batcher is not None:
+            row = await self.insert_batcher.insert_and_fetch(product)
+        else:
+            row = await self.repository.insert_and_fetch_product(product)
+        if row:
+            return Product(**row)
+        return None
+
+    @instrumented
+    async def create_products_bulk(
+        self,
+        products: Sequence[Product],
+        chunk_size: int = BULK_CHUNK_SIZE,
+        use_copy: bool = True
+    ) -> List[int]:
+        """Insert many products in one transaction and return their IDs in input order."""
+        return await self.repository.insert_products(products, chunk_size, use_copy)
+
+    @instrumented
+    async def copy_products_csv(self, source: CsvSource) -> int:
+        """COPY headerless CSV rows in BATCH_COLUMNS order into products and return the number of rows loaded."""
+        return await self.repository.copy_products_csv(source)
+
+    @instrumented
+    async def create_product_idempotent(self, product: Product, key: str) -> Tuple[int, bool]:
+        """Insert a product once per idempotency key; return its ID and whether this was a replay."""
+        request_hash = _request_hash(product)
+        product_id, stored_hash = await self.repository.insert_product_idempotent(product, key, request_hash)
+        if stored_hash is None:
+            return product_id, False
+        if stored_hash != request_hash:
+            raise IdempotencyKeyReused(f"Idempotency-Key {key!r} was used with a different request")
+        return product_id, True
+
+    @instrumented
+    async def purge_idempotency_keys(self, older_than: datetime) -> int:
+        """Forget idempotency keys recorded before older_than."""
+        return await self.repository.purge_idempotency_keys(older_than)
+
+    @instrumented
+    async def upsert_product(self, product: Product) -> Tuple[Product, bool]:
+        """Insert a product or update the one with the same code; return it and whether it was created.
+
+        Re-sending an identical product leaves the row untouched, so retries do not bump its version.
         """
-        async with self.pool.acquire() as conn:
-            product_id = await conn.fetchval(
-                query,
-                product.name,
-                product.code, 
-                product.description, 
-                product.category, 
-                product.price, 
-                product.created_at
-            )
-        return product_id
+        row, inserted = await self.repository.upsert_product(product)
+        return Product(**row), inserted
+
+    @instrumented
+    async def upsert_products_bulk(self, products: Sequence[Product], chunk_size: int = BULK_CHUNK_SIZE) -> BulkInsertResult:
+        """Insert or update many products by code in one transaction; IDs follow the input order."""
+        # A row cannot be written twice in one upsert, so the last copy of a code wins; collapsed
+        # over the whole input, since a code repeated in another chunk would be counted twice
+        latest = list({p.code: p for p in products}.values())
+        rows = await self.repository.upsert_products(latest, chunk_size)
+        ids_by_code = {row["code"]: row["id"] for row in rows}
+        return BulkInsertResult(
+            inserted=sum(1 for row in rows if row["inserted"] is True),
+            updated=sum(1 for row in rows if row["inserted"] is False),
+            unchanged=sum(1 for row in rows if row["inserted"] is None),
+            ids=[ids_by_code[p.code] for p in products],
+            failed=[]
+        )
 
+    @instrumented
     async def get_product_by_id(self, product_id: int) -> Optional[Product]:
         """Retrieve a product by its ID."""
-        query = """
-        SELECT id, name, code, description, category, price, created_at
-        FROM products
-        WHERE id = $1;
-        """
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(query, product_id)
+        row = await self.repository.get_product(product_id)
         if row:
             return Product(**row)
         return None
 
+    @instrumented
+    async def get_products_by_ids(self, product_ids: Sequence[int]) -> ProductBatch:
+        """Retrieve many products in one query, keeping the caller's order and reporting missing IDs."""
+        rows = await self.repository.get_products(product_ids)
+        return self._ordered_batch(product_ids, {row["id"]: Product(**row) for row in rows})
+
+    @staticmethod
+    def _ordered_batch(product_ids: Sequence[int], found: Dict[int, Product]) -> ProductBatch:
+        """Arrange found products in request order and list the IDs that were not found."""
+        items = [found[product_id] for product_id in product_ids if product_id in found]
+        missing = [product_id for product_id in dict.fromkeys(product_ids) if product_id not in found]
+        return ProductBatch(items=items, missing=missing)
+
+    @instrumented
     async def update_product(self, product_id: int, updated_product: Product) -> bool:
         """Update an existing product by its ID."""
-        query = """
-        UPDATE products
-        SET name = $1, code = $2, description = $3, category = $4, price = $5, created_at = $6
-        WHERE id = $7;
-        """
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                query,
-                updated_product.name,
-                updated_product.code,
-                updated_product.description,
-                updated_product.category,
-                updated_product.price,
-                updated_product.created_at,
-                product_id
-            )
-        return result == 'UPDATE 1'
+        return await self.repository.update_product(product_id, updated_product)
 
+    @instrumented
     async def delete_product(self, product_id: int) -> bool:
         """Delete a product by its ID."""
-        query = """
-        DELETE FROM products WHERE id = $1;
-        """
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(query, product_id)
-        return result == 'DELETE 1'
-
-    async def list_products(self) -> List[Product]:
-        """Retrieve all products from the database."""
-        query = """
-        SELECT id, name, code, description, category, price, created_at
-        FROM products;
+        return await self.repository.delete_product(product_id)
+
+    async def list_products(
+        self,
+        filters: Optional[ProductFilter] = None,
+        sort: ProductSortField = ProductSortField.id,
+        order: SortOrder = SortOrder.asc,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> List[Product]:
+        """Retrieve a single page of products from the database."""
+        page = await self.list_products_page(filters, sort, order, limit, cursor)
+        return page.items
+
+    @instrumented
+    async def patch_products(self, patches: Sequence[ProductPatchItem]) -> List[int]:
+        """Apply partial updates to many products in one statement and return the updated IDs."""
+        return await self.repository.patch_products(patches)
+
+    @staticmethod
+    def _has_conditions(filters: ProductFilter) -> bool:
+        return any(value is not None for value in filters.model_dump().values())
+
+    @instrumented
+    async def update_products_where(
+        self,
+        filters: ProductFilter,
+        values: ProductPatch,
+        price_change_percent: Optional[Decimal] = None
+    ) -> List[int]:
+        """Apply one set-based update to every product matching the filter and return the updated IDs."""
+        if not self._has_conditions(filters):
+            raise ValueError("A filter is required for bulk updates")
+        if price_change_percent is not None and values.price is not None:
+            raise ValueError("Cannot set a price and apply a price change at the same time")
+        assignments = values.model_dump(exclude_none=True)
+        if not assignments and price_change_percent is None:
+            raise ValueError("Nothing to update")
+        return await self.repository.update_products_where(filters, assignments, price_change_percent)
+
+    @instrumented
+    async def delete_products(self, product_ids: Sequence[int]) -> List[int]:
+        """Delete many products by ID in one statement and return the deleted IDs."""
+        return await self.repository.delete_products(product_ids)
+
+    @instrumented
+    async def delete_products_where(self, filters: ProductFilter) -> List[int]:
+        """Delete every product matching the filter and return the deleted IDs."""
+        if not self._has_conditions(filters):
+            raise ValueError("A filter is required for bulk deletes")
+        return await self.repository.delete_products_where(filters)
+
+    @instrumented
+    async def get_category_stats(self, recent_days: int = DEFAULT_RECENT_DAYS, category: Optional[str] = None) -> CatalogStats:
+        """Read per-category counts and price statistics from the trigger-maintained rollup tables."""
+        rows = await self.repository.get_category_stats(recent_days, category)
+        categories = [CategoryStats(**row) for row in rows]
+        return CatalogStats(
+            recent_days=recent_days,
+            total_count=sum(stats.product_count for stats in categories),
+            categories=categories
+        )
+
+    @instrumented
+    async def refresh_category_stats(self) -> None:
+        """Rebuild the category rollups from the products table, e.g. after a TRUNCATE, a bulk load with triggers disabled, or to repair min/max prices that drifted before migration 009."""
+        await self.repository.refresh_category_stats()
+
+    @instrumented
+    async def get_changes(self, since: int = 0, limit: int = DEFAULT_CHANGES_LIMIT, cursor: Optional[str] = None) -> ProductChanges:
+        """Return products written and IDs deleted after version since, oldest first.
+
+        Only versions below the oldest running transaction are returned, so a
+        change that commits later can never land behind a version already served.
+        Pass next_cursor to continue a partial page; once it is None, store version
+        and use it as since on the next sync.
         """
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(query)
-        return [Product(**row) for row in rows]
+        if cursor:
+            since, last_id = decode_cursor(cursor, "version", "asc")
+        else:
+            # Largest bigint, so that the keyset comparison means "version > since"
+            last_id = 2 ** 63 - 1
+        horizon, safe_version, rows = await self.repository.get_changes(since, last_id, limit + 1)
+        if since < horizon:
+            raise ChangesExpired(f"Changes before version {horizon} are no longer available; reload the catalog")
+        if since >= safe_version:
+            raise ValueError(f"Version {since} has not been issued yet")
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor("version", "asc", rows[-1]["version"], rows[-1]["id"])
+        return ProductChanges(
+            items=[Product(**{key: value for key, value in row.items() if key != "deleted"}) for row in rows if not row["deleted"]],
+            deleted=[row["id"] for row in rows if row["deleted"]],
+            # With nothing left below the safe version the client can skip straight to it
+            version=rows[-1]["version"] if next_cursor else max([since, safe_version - 1] + [row["version"] for row in rows]),
+            next_cursor=next_cursor
+        )
+
+    @instrumented
+    async def purge_tombstones(self, older_than: datetime) -> int:
+        """Delete tombstones recorded before older_than; change feeds older than the purge must reload."""
+        return await self.repository.purge_tombstones(older_than)
+
+    @instrumented
+    async def list_products_page(
+        self,
+        filters: Optional[ProductFilter] = None,
+        sort: ProductSortField = ProductSortField.id,
+        order: SortOrder = SortOrder.asc,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> ProductPage:
+        """Retrieve a keyset-paginated page of products and the cursor of the next page."""
+        rows, next_cursor = await self._fetch_page(filters, sort, order, limit, cursor)
+        return ProductPage(items=[Product(**row) for row in rows], next_cursor=next_cursor)
+
+    @instrumented
+    async def list_product_rows(
+        self,
+        filters: Optional[ProductFilter] = None,
+        sort: ProductSortField = ProductSortField.id,
+        order: SortOrder = SortOrder.asc,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Same page as list_products_page, as plain dicts ready for direct JSON encoding."""
+        rows, next_cursor = await self._fetch_page(filters, sort, order, limit, cursor)
+        return {"items": [dict(row) for row in rows], "next_cursor": next_cursor}
+
+    async def _fetch_page(
+        self,
+        filters: Optional[ProductFilter],
+        sort: ProductSortField,
+        order: SortOrder,
+        limit: int,
+        cursor: Optional[str]
+    ) -> Tuple[List[ProductRow], Optional[str]]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        after = decode_cursor(cursor, sort.value, order.value) if cursor else None
+        rows = await self.repository.list_products(filters, sort, order, limit + 1, after)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(sort.value, order.value, last[sort.value], last["id"])
+        return rows, next_cursor
+
+    @instrumented
+    async def search_products(
+        self,
+        text: str,
+        mode: SearchMode = SearchMode.fts,
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0
+    ) -> ProductSearchPage:
+        """Search products by name/description and return a ranked page of results."""
+        rows, next_offset = await self._fetch_search(text, mode, limit, offset)
+        return ProductSearchPage(items=[ProductSearchHit(**row) for row in rows], next_offset=next_offset)
+
+    @instrumented
+    async def search_product_rows(
+        self,
+        text: str,
+        mode: SearchMode = SearchMode.fts,
+        limit: int = DEFAULT_PAGE_SIZE,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Same results as search_products, as plain dicts ready for direct JSON encoding."""
+        rows, next_offset = await self._fetch_search(text, mode, limit, offset)
+        return {"items": [dict(row) for row in rows], "next_offset": next_offset}
+
+    async def _fetch_search(
+        self,
+        text: str,
+        mode: SearchMode,
+        limit: int,
+        offset: int
+    ) -> Tuple[List[ProductRow], Optional[int]]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, min(offset, MAX_SEARCH_OFFSET))
+        rows = await self.repository.search_products(text, mode, limit + 1, offset)
+        next_offset = offset + limit if len(rows) > limit else None
+        return rows[:limit], next_offset
+
+    @instrumented
+    async def export_products(
+        self,
+        filters: Optional[ProductFilter] = None,
+        batch_size: int = EXPORT_BATCH_SIZE
+    ) -> AsyncIterator[List[ProductRow]]:
+        """Stream matching products in id order, one batch at a time (through a server-side cursor on PostgreSQL)."""
+        async for rows in self.repository.export_products(filters, batch_size):
+            yield rows
@@ -0,0 +1,24 @@
+import os, pytest, pytest_asyncio
+from repositories import InMemoryProductRepository, PostgresProductRepository, PostgresRepository
+
+@pytest_asyncio.fixture(params=["memory", "postgres"])
+async def product_repository(request: pytest.FixtureRequest):
+    """Storage for service tests, once per backend; `pytest -k memory` runs them without a database."""
+    if request.param == "memory":
+        yield InMemoryProductRepository()
+        return
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+    )
+
+    pool = await repo.connect()
+    try:
+        if not pool:
+            pytest.fail("No connection established")
+        yield PostgresProductRepository(pool)
+    finally:
+        await repo.close()
@@ -0,0 +1,80 @@
+import asyncio, httpx, pytest
+from fastapi import FastAPI
+from middleware import AdmissionControlMiddleware, AdmissionController, AdmissionSettings
+from middleware.admission import ADMITTED, QUEUE_FULL, QUEUE_TIMEOUT, ConcurrencyLimiter, TokenBucketLimiter
+from utils.metrics import MetricsRegistry
+
+@pytest.mark.asyncio
+async def test_concurrency_limiter_queue() -> None:
+    limiter = ConcurrencyLimiter(limit=1, queue_size=1, queue_timeout=0.05)
+    assert await limiter.acquire() == ADMITTED, "The first request should be admitted immediately"
+
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    # Assert that a second request queues and a third is rejected while the queue is full
+    assert limiter.queued == 1 and limiter.full, f"Unexpected limiter state {limiter.stats()}"
+    assert await limiter.acquire() == QUEUE_FULL, "A request beyond the queue should be rejected"
+
+    limiter.release()
+    # Assert that releasing hands the slot to the queued request
+    assert await waiter == ADMITTED, "The queued request should be admitted on release"
+    assert limiter.active == 1 and limiter.queued == 0, f"Unexpected limiter state {limiter.stats()}"
+
+    # Assert that a request waiting longer than the queue timeout gives up
+    assert await limiter.acquire() == QUEUE_TIMEOUT, "The queued request should time out"
+    limiter.release()
+    assert limiter.stats() == {"limit": 1, "active": 0, "queued": 0, "rejected": 1, "timed_out": 1}, f"Unexpected stats {limiter.stats()}"
+
+def test_token_bucket_limiter() -> None:
+    bucket = TokenBucketLimiter(rate=2.0, burst=2.0)
+    # Assert that a client may burst, is then limited, and recovers at the refill rate
+    assert bucket.take("a", now=0.0) == 0 and bucket.take("a", now=0.0) == 0, "Burst should be allowed"
+    assert bucket.take("a", now=0.0) == pytest.approx(0.5), "Third request should wait for a refill"
+    assert bucket.take("b", now=0.0) == 0, "Buckets are per client"
+    assert bucket.take("a", now=0.5) == 0, "A token should be refilled after 1/rate seconds"
+
+def test_rate_limit_split_across_workers(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("RATE_LIMIT_PER_SECOND", "100")
+    settings = AdmissionSettings.from_env()
+    # Assert that each worker enforces its share of the server-wide rate and burst
+    assert settings.rate_limit == 25.0, f"Expected 25 requests/s per worker, but got {settings.rate_limit}"
+    assert settings.rate_burst == 50.0, f"Expected a burst of 50 per worker, but got {settings.rate_burst}"
+
+@pytest.mark.asyncio
+async def test_admission_middleware_sheds_load() -> None:
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.get("/slow")
+    async def slow() -> dict:
+        await release.wait()
+        return {}
+
+    @app.get("/metrics")
+    async def metrics() -> dict:
+        return {}
+
+    controller = AdmissionController(AdmissionSettings(max_concurrency=1, queue_size=0, route_limits={}, rate_limit=1.0, rate_burst=2.0))
+    registry = MetricsRegistry()
+    app.add_middleware(AdmissionControlMiddleware, controller=controller, registry=registry)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        held = asyncio.ensure_future(client.get("/slow"))
+        await asyncio.sleep(0.05)
+        response = await client.get("/slow")
+        # Assert that a request with no free slot and no queue space is shed with Retry-After
+        assert response.status_code == 503, f"Expected 503, but got {response.status_code}"
+        assert response.headers["Retry-After"] == "1", "Expected a Retry-After header"
+        # Assert that the shed is counted by the limiter and labelled with its reason
+        assert controller.default.rejected == 1, f"Expected one rejection, got {controller.default.stats()}"
+        assert 'reason="queue_full"' in registry.render(), "Expected the rejection labelled queue_full"
+        # Assert that exempt routes bypass the limiter
+        assert (await client.get("/metrics")).status_code == 200, "Exempt routes should not be limited"
+        release.set()
+        assert (await held).status_code == 200, "The admitted request should complete"
+
+        response = await client.get("/slow")
+        # Assert that a client over its token bucket gets 429
+        assert response.status_code == 429, f"Expected 429, but got {response.status_code}"
+        assert controller.default.active == 0, f"Every slot should be released, got {controller.default.stats()}"
@@ -0,0 +1,77 @@
+import asyncio, pytest
+from cache import LRUCache
+from models import Product
+from repositories import ProductRepository
+from services import CachedProductService
+from utils import random_product
+
+@pytest.mark.asyncio
+async def test_lru_cache_eviction() -> None:
+    cache = LRUCache(max_size=2, ttl=60)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    # Touch "a" so that "b" becomes the least recently used entry
+    assert await cache.get("a") == 1, "Expected a cache hit for 'a'"
+    await cache.set("c", 3)
+    # Assert that the least recently used entry was evicted
+    assert await cache.get("b") is None, "Expected 'b' to be evicted"
+    assert await cache.get("a") == 1 and await cache.get("c") == 3, "Expected 'a' and 'c' to remain cached"
+    assert cache.stats()["evictions"] == 1, f"Expected one eviction, but got {cache.stats()}"
+
+@pytest.mark.asyncio
+async def test_lru_cache_ttl() -> None:
+    cache = LRUCache(max_size=10, ttl=0.01)
+    await cache.set("a", 1)
+    await asyncio.sleep(0.02)
+    # Assert that expired entries are not returned
+    assert await cache.get("a") is None, "Expected 'a' to have expired"
+    assert cache.stats()["expirations"] == 1, f"Expected one expiration, but got {cache.stats()}"
+
+@pytest.mark.asyncio
+async def test_cached_product_service(product_repository: ProductRepository) -> None:
+    product_service = CachedProductService(product_repository, LRUCache())
+    product_id = await product_service.create_product(Product(**random_product()))
+
+    products = await asyncio.gather(*(product_service.get_product_by_id(product_id) for _ in range(5)))
+    # Assert that concurrent misses were coalesced into a single query (the in-memory one finishes before the others ask)
+    assert all(p is not None and p.id == product_id for p in products), "Every caller should get the product"
+    stats = product_service.cache_stats()
+    assert stats["misses"] == 1 and stats["coalesced"] + stats["hits"] == 4, f"Unexpected cache stats {stats}"
+
+    await product_service.get_product_by_id(product_id)
+    # Assert that the next lookup is served from the cache
+    assert product_service.cache_stats()["hits"] == stats["hits"] + 1, "Expected a cache hit"
+
+    updated_product = Product(**random_product())
+    assert await product_service.update_product(product_id, updated_product), "Product update failed"
+    retrieved_product = await product_service.get_product_by_id(product_id)
+    # Assert that updates invalidate the cached entry
+    assert retrieved_product.name == updated_product.name, "Cached product should be invalidated on update"
+
+    other_id = await product_service.create_product(Product(**random_product()))
+    batch = await product_service.get_products_by_ids([other_id, product_id])
+    # Assert that batch reads take cached products and only query the rest
+    assert [p.id for p in batch.items] == [other_id, product_id], "Batch should follow the requested order"
+    assert await product_service.cache.get(f"product:{other_id}") is not None, "Batch reads should populate the cache"
+
+    assert await product_service.delete_product(product_id), "Product deletion failed"
+    # Assert that deletes invalidate the cached entry
+    assert await product_service.get_product_by_id(product_id) is None, "Deleted product should not be cached"
+
+@pytest.mark.asyncio
+async def test_cache_change_notifications() -> None:
+    product_service = CachedProductService(None, LRUCache())
+    for product_id in (1, 2, 3):
+        await product_service.cache.set(f"product:{product_id}", product_id)
+
+    product_service.handle_change_notification('{"op": "insert", "version": 1, "ids": [1]}')
+    product_service.handle_change_notification('{"op": "update", "version": 2, "ids": [2]}')
+    await asyncio.sleep(0)
+    # Assert that only changes made elsewhere to existing rows evict cached entries
+    assert await product_service.cache.get("product:1") == 1, "Inserts should not evict cached products"
+    assert await product_service.cache.get("product:2") is None, "Updated products should be evicted"
+
+    product_service.handle_change_notification(None)
+    await asyncio.sleep(0)
+    # Assert that a listener resync drops everything
+    assert await product_service.cache.get("product:3") is None, "A resync should clear the cache"
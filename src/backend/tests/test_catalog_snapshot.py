@@ -0,0 +1,125 @@
+import asyncio, pytest
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from models import ProductFilter, ProductPatchItem, ProductSortField, SortOrder
+from repositories import InMemoryProductRepository, SnapshotProductRepository
+from services import ProductService
+from tests.test_memory_repository import make_products
+
+FILTERS_CASES = [
+    None,
+    ProductFilter(category="Games"),
+    ProductFilter(category="Missing"),
+    ProductFilter(category="Rare"),
+    ProductFilter(category="Rare", min_price=Decimal(8)),
+    ProductFilter(min_price=Decimal("4.5"), max_price=Decimal(12)),
+    ProductFilter(category="Tools", created_after=datetime(2024, 1, 10, tzinfo=timezone.utc), created_before=datetime(2024, 1, 20)),
+]
+
+async def all_pages(product_service: ProductService, filters, sort, order) -> list:
+    seen, cursor = [], None
+    while True:
+        page = await product_service.list_products_page(filters, sort, order, 9, cursor)
+        seen.extend(page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return seen
+
+async def assert_same_reads(inner: InMemoryProductRepository, snapshot: SnapshotProductRepository) -> None:
+    expected_service, snapshot_service = ProductService(inner), ProductService(snapshot)
+    for filters in FILTERS_CASES:
+        for sort in ProductSortField:
+            for order in SortOrder:
+                expected = await all_pages(expected_service, filters, sort, order)
+                # Assert that snapshot pages hold the same products, field for field, in the same order
+                assert await all_pages(snapshot_service, filters, sort, order) == expected, f"Pages differ for {filters} sorted by {sort.value} {order.value}"
+    for category in (None, "Books"):
+        # Assert that category statistics match the repository's own
+        assert await snapshot.get_category_stats(7, category) == await inner.get_category_stats(7, category), f"Stats differ for {category}"
+
+@pytest.mark.asyncio
+async def test_snapshot_matches_repository() -> None:
+    inner = InMemoryProductRepository()
+    products = make_products(400)
+    products[0] = products[0].model_copy(update={"created_at": datetime.now(timezone.utc), "price": Decimal("7.5")})
+    # Few enough to be listed from the category column rather than by walking the sort index
+    for index in range(1, 400, 40):
+        products[index] = products[index].model_copy(update={"category": "Rare"})
+    await inner.insert_products(products, 100)
+    snapshot = SnapshotProductRepository(inner)
+    await snapshot.load()
+    # Assert that every product is loaded into the columns
+    assert snapshot.stats()["products"] == len(products), f"Unexpected snapshot stats {snapshot.stats()}"
+    await assert_same_reads(inner, snapshot)
+
+@pytest.mark.asyncio
+async def test_snapshot_applies_writes() -> None:
+    inner = InMemoryProductRepository()
+    ids = await inner.insert_products(make_products(300), 100)
+    snapshot = SnapshotProductRepository(inner, refresh_seconds=3600)
+    await snapshot.load()
+    product_service = ProductService(snapshot)
+
+    # Writes through the snapshot repository are visible to the next read
+    await product_service.create_products_bulk(make_products(50, seed=1))
+    await product_service.patch_products([ProductPatchItem(id=ids[0], price=Decimal("1.25"), category="Games")])
+    await product_service.delete_products(ids[10:120])
+    await assert_same_reads(inner, snapshot)
+    # Assert that rewritten and deleted rows were reclaimed once they passed the compaction threshold
+    stats = snapshot.stats()
+    assert (stats["products"], stats["rows"], stats["dead_rows"]) == (240, 240, 0), f"Unexpected snapshot stats {stats}"
+
+    # Writes that bypass it are picked up once notified
+    await inner.delete_products(ids[150:155])
+    snapshot.handle_change_notification(None)
+    await assert_same_reads(inner, snapshot)
+
+    # Assert that purged tombstones force a full reload instead of missing deletes
+    await inner.delete_products(ids[160:165])
+    await inner.purge_tombstones(datetime.now(timezone.utc) + timedelta(minutes=1))
+    snapshot.mark_stale()
+    await assert_same_reads(inner, snapshot)
+    assert snapshot.reloads == 2, f"Expected a reload, got {snapshot.stats()}"
+
+@pytest.mark.asyncio
+async def test_snapshot_falls_back_for_unsupported_prices() -> None:
+    inner = InMemoryProductRepository()
+    await inner.insert_products(make_products(20), 100)
+    snapshot = SnapshotProductRepository(inner)
+    await snapshot.load()
+    await ProductService(snapshot).create_product(make_products(1, seed=1)[0].model_copy(update={"price": Decimal("0.125")}))
+    # Assert that sub-cent prices disable the snapshot and reads go to the repository
+    rows = await snapshot.list_products(None, ProductSortField.price, SortOrder.asc, 5)
+    assert snapshot.snapshot is None and rows[0]["price"] == Decimal("0.125"), f"Unexpected first row {rows[0]}"
+
+class SlowChangesRepository(InMemoryProductRepository):
+    """Reads the change feed across an await, like a database would, and counts the reads."""
+
+    def __init__(self):
+        super().__init__()
+        self.change_reads = 0
+
+    async def get_changes(self, since: int, last_id: int, limit: int):
+        self.change_reads += 1
+        await asyncio.sleep(0.01)
+        return await super().get_changes(since, last_id, limit)
+
+@pytest.mark.asyncio
+async def test_snapshot_readers_wait_for_refresh() -> None:
+    inner = SlowChangesRepository()
+    await inner.insert_products(make_products(20), 100)
+    snapshot = SnapshotProductRepository(inner, refresh_seconds=3600)
+    await snapshot.load()
+    product_id = await snapshot.insert_product(make_products(1, seed=1)[0])
+    reads = inner.change_reads
+    pages = await asyncio.gather(*(snapshot.list_products(None, ProductSortField.id, SortOrder.desc, 1) for _ in range(50)))
+    # Assert that every concurrent reader sees the write, and that they share one refresh
+    assert all(page[0]["id"] == product_id for page in pages), "Expected every reader to see the new product"
+    assert inner.change_reads - reads == 1 and not snapshot.stale, f"Expected one change feed read, got {inner.change_reads - reads}"
+
+    # Assert that a write made while the feed is read keeps the snapshot stale
+    refresh = asyncio.ensure_future(snapshot.refresh())
+    await asyncio.sleep(0)
+    snapshot.mark_stale()
+    await refresh
+    assert snapshot.stale, "Expected a write during the refresh to leave the snapshot stale"
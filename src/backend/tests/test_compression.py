@@ -0,0 +1,86 @@
+import brotli, httpx, json, pytest, zlib, zstandard
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from middleware import CompressionMiddleware, CompressionSettings
+from utils.metrics import MetricsRegistry
+
+DECOMPRESSORS = {
+    "gzip": lambda: zlib.decompressobj(31).decompress,
+    "br": lambda: brotli.Decompressor().process,
+    "zstd": lambda: zstandard.ZstdDecompressor().decompressobj().decompress,
+}
+ITEMS = [{"id": i, "name": f"Product {i}", "category": "Books"} for i in range(200)]
+
+def make_app(settings: CompressionSettings = None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items")
+    async def items() -> JSONResponse:
+        return JSONResponse(ITEMS, headers={"ETag": '"items-1"'})
+
+    @app.get("/small")
+    async def small() -> dict:
+        return {"ok": True}
+
+    @app.get("/events")
+    async def events() -> StreamingResponse:
+        return StreamingResponse(iter([b"data: x\n\n" * 200]), media_type="text/event-stream")
+
+    app.add_middleware(CompressionMiddleware, settings=settings, registry=MetricsRegistry())
+    return app
+
+@pytest.mark.asyncio
+async def test_negotiated_compression() -> None:
+    transport = httpx.ASGITransport(app=make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for accept, expected in (
+            ("gzip", "gzip"),
+            ("gzip, br", "br"),
+            ("gzip, br, zstd", "zstd"),
+            ("zstd;q=0.5, gzip", "gzip"),
+            ("*", "zstd"),
+            ("*, zstd;q=0", "br"),
+            ("identity", None),
+        ):
+            response = await client.get("/items", headers={"Accept-Encoding": accept})
+            # Assert that the client's preferred coding is used and the body decodes to the original
+            assert response.headers.get("content-encoding") == expected, f"Expected {expected} for {accept!r}, got {response.headers}"
+            assert response.json() == ITEMS, f"Body does not round-trip for {accept!r}"
+            assert response.headers["vary"] == "Accept-Encoding", "Responses must vary on Accept-Encoding"
+            if expected:
+                assert int(response.headers["content-length"]) < len(json.dumps(ITEMS)) / 3, "Expected a compressed Content-Length"
+                assert response.headers["etag"] == 'W/"items-1"', "Strong ETags must be weakened when compressing"
+
+        # Assert that small bodies and event streams are sent as they are
+        response = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers, "Bodies below min_size should not be compressed"
+        response = await client.get("/events", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers and "vary" not in response.headers, "Event streams should not be compressed"
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+async def test_streamed_chunks_decode_as_they_arrive(encoding: str) -> None:
+    chunks = [json.dumps(ITEMS[i:i + 50]).encode() + b"\n" for i in range(0, 200, 50)]
+
+    async def app(scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+
+    sent = []
+
+    async def send(message) -> None:
+        sent.append(message)
+
+    middleware = CompressionMiddleware(app, CompressionSettings(min_size=10**9), MetricsRegistry())
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", encoding.encode())]}
+    await middleware(scope, None, send)
+
+    headers = dict(sent[0]["headers"])
+    # Assert that streams are compressed whatever min_size says, and lose their Content-Length
+    assert headers[b"content-encoding"] == encoding.encode() and b"content-length" not in headers, f"Unexpected headers {headers}"
+    decompress = DECOMPRESSORS[encoding]()
+    for chunk, message in zip(chunks, sent[1:]):
+        # Assert that each chunk can be decoded as soon as its message arrives
+        assert decompress(message["body"]) == chunk, f"{encoding} chunk was not flushed"
+    assert [message["more_body"] for message in sent[1:]] == [True, True, True, False], "Stream framing should be kept"
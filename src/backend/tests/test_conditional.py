@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+from utils import http_date, is_not_modified, page_etag, product_etag
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+
+def test_if_none_match() -> None:
+    etag = product_etag(42)
+    # Assert that a matching tag, a weak/strong variant, a tag list and * all match
+    for header in (etag, '"42"', f'"1", {etag}', "*"):
+        assert is_not_modified({"if-none-match": header}, etag), f"Expected {header!r} to match {etag}"
+    # Assert that a different version does not match
+    assert not is_not_modified({"if-none-match": product_etag(43)}, etag), "Expected a different version not to match"
+
+def test_if_none_match_takes_precedence() -> None:
+    headers = {"if-none-match": product_etag(1), "if-modified-since": http_date(UPDATED_AT)}
+    # Assert that If-Modified-Since is ignored when If-None-Match is present
+    assert not is_not_modified(headers, product_etag(2), UPDATED_AT), "Expected If-None-Match to decide the result"
+
+def test_if_modified_since() -> None:
+    # Assert that the HTTP date of the last modification counts as not modified despite sub-second precision
+    assert is_not_modified({"if-modified-since": http_date(UPDATED_AT)}, product_etag(1), UPDATED_AT), "Expected 304 for the same second"
+    # Assert that an older date and an unparsable date are treated as modified
+    assert not is_not_modified({"if-modified-since": "Wed, 01 May 2024 11:59:59 GMT"}, product_etag(1), UPDATED_AT), "Expected an older date to be modified"
+    assert not is_not_modified({"if-modified-since": "yesterday"}, product_etag(1), UPDATED_AT), "Expected an invalid date to be ignored"
+
+def test_page_etag() -> None:
+    rows = [(1, 10), (2, 11)]
+    # Assert that the page ETag is stable and changes with versions, membership and paging state
+    assert page_etag(rows, "c") == page_etag(list(rows), "c"), "Expected the same rows to give the same ETag"
+    assert page_etag(rows, "c") != page_etag([(1, 10), (2, 12)], "c"), "Expected a new version to change the ETag"
+    assert page_etag(rows, "c") != page_etag([(1, 10)], "c"), "Expected a removed row to change the ETag"
+    assert page_etag(rows, "c") != page_etag(rows, None), "Expected the next cursor to change the ETag"
@@ -0,0 +1,28 @@
+import pytest
+from datetime import datetime, timezone
+from decimal import Decimal
+from utils import decode_cursor, encode_cursor
+
+@pytest.mark.parametrize("sort, value", [
+    ("id", None),
+    ("name", "Product A"),
+    ("price", Decimal("19.90")),
+    ("created_at", datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)),
+])
+def test_cursor_round_trip(sort: str, value: object) -> None:
+    token = encode_cursor(sort, "asc", value, 42)
+    decoded_value, decoded_id = decode_cursor(token, sort, "asc")
+    # Assert that the cursor decodes back to the same keyset position
+    assert decoded_value == value, f"Expected {value}, but got {decoded_value}"
+    assert decoded_id == 42, f"Expected id 42, but got {decoded_id}"
+
+def test_cursor_sort_mismatch() -> None:
+    token = encode_cursor("price", "asc", Decimal("1.00"), 1)
+    # Assert that a cursor cannot be replayed against a different sort order
+    with pytest.raises(ValueError):
+        decode_cursor(token, "price", "desc")
+
+def test_cursor_invalid_token() -> None:
+    # Assert that garbage tokens are rejected with a ValueError
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", "id", "asc")
@@ -1,5 +1,17 @@
-import asyncpg, os, pytest, socket
-from repositories import PostgresRepository
+import asyncio, asyncpg, os, pytest, socket
+from decimal import Decimal
+from repositories import (
+    PoolAcquireTimeout,
+    PoolSettings,
+    PostgresProductRepository,
+    PostgresRepository,
+    ReadConsistency,
+    ReadRoutingSettings,
+    SnapshotProductRepository,
+    bind_read_consistency,
+    primary_reads,
+)
+from utils import random_string
 
 @pytest.mark.asyncio
 async def test_connection_repo() -> None:
@@ -49,3 +61,221 @@ async def test_connection_failure_repo() -> None:
             pytest.fail(f"Unexpected exception type: {type(e).__name__}")
     finally:
         await repo.close()
+
+
+def test_pool_settings_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("DB_POOL_MIN_SIZE", "2")
+    monkeypatch.setenv("DB_POOL_MAX_SIZE", "20")
+    monkeypatch.setenv("DB_POOL_ACQUIRE_TIMEOUT", "1.5")
+    monkeypatch.setenv("DB_STATEMENT_CACHE_SIZE", "0")
+    monkeypatch.delenv("DB_COMMAND_TIMEOUT", raising=False)
+    monkeypatch.delenv("DB_MAX_CONNECTIONS", raising=False)
+    settings = PoolSettings.from_env()
+    # Assert that the pool settings are read from the environment
+    assert (settings.min_size, settings.max_size) == (2, 20), f"Unexpected pool sizes {settings}"
+    assert settings.acquire_timeout == 1.5, f"Expected acquire timeout 1.5, but got {settings.acquire_timeout}"
+    assert settings.statement_cache_size == 0, f"Expected statement cache size 0, but got {settings.statement_cache_size}"
+    # Assert that unset variables keep their defaults
+    assert settings.command_timeout is None, f"Expected no command timeout, but got {settings.command_timeout}"
+
+def test_pool_settings_within_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("DB_POOL_MAX_SIZE", "50")
+    monkeypatch.setenv("DB_MAX_CONNECTIONS", "100")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.delenv("DB_RESERVED_CONNECTIONS", raising=False)
+    settings = PoolSettings.from_env()
+    # Assert that 4 workers, each with a pool and a LISTEN connection, fit in 100 - 5 reserved connections
+    assert settings.max_size == 22, f"Expected max_size 22, but got {settings.max_size}"
+    assert 4 * (settings.max_size + 1) <= 95, "Expected the workers to stay within the connection budget"
+    # Assert that a smaller configured size is kept and an impossible budget is rejected
+    assert PoolSettings(max_size=5).within_budget(100, 4).max_size == 5, "Expected the configured size to be kept"
+    with pytest.raises(ValueError):
+        PoolSettings().within_budget(10, 8)
+
+@pytest.mark.asyncio
+async def test_pool_acquire_timeout() -> None:
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        settings=PoolSettings(min_size=1, max_size=1, acquire_timeout=0.05),
+    )
+
+    pool = await repo.connect()
+    try:
+        if pool:
+            async with pool.acquire():
+                # Assert that a saturated pool fails fast instead of queueing forever
+                with pytest.raises(PoolAcquireTimeout):
+                    async with pool.acquire():
+                        pass
+                stats = repo.pool_stats()
+                assert stats["in_use"] == 1, f"Expected one connection in use, but got {stats['in_use']}"
+            stats = repo.pool_stats()
+            assert stats["acquire_timeouts"] == 1, f"Expected one acquire timeout, but got {stats['acquire_timeouts']}"
+            assert stats["acquire_wait_seconds"]["count"] == 2, "Expected both acquire attempts to be recorded"
+        else:
+            pytest.fail("No pool established")
+    finally:
+        await repo.close()
+
+@pytest.mark.asyncio
+async def test_listen_notifications() -> None:
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+    )
+
+    pool = await repo.connect()
+    try:
+        if pool:
+            received = asyncio.Queue()
+            await repo.listen("test_channel", received.put_nowait)
+            await repo.listen("test_channel", received.put_nowait)
+            async with pool.acquire() as conn:
+                await conn.execute("SELECT pg_notify('test_channel', 'hello')")
+            # Assert that every handler on the shared listener receives the payload
+            payloads = [await asyncio.wait_for(received.get(), 5), await asyncio.wait_for(received.get(), 5)]
+            assert payloads == ["hello", "hello"], f"Expected two 'hello' payloads, but got {payloads}"
+
+            await repo.unlisten("test_channel", received.put_nowait)
+            await repo.unlisten("test_channel", received.put_nowait)
+            async with pool.acquire() as conn:
+                await conn.execute("SELECT pg_notify('test_channel', 'ignored')")
+            await asyncio.sleep(0.1)
+            # Assert that nothing is delivered after the last handler is removed
+            assert received.empty(), "Expected no payloads after unlisten"
+        else:
+            pytest.fail("No pool established")
+    finally:
+        await repo.close()
+
+@pytest.mark.asyncio
+async def test_category_stats_see_concurrent_inserts() -> None:
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+    )
+
+    pool = await repo.connect()
+    try:
+        if pool:
+            category = f"stats-{random_string()}"
+            insert = "INSERT INTO products (name, code, description, category, price) VALUES ('p', $1, 'd', $2, $3) RETURNING id"
+            cheapest = await pool.fetchval(insert, random_string(), category, Decimal("1.00"))
+            await pool.fetchval(insert, random_string(), category, Decimal("9.00"))
+
+            async with pool.acquire() as writer:
+                async with writer.transaction():
+                    # The insert's trigger holds the category's stats row until commit
+                    await writer.fetchval(insert, random_string(), category, Decimal("3.00"))
+                    delete = asyncio.ensure_future(pool.execute("DELETE FROM products WHERE id = $1", cheapest))
+                    async with pool.acquire() as conn:
+                        for _ in range(100):
+                            if delete.done() or await conn.fetchval(
+                                "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND wait_event_type = 'Lock'"
+                            ):
+                                break
+                            await asyncio.sleep(0.01)
+            await delete
+
+            stats = await pool.fetchrow("SELECT product_count, min_price, max_price FROM product_category_stats WHERE category = $1", category)
+            # Assert that removing the old minimum re-read a minimum that includes the insert committed meanwhile
+            assert (stats["product_count"], stats["min_price"], stats["max_price"]) == (2, Decimal("3.00"), Decimal("9.00")), f"Unexpected stats {dict(stats)}"
+            await pool.execute("DELETE FROM products WHERE category = $1", category)
+        else:
+            pytest.fail("No pool established")
+    finally:
+        await repo.close()
+
+@pytest.mark.asyncio
+async def test_read_routing() -> None:
+    # Two replica pools; point DB_REPLICA_HOST/DB_REPLICA_PORT at a streaming replica to exercise a real one
+    replica = (os.getenv("DB_REPLICA_HOST", os.getenv("DB_HOST")), os.getenv("DB_REPLICA_PORT", os.getenv("DB_PORT")))
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        read_routing=ReadRoutingSettings(replicas=[replica, replica], read_your_writes_seconds=5),
+    )
+
+    pool = await repo.connect()
+    try:
+        if pool:
+            reads = repo.reads
+            # Assert that reads alternate between replicas and never hit the primary
+            chosen = [reads.for_read() for _ in range(4)]
+            assert chosen == repo.replica_pools * 2, "Expected round-robin over the replica pools"
+
+            state = ReadConsistency()
+            bind_read_consistency(state)
+            reads.note_write()
+            # Assert that a write pins the caller's reads to the primary
+            assert state.wrote and reads.for_read() is pool, "Expected reads after a write to use the primary"
+            bind_read_consistency(ReadConsistency())
+            with primary_reads():
+                # Assert that reads can be forced to the primary explicitly
+                assert reads.for_read() is pool, "Expected primary_reads() to route to the primary"
+            assert reads.for_read() in repo.replica_pools, "Expected reads to return to the replicas"
+
+            reads.settings.strategy = "least_busy"
+            async with repo.replica_pools[0].acquire():
+                # Assert that least_busy avoids the replica with a connection checked out
+                assert reads.for_read() is repo.replica_pools[1], "Expected the idle replica to be chosen"
+            async with reads.for_read().acquire() as conn:
+                assert await conn.fetchval("SELECT 1") == 1, "Expected the replica pool to serve queries"
+        else:
+            pytest.fail("No pool established")
+    finally:
+        await repo.close()
+
+@pytest.mark.asyncio
+async def test_snapshot_loads_from_primary() -> None:
+    replica = (os.getenv("DB_REPLICA_HOST", os.getenv("DB_HOST")), os.getenv("DB_REPLICA_PORT", os.getenv("DB_PORT")))
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        read_routing=ReadRoutingSettings(replicas=[replica]),
+    )
+
+    pool = await repo.connect()
+    try:
+        if pool:
+            snapshot = SnapshotProductRepository(PostgresProductRepository(pool, repo.reads))
+            replica_reads = repo.reads.replica_reads
+            await snapshot.load()
+            # Assert that the full scan reads the primary, which the change feed's position comes from
+            assert repo.reads.replica_reads == replica_reads, "Expected the snapshot load to skip the replicas"
+            async with pool.acquire() as conn:
+                count = await conn.fetchval("SELECT count(*) FROM products")
+            assert snapshot.stats()["products"] == count, f"Expected {count} products, got {snapshot.stats()}"
+        else:
+            pytest.fail("No pool established")
+    finally:
+        await repo.close()
+
+def test_read_routing_settings_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("DB_PORT", "5432")
+    monkeypatch.setenv("DB_REPLICA_HOSTS", "replica-a:5433, replica-b")
+    monkeypatch.setenv("DB_READ_STRATEGY", "least_busy")
+    monkeypatch.setenv("DB_READ_YOUR_WRITES_SECONDS", "2.5")
+    settings = ReadRoutingSettings.from_env()
+    # Assert that hosts default to DB_PORT and the other settings are parsed
+    assert settings.replicas == [("replica-a", "5433"), ("replica-b", "5432")], f"Unexpected replicas {settings.replicas}"
+    assert settings.strategy == "least_busy" and settings.read_your_writes_seconds == 2.5, f"Unexpected settings {settings}"
+    # Assert that an unknown strategy is rejected
+    with pytest.raises(ValueError):
+        ReadRoutingSettings(strategy="random")
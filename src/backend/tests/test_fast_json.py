@@ -0,0 +1,42 @@
+import json, pytest
+from datetime import datetime, timezone
+from decimal import Decimal
+from models import Product, ProductPage
+from utils import fast_json
+
+ROWS = [
+    {
+        "id": 1,
+        "name": "Ball",
+        "code": "c1",
+        "description": "Official é match ball",
+        "category": "Balls",
+        "price": Decimal("19.90"),
+        "created_at": datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc),
+        "version": 7,
+        "updated_at": datetime(2024, 5, 2, 8, 30, 0, tzinfo=timezone.utc),
+    },
+    {
+        "id": 2,
+        "name": "Shirt",
+        "code": "c2",
+        "description": "Home shirt",
+        "category": "Apparel",
+        "price": Decimal("100"),
+        "created_at": datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc),
+        "version": 8,
+        "updated_at": datetime(2024, 5, 1, 12, 0, 0, tzinfo=timezone.utc),
+    },
+]
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_fast_json_matches_model_path(use_orjson: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    if use_orjson and fast_json.orjson is None:
+        pytest.skip("orjson is not installed")
+    if not use_orjson:
+        monkeypatch.setattr(fast_json, "orjson", None)
+
+    expected = ProductPage(items=[Product(**row) for row in ROWS], next_cursor="abc").model_dump(mode="json")
+    encoded = fast_json.dumps({"items": ROWS, "next_cursor": "abc"})
+    # Assert that the fast path produces the same JSON document as the pydantic path
+    assert json.loads(encoded) == expected, f"Expected {expected}, but got {encoded!r}"
@@ -0,0 +1,59 @@
+import asyncio, asyncpg, pytest, time
+from repositories import InMemoryProductRepository
+from services import InsertBatcher, InsertBatchSettings, ProductService
+from tests.test_memory_repository import make_products
+
+def make_service(max_batch: int = 50, max_delay: float = 0.01, **kwargs) -> ProductService:
+    repository = InMemoryProductRepository()
+    batcher = InsertBatcher(repository, InsertBatchSettings(enabled=True, max_batch=max_batch, max_delay=max_delay), **kwargs)
+    batcher.start()
+    return ProductService(repository, insert_batcher=batcher)
+
+@pytest.mark.asyncio
+async def test_concurrent_inserts_are_batched() -> None:
+    writes = []
+    product_service = make_service(note_write=lambda: writes.append(1))
+    batcher = product_service.insert_batcher
+    products = make_products(120)
+    ids = await asyncio.gather(*(product_service.create_product(product) for product in products))
+    stored = await product_service.get_products_by_ids(ids)
+    # Assert that every caller got the id of its own product
+    assert [product.code for product in stored.items] == [product.code for product in products], "IDs do not match their products"
+    # Assert that the inserts were written in full batches plus the remainder
+    assert batcher.stats()["batches"] == 3 and batcher.stats()["largest_batch"] == 50, f"Unexpected batching {batcher.stats()}"
+    assert len(writes) == len(products), "Every caller should note its write"
+
+    fetched = await asyncio.gather(*(product_service.create_and_fetch_product(product) for product in make_products(3, seed=1)))
+    # Assert that fetching callers get the stored rows
+    assert all(product.id and product.version for product in fetched), f"Expected stored rows, got {fetched}"
+    await batcher.close()
+
+@pytest.mark.asyncio
+async def test_rejected_rows_fail_alone() -> None:
+    product_service = make_service()
+    products = make_products(20)
+    await product_service.create_product(products[7])
+    results = await asyncio.gather(*(product_service.create_product(product) for product in products), return_exceptions=True)
+    failed = [index for index, result in enumerate(results) if isinstance(result, Exception)]
+    # Assert that only the duplicate code fails, with the repository's own error, and the rest are written
+    assert failed == [7] and isinstance(results[7], asyncpg.UniqueViolationError), f"Unexpected results {results}"
+    assert len((await product_service.get_products_by_ids(results[:7] + results[8:])).items) == 19, "Other rows should be stored"
+    assert product_service.insert_batcher.stats()["splits"] > 0, "The failed batch should have been split"
+    await product_service.insert_batcher.close()
+
+@pytest.mark.asyncio
+async def test_deadline_and_drain_on_close() -> None:
+    product_service = make_service(max_delay=0.02)
+    started = time.monotonic()
+    await product_service.create_product(make_products(1)[0])
+    # Assert that a lone insert is flushed once its deadline passes
+    assert 0.015 < time.monotonic() - started < 1, "A partial batch should wait for max_delay"
+
+    product_service.insert_batcher.settings.max_delay = 60
+    waiting = [asyncio.ensure_future(product_service.create_product(product)) for product in make_products(5, seed=1)]
+    await asyncio.sleep(0.01)
+    await asyncio.wait_for(product_service.insert_batcher.close(), 1)
+    # Assert that closing writes every queued product instead of waiting for the deadline
+    assert all(task.done() and task.result() for task in waiting), "Queued inserts should be written on close"
+    # Assert that inserts after close are written directly
+    assert await product_service.create_product(make_products(1, seed=2)[0]), "Inserts after close should still succeed"
@@ -0,0 +1,157 @@
+import asyncpg, pytest, random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from models import Product, ProductFilter, ProductPatch, ProductPatchItem, ProductSortField, SearchMode, SortOrder
+from repositories import InMemoryProductRepository
+from services import ChangesExpired, IdempotencyKeyReused, ProductService
+from utils import random_product
+
+def make_products(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    products = []
+    for index in range(count):
+        product = random_product()
+        product.update(
+            code=f"code-{seed}-{index}",
+            category=rng.choice(["Books", "Games", "Tools"]),
+            # Few distinct values, so ties on the sort column are broken by id
+            price=Decimal(rng.randrange(1, 20)),
+            created_at=start + timedelta(days=rng.randrange(30))
+        )
+        products.append(Product(**product))
+    return products
+
+@pytest.mark.asyncio
+async def test_memory_crud_and_unique_codes() -> None:
+    product_service = ProductService(InMemoryProductRepository())
+    first, second = make_products(2)
+    product_id = await product_service.create_product(first)
+    stored = await product_service.get_product_by_id(product_id)
+    # Assert that a created product reads back with a version and UTC timestamps
+    assert stored.code == first.code and stored.version == 1, f"Unexpected product {stored}"
+    assert stored.updated_at.tzinfo is not None, "Timestamps should be timezone-aware"
+
+    # Assert that a duplicate code is rejected like the unique index does, and a failed batch writes nothing
+    with pytest.raises(asyncpg.UniqueViolationError):
+        await product_service.create_product(first)
+    with pytest.raises(asyncpg.UniqueViolationError):
+        await product_service.create_products_bulk([second, second])
+    assert (await product_service.get_products_by_ids([product_id, product_id + 1])).missing == [product_id + 1], "The failed batch must not be applied"
+
+    updated = first.model_copy(update={"name": "Renamed", "category": "Other"})
+    # Assert that an update rewrites the row and moves it between category indexes
+    assert await product_service.update_product(product_id, updated), "Update failed"
+    assert (await product_service.get_product_by_id(product_id)).name == "Renamed", "Update not applied"
+    stats = await product_service.get_category_stats()
+    assert [c.category for c in stats.categories] == ["Other"], f"Unexpected categories {stats.categories}"
+
+    assert await product_service.delete_product(product_id), "Delete failed"
+    # Assert that deleted products and their categories are gone
+    assert await product_service.get_product_by_id(product_id) is None, "Product should be deleted"
+    assert (await product_service.get_category_stats()).categories == [], "Empty categories should be dropped"
+
+@pytest.mark.asyncio
+async def test_memory_pagination_matches_sorted_rows() -> None:
+    product_service = ProductService(InMemoryProductRepository())
+    products = make_products(300)
+    ids = await product_service.create_products_bulk(products)
+    stored = {product_id: product for product_id, product in zip(ids, products)}
+
+    filters_cases = [
+        None,
+        ProductFilter(category="Games"),
+        ProductFilter(min_price=Decimal(5), max_price=Decimal(12)),
+        ProductFilter(category="Tools", created_after=datetime(2024, 1, 10, tzinfo=timezone.utc), created_before=datetime(2024, 1, 20, tzinfo=timezone.utc)),
+    ]
+    for filters in filters_cases:
+        for sort in ProductSortField:
+            for order in SortOrder:
+                expected = [
+                    product_id for product_id, product in stored.items()
+                    if filters is None or (
+                        (filters.category is None or product.category == filters.category)
+                        and (filters.min_price is None or product.price >= filters.min_price)
+                        and (filters.max_price is None or product.price <= filters.max_price)
+                        and (filters.created_after is None or product.created_at >= filters.created_after)
+                        and (filters.created_before is None or product.created_at < filters.created_before)
+                    )
+                ]
+                key = (lambda i: i) if sort == ProductSortField.id else (lambda i: (getattr(stored[i], sort.value), i))
+                expected.sort(key=key, reverse=order == SortOrder.desc)
+
+                seen, cursor = [], None
+                while True:
+                    page = await product_service.list_products_page(filters, sort, order, 7, cursor)
+                    seen.extend(product.id for product in page.items)
+                    cursor = page.next_cursor
+                    if cursor is None:
+                        break
+                # Assert that keyset pages walk the index in exactly the sorted order
+                assert seen == expected, f"Pages differ for {filters} sorted by {sort.value} {order.value}"
+
+@pytest.mark.asyncio
+async def test_memory_stats_and_changes() -> None:
+    product_service = ProductService(InMemoryProductRepository())
+    now = datetime.now(timezone.utc)
+    products = make_products(20)
+    products[0] = products[0].model_copy(update={"created_at": now})
+    ids = await product_service.create_products_bulk(products)
+
+    stats = await product_service.get_category_stats(recent_days=1)
+    expected_count = {c: sum(1 for p in products if p.category == c) for c in {p.category for p in products}}
+    # Assert that per-category statistics come straight from the indexes
+    assert {c.category: c.product_count for c in stats.categories} == expected_count, f"Unexpected counts {stats}"
+    assert stats.total_count == len(products) and sum(c.recent_count for c in stats.categories) == 1, f"Unexpected totals {stats}"
+    books = [p.price for p in products if p.category == "Books"]
+    books_stats = next(c for c in stats.categories if c.category == "Books")
+    assert (books_stats.min_price, books_stats.max_price) == (min(books), max(books)), f"Unexpected price range {books_stats}"
+
+    changes = await product_service.get_changes(since=0)
+    # Assert that the change feed lists every insert, then only later writes and deletes
+    assert [p.id for p in changes.items] == ids and changes.deleted == [], "Expected every inserted product"
+    await product_service.patch_products([ProductPatchItem(id=ids[1], name="Patched")])
+    await product_service.delete_products([ids[2]])
+    later = await product_service.get_changes(since=changes.version, limit=1)
+    assert [p.id for p in later.items] == [ids[1]] and later.next_cursor, f"Unexpected first page {later}"
+    rest = await product_service.get_changes(since=changes.version, cursor=later.next_cursor)
+    assert rest.items == [] and rest.deleted == [ids[2]], f"Unexpected second page {rest}"
+
+    # Assert that purging tombstones expires feeds that started before them
+    assert await product_service.purge_tombstones(now + timedelta(minutes=1)) == 1, "Expected one tombstone purged"
+    with pytest.raises(ChangesExpired):
+        await product_service.get_changes(since=changes.version)
+
+@pytest.mark.asyncio
+async def test_memory_upserts_and_search() -> None:
+    product_service = ProductService(InMemoryProductRepository())
+    first, second = make_products(2)
+    first = first.model_copy(update={"name": "Blue widget", "description": "A sturdy tool"})
+
+    stored, inserted = await product_service.upsert_product(first)
+    # Assert that upserts insert, then leave identical rows alone, then update by code
+    assert inserted, "First upsert should insert"
+    again, inserted = await product_service.upsert_product(first)
+    assert not inserted and again.version == stored.version, "An identical upsert must not write"
+    result = await product_service.upsert_products_bulk([first.model_copy(update={"price": Decimal(99)}), second, second])
+    assert (result.inserted, result.updated, result.unchanged) == (1, 1, 0), f"Unexpected counts {result}"
+    assert result.ids[0] == stored.id and result.ids[1] == result.ids[2], f"Unexpected ids {result.ids}"
+
+    # Assert that an idempotency key replays its product and rejects a different body
+    keyed = make_products(1, seed=1)[0]
+    product_id, replayed = await product_service.create_product_idempotent(keyed, "key")
+    assert not replayed, "The first request with a key should insert"
+    assert await product_service.create_product_idempotent(keyed, "key") == (product_id, True), "Expected a replay"
+    with pytest.raises(IdempotencyKeyReused):
+        await product_service.create_product_idempotent(second, "key")
+
+    # Assert that each search mode finds the product
+    for text, mode in (("blue", SearchMode.prefix), ("widget sturdy", SearchMode.fts), ("blue widgit", SearchMode.fuzzy)):
+        page = await product_service.search_products(text, mode)
+        assert [hit.id for hit in page.items] == [stored.id], f"{mode.value} search for {text!r} returned {page.items}"
+    assert (await product_service.search_products("widget -sturdy")).items == [], "Excluded words should not match"
+
+    updated = await product_service.update_products_where(ProductFilter(min_price=Decimal(50)), ProductPatch(), Decimal(10))
+    # Assert that set-based updates apply to matching rows only
+    assert updated == [stored.id], f"Unexpected updated ids {updated}"
+    assert (await product_service.get_product_by_id(stored.id)).price == Decimal("108.90"), "Price change not applied"
@@ -0,0 +1,53 @@
+import pytest
+from services.instrumentation import QUERY_DURATION, QUERY_ERRORS, QUERY_ROWS, instrumented
+from utils.metrics import Histogram, MetricsRegistry
+
+def test_histogram_buckets() -> None:
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    # Assert that bucket counts are cumulative and end with +Inf
+    assert snapshot["buckets"] == {"0.1": 1, "1.0": 3, "+Inf": 4}, f"Unexpected buckets {snapshot['buckets']}"
+    assert snapshot["count"] == 4, f"Expected 4 observations, but got {snapshot['count']}"
+
+def test_registry_render() -> None:
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests.", ("route",)).labels('/a"b').inc(2)
+    registry.histogram("latency_seconds", "Latency.", buckets=(1.0,)).labels().observe(0.5)
+    text = registry.render()
+    # Assert that the output follows the Prometheus text format
+    assert "# TYPE requests_total counter" in text, "Missing counter TYPE line"
+    assert 'requests_total{route="/a\\"b"} 2.0' in text, "Label values should be escaped"
+    assert 'latency_seconds_bucket{le="1.0"} 1' in text, "Missing histogram bucket"
+    assert "latency_seconds_count 1" in text, "Missing histogram count"
+
+@pytest.mark.asyncio
+async def test_instrumented_records_rows_and_errors() -> None:
+    @instrumented
+    async def fetch_three_rows() -> list:
+        return [1, 2, 3]
+
+    @instrumented
+    async def failing_query() -> None:
+        raise RuntimeError("boom")
+
+    await fetch_three_rows()
+    with pytest.raises(RuntimeError):
+        await failing_query()
+    # Assert that latency, rows and errors are recorded per query name
+    assert QUERY_DURATION.labels("fetch_three_rows").count == 1, "Expected one recorded call"
+    assert QUERY_ROWS.labels("fetch_three_rows").value == 3, "Expected three recorded rows"
+    assert QUERY_ERRORS.labels("failing_query").value == 1, "Expected one recorded error"
+
+def test_registry_const_labels() -> None:
+    registry = MetricsRegistry({"worker": "42"})
+    registry.counter("requests_total", "Requests.", ("route",)).labels("/a").inc()
+    registry.counter("errors_total", "Errors.").labels().inc()
+    registry.register_collector(lambda: ["# TYPE pool_size gauge", "pool_size 3"])
+    text = registry.render()
+    # Assert that every sample, including collector output, carries the worker label
+    assert 'requests_total{worker="42",route="/a"} 1.0' in text, f"Missing worker label in {text}"
+    assert 'errors_total{worker="42"} 1.0' in text, f"Missing worker label in {text}"
+    assert 'pool_size{worker="42"} 3' in text, f"Missing worker label in {text}"
+    assert "# TYPE pool_size gauge" in text, "Comment lines should be left unchanged"
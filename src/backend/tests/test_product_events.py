@@ -0,0 +1,47 @@
+import json, pytest
+from services import ProductEventBroadcaster
+
+@pytest.mark.asyncio
+async def test_broadcast_to_subscribers() -> None:
+    broadcaster = ProductEventBroadcaster(max_queue=10)
+    payload = json.dumps({"op": "insert", "version": 1, "ids": [1]})
+    with broadcaster.subscribe() as first, broadcaster.subscribe() as second:
+        broadcaster.handle_notification(payload)
+        # Assert that every subscriber receives the notification unchanged
+        for subscription in (first, second):
+            event = await subscription.get()
+            assert event == ("change", payload), f"Expected the change event, but got {event}"
+    # Assert that leaving the context unsubscribes
+    assert broadcaster.stats()["subscribers"] == 0, f"Expected no subscribers, but got {broadcaster.stats()}"
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_resync() -> None:
+    broadcaster = ProductEventBroadcaster(max_queue=2)
+    with broadcaster.subscribe() as slow, broadcaster.subscribe() as fast:
+        for version in range(3):
+            broadcaster.handle_notification(json.dumps({"op": "update", "version": version, "ids": [1]}))
+            await fast.get()
+        # Assert that an overflowing queue collapses into a single resync event
+        event, data = await slow.get()
+        assert event == "resync" and json.loads(data) == {"op": "resync"}, f"Expected a resync event, but got {event} {data}"
+        assert slow.queue.empty(), "Expected the dropped events to be discarded"
+        assert slow.overflows == 1 and fast.overflows == 0, f"Expected only the slow subscriber to overflow, got {slow.overflows} and {fast.overflows}"
+
+@pytest.mark.asyncio
+async def test_missed_notifications_become_resync() -> None:
+    broadcaster = ProductEventBroadcaster()
+    with broadcaster.subscribe() as subscription:
+        broadcaster.handle_notification(None)
+        event, _ = await subscription.get()
+        # Assert that a listener reconnect is reported as a resync
+        assert event == "resync", f"Expected a resync event, but got {event}"
+
+@pytest.mark.asyncio
+async def test_close_ends_streams() -> None:
+    broadcaster = ProductEventBroadcaster()
+    subscription = broadcaster.subscribe()
+    broadcaster.handle_notification(json.dumps({"op": "delete", "version": 1, "ids": [1]}))
+    broadcaster.close()
+    # Assert that pending events are dropped and the stream is told to end
+    assert await subscription.get() is None, "Expected the end-of-stream marker"
+    assert broadcaster.stats()["subscribers"] == 0, f"Expected no subscribers, but got {broadcaster.stats()}"
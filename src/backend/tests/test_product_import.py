@@ -0,0 +1,39 @@
+import json, pytest
+from services.product_import import parse_products
+
+VALID_ROW = {
+    "name": "Ball",
+    "code": "c1",
+    "description": "Football",
+    "category": "Balls",
+    "price": "19.90",
+    "created_at": "2024-05-01T12:00:00+00:00",
+}
+
+def test_parse_json_array() -> None:
+    body = json.dumps([VALID_ROW, {**VALID_ROW, "price": "abc"}, "oops"]).encode()
+    products, failed = parse_products(body, "application/json")
+    # Assert that valid rows are kept and invalid ones are reported by index
+    assert [p.code for p in products] == ["c1"], f"Unexpected products {products}"
+    assert [f.index for f in failed] == [1, 2], f"Unexpected failures {failed}"
+    assert failed[0].errors[0].startswith("price"), f"Expected a price error, but got {failed[0].errors}"
+
+def test_parse_ndjson() -> None:
+    body = (json.dumps(VALID_ROW) + "\n\n{not json}\n").encode()
+    products, failed = parse_products(body, "application/x-ndjson; charset=utf-8")
+    # Assert that blank lines are skipped and malformed lines are reported
+    assert len(products) == 1, f"Expected one product, but got {len(products)}"
+    assert [f.index for f in failed] == [1], f"Unexpected failures {failed}"
+
+def test_parse_csv() -> None:
+    header = "id," + ",".join(VALID_ROW.keys())
+    body = f"{header}\n7,{','.join(VALID_ROW.values())}\n".encode()
+    products, failed = parse_products(body, "text/csv")
+    # Assert that exported CSV files can be re-imported, ignoring their ids
+    assert not failed, f"Unexpected failures {failed}"
+    assert products[0].id is None, "Imported products should not keep the exported id"
+
+def test_parse_unsupported_content_type() -> None:
+    # Assert that unknown payload types are rejected
+    with pytest.raises(ValueError):
+        parse_products(b"<xml/>", "application/xml")
@@ -0,0 +1,153 @@
+import asyncio, csv, gzip, os, pytest
+from datetime import datetime, timezone
+from decimal import Decimal
+from models import Product, ProductFilter
+from repositories import PostgresRepository, ProductPartitions
+from repositories.product_partitions import add_months
+from services import ProductService
+from utils import random_product
+
+@pytest.mark.asyncio
+async def test_partition_creation_and_archival(tmp_path) -> None:
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+    )
+
+    pool = await repo.connect()
+    partitions = ProductPartitions(pool)
+    # A month no other test writes to, so that its partition is created and archived here
+    month = datetime(2091, 1, 1, tzinfo=timezone.utc)
+    try:
+        if pool:
+            product_service = ProductService(pool)
+            product = Product(**{**random_product(), "created_at": datetime(2091, 1, 15, tzinfo=timezone.utc)})
+            product_id = await product_service.create_product(product)
+
+            async def partition_of(product_id: int) -> str:
+                async with pool.acquire() as conn:
+                    return await conn.fetchval("SELECT tableoid::regclass::text FROM products WHERE id = $1", product_id)
+
+            # Assert that a row outside every month lands in the default partition
+            assert await partition_of(product_id) == "products_default", "Expected the row in products_default"
+
+            created = await partitions.create_partitions(month, add_months(month, 1))
+            # Assert that creating its month moves the row out of the default partition
+            assert created == 1 and await partition_of(product_id) == "products_p209101", f"Expected one new partition, got {created}"
+            listed = {partition.name: partition for partition in await partitions.list_partitions()}
+            assert listed["products_p209101"].start == month, f"Unexpected partition {listed.get('products_p209101')}"
+
+            page = await product_service.list_products_page(ProductFilter(created_after=month, created_before=add_months(month, 1)))
+            # Assert that a time-filtered listing finds the row and only reads the months it overlaps
+            assert [item.id for item in page.items] == [product_id], f"Unexpected page {page.items}"
+            async with pool.acquire() as conn:
+                plan = "\n".join(row[0] for row in await conn.fetch(
+                    "EXPLAIN SELECT id FROM products WHERE created_at >= $1 AND created_at < $2 ORDER BY id LIMIT 10",
+                    month, add_months(month, 1)
+                ))
+            assert "products_p209101" in plan and "products_p2024" not in plan and "products_default" not in plan, f"Expected pruning:\n{plan}"
+
+            files = await partitions.archive_partition("products_p209101", str(tmp_path))
+            path = os.path.join(tmp_path, "products_p209101.csv.gz")
+            # Assert that the archived month is exported and gone from the API
+            assert path in files, f"Expected {path} among {files}"
+            with gzip.open(path, "rt", newline="") as archive:
+                rows = list(csv.DictReader(archive))
+            assert [row["code"] for row in rows] == [product.code], f"Unexpected archive {rows}"
+            assert await product_service.get_product_by_id(product_id) is None, "Archived products should be gone"
+            assert "products_p209101" not in {partition.name for partition in await partitions.list_partitions()}, "Partition should be dropped"
+            async with pool.acquire() as conn:
+                assert await conn.fetchval("SELECT count(*) FROM product_tombstones WHERE id = $1", product_id), "Archived rows need tombstones"
+
+            stored, inserted = await product_service.upsert_product(product)
+            # Assert that the archived product's code can be used again
+            assert inserted and stored.id != product_id, f"Expected a new product, got {stored}"
+            await product_service.delete_product(stored.id)
+        else:
+            pytest.fail("No connection established")
+    finally:
+        if pool and "products_p209101" in {partition.name for partition in await partitions.list_partitions()}:
+            await partitions.archive_partition("products_p209101", str(tmp_path))
+        await repo.close()
+
+@pytest.mark.asyncio
+async def test_upsert_retry_writes_nothing() -> None:
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+    )
+
+    pool = await repo.connect()
+    try:
+        if pool:
+            product_service = ProductService(pool)
+            product = Product(**random_product())
+            stored, _ = await product_service.upsert_product(product)
+
+            async def registry_state() -> tuple:
+                async with pool.acquire() as conn:
+                    return await conn.fetchrow(
+                        """
+                        SELECT c.xmin::text AS xmin, s.last_value
+                        FROM product_codes c, pg_sequences s
+                        WHERE c.code = $1 AND s.schemaname || '.' || s.sequencename = pg_get_serial_sequence('products', 'id')
+                        """,
+                        product.code
+                    )
+
+            before = await registry_state()
+            retried, inserted = await product_service.upsert_product(product)
+            # Assert that an identical retry neither rewrites the code's registry row nor draws an id
+            assert not inserted and retried.version == stored.version, f"Expected {stored} unchanged, got {retried}"
+            assert await registry_state() == before, f"Expected the registry untouched, was {before}"
+            await product_service.delete_product(stored.id)
+        else:
+            pytest.fail("No connection established")
+    finally:
+        await repo.close()
+
+@pytest.mark.asyncio
+async def test_upsert_and_delete_do_not_deadlock() -> None:
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+    )
+
+    pool = await repo.connect()
+    try:
+        if pool:
+            product_service = ProductService(pool)
+            product = Product(**random_product())
+            stored, _ = await product_service.upsert_product(product)
+
+            async with pool.acquire() as deleter:
+                async with deleter.transaction():
+                    # A delete locks the product row first; its trigger reaches the registry at the end of the statement
+                    await deleter.execute("SELECT 1 FROM products WHERE id = $1 FOR UPDATE", stored.id)
+                    upsert = asyncio.ensure_future(product_service.upsert_product(product.model_copy(update={"price": Decimal("3.50")})))
+                    async with pool.acquire() as conn:
+                        for _ in range(100):
+                            if upsert.done() or await conn.fetchval(
+                                "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND wait_event_type = 'Lock'"
+                            ):
+                                break
+                            await asyncio.sleep(0.01)
+                    await deleter.execute("DELETE FROM products WHERE id = $1", stored.id)
+
+            recreated, inserted = await upsert
+            # Assert that the upsert waited for the delete instead of deadlocking with it, then recreated the product
+            assert inserted and recreated.id != stored.id and recreated.price == Decimal("3.50"), f"Unexpected upsert result {recreated}"
+            await product_service.delete_product(recreated.id)
+        else:
+            pytest.fail("No connection established")
+    finally:
+        await repo.close()
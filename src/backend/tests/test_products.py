@@ -1,248 +1,460 @@
-import os, pytest
-from models import Product
-from repositories import PostgresRepository
-from services import ProductService
-from utils import random_product
-
-@pytest.mark.asyncio
-async def test_create_product() -> None:
-    repo = PostgresRepository(
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
+import asyncio, pytest
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from models import Product, ProductFilter, ProductPatch, ProductPatchItem, ProductSortField, SearchMode, SortOrder
+from repositories import ProductRepository
+from services import ChangesExpired, IdempotencyKeyReused, ProductService
+from utils import generate_product_chunks, random_product, random_string
+
+async def current_version(product_repository: ProductRepository) -> int:
+    """The version a change feed started now would resume from."""
+    _, safe_version, _ = await product_repository.get_changes(0, 2 ** 63 - 1, 0)
+    return safe_version - 1
+
+@pytest.mark.asyncio
+async def test_create_product(product_repository: ProductRepository) -> None:
+    version = await product_repository.get_version()
+    # Assert that the version is not None, indicating a successful query
+    assert version is not None, "Failed to fetch the storage version"
+
+    product_service = ProductService(product_repository)
+    random_p = random_product()
+    new_product = Product(
+        name=random_p["name"],
+        code=random_p["code"],
+        description=random_p["description"], 
+        category=random_p["category"], 
+        price=random_p["price"],
+        created_at=random_p["created_at"]
     )
 
-    pool = await repo.connect()
-    try:
-        if pool:
-            version = await repo.get_version()
-            # Assert that the version is not None, indicating a successful query
-            assert version is not None, "Failed to fetch PostgreSQL version"
-
-            product_service = ProductService(pool)
-            random_p = random_product()
-            new_product = Product(
-                name=random_p["name"],
-                code=random_p["code"],
-                description=random_p["description"], 
-                category=random_p["category"], 
-                price=random_p["price"],
-                created_at=random_p["created_at"]
-            )
-
-            product_id = await product_service.create_product(new_product)
-            # Assert that the product is not None, indicating a successful product creation
-            assert product_id is not None, "Product id is None"
-        else:
-            pytest.fail("No connection established")
-    finally:
-        await repo.close()
-
-@pytest.mark.asyncio
-async def test_delete_product() -> None:
-    repo = PostgresRepository(
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
+    product_id = await product_service.create_product(new_product)
+    # Assert that the product is not None, indicating a successful product creation
+    assert product_id is not None, "Product id is None"
+
+@pytest.mark.asyncio
+async def test_delete_product(product_repository: ProductRepository) -> None:
+    version = await product_repository.get_version()
+    # Assert that the version is not None, indicating a successful query
+    assert version is not None, "Failed to fetch the storage version"
+
+    product_service = ProductService(product_repository)
+    product_service2 = ProductService(product_repository)
+    random_p = random_product()
+    
+    new_product = Product(
+        name=random_p["name"],
+        code=random_p["code"],
+        description=random_p["description"], 
+        category=random_p["category"], 
+        price=random_p["price"],
+        created_at=random_p["created_at"]
     )
 
-    pool = await repo.connect()
-    try:
-        if pool:
-            version = await repo.get_version()
-            # Assert that the version is not None, indicating a successful query
-            assert version is not None, "Failed to fetch PostgreSQL version"
-
-            product_service = ProductService(pool)
-            product_service2 = ProductService(pool)
-            random_p = random_product()
-            
-            new_product = Product(
-                name=random_p["name"],
-                code=random_p["code"],
-                description=random_p["description"], 
-                category=random_p["category"], 
-                price=random_p["price"],
-                created_at=random_p["created_at"]
-            )
-
-            product_id = await product_service.create_product(new_product)
-            # Assert that the product ID is not None, indicating a successful product creation
-            assert product_id is not None, "Product id is None"
-            deleted = await product_service2.delete_product(product_id)
-            # Assert that the deletion operation was successful
-            assert deleted is True, "Failed to delete product"
-            deleted_product = await product_service2.get_product_by_id(product_id)
-            # Assert that the product does not exist after deletion
-            assert deleted_product is None, "Product should be None after deletion"
-        else:
-            pytest.fail("No connection established")
-    finally:
-        await repo.close()
-
-@pytest.mark.asyncio
-async def test_get_product_by_id() -> None:
-    repo = PostgresRepository(
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
+    product_id = await product_service.create_product(new_product)
+    # Assert that the product ID is not None, indicating a successful product creation
+    assert product_id is not None, "Product id is None"
+    deleted = await product_service2.delete_product(product_id)
+    # Assert that the deletion operation was successful
+    assert deleted is True, "Failed to delete product"
+    deleted_product = await product_service2.get_product_by_id(product_id)
+    # Assert that the product does not exist after deletion
+    assert deleted_product is None, "Product should be None after deletion"
+
+@pytest.mark.asyncio
+async def test_get_product_by_id(product_repository: ProductRepository) -> None:
+    version = await product_repository.get_version()
+    # Assert that the version is not None, indicating a successful query
+    assert version is not None, "Failed to fetch the storage version"
+
+    product_service = ProductService(product_repository)
+    product_service2 = ProductService(product_repository)
+    random_p = random_product()
+    
+    new_product = Product(
+        name=random_p["name"],
+        code=random_p["code"],
+        description=random_p["description"], 
+        category=random_p["category"], 
+        price=random_p["price"],
+        created_at=random_p["created_at"]
     )
 
-    pool = await repo.connect()
-    try:
-        if pool:
-            version = await repo.get_version()
-            # Assert that the version is not None, indicating a successful query
-            assert version is not None, "Failed to fetch PostgreSQL version"
-
-            product_service = ProductService(pool)
-            product_service2 = ProductService(pool)
-            random_p = random_product()
-            
-            new_product = Product(
-                name=random_p["name"],
-                code=random_p["code"],
-                description=random_p["description"], 
-                category=random_p["category"], 
-                price=random_p["price"],
-                created_at=random_p["created_at"]
-            )
-
-            product_id = await product_service.create_product(new_product)
-            # Assert that the product ID is not None, indicating a successful product creation
-            assert product_id is not None, "Product id is None"
-            
-            retrieved_product = await product_service2.get_product_by_id(product_id)
-            
-            # Assert that the retrieved product matches the newly created product
-            assert retrieved_product is not None, "Product should not be None when retrieved by ID"
-            assert retrieved_product.code == new_product.code, f"Expected product code {new_product.code}, but got {retrieved_product.code}"
-            assert retrieved_product.name == new_product.name, f"Expected product name {new_product.name}, but got {retrieved_product.name}"
-            assert retrieved_product.description == new_product.description, f"Expected product description {new_product.description}, but got {retrieved_product.description}"
-            assert retrieved_product.category == new_product.category, f"Expected product category {new_product.category}, but got {retrieved_product.category}"
-            assert retrieved_product.price == new_product.price, f"Expected product price {new_product.price}, but got {retrieved_product.price}"
-            # assert retrieved_product.created_at == new_product.created_at, f"Expected product creation date {new_product.created_at}, but got {retrieved_product.created_at}"
-            
-        else:
-            pytest.fail("No connection established")
-    finally:
-        await repo.close()
-
-@pytest.mark.asyncio
-async def test_update_product() -> None:
-    repo = PostgresRepository(
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
+    product_id = await product_service.create_product(new_product)
+    # Assert that the product ID is not None, indicating a successful product creation
+    assert product_id is not None, "Product id is None"
+    
+    retrieved_product = await product_service2.get_product_by_id(product_id)
+    
+    # Assert that the retrieved product matches the newly created product
+    assert retrieved_product is not None, "Product should not be None when retrieved by ID"
+    assert retrieved_product.code == new_product.code, f"Expected product code {new_product.code}, but got {retrieved_product.code}"
+    assert retrieved_product.name == new_product.name, f"Expected product name {new_product.name}, but got {retrieved_product.name}"
+    assert retrieved_product.description == new_product.description, f"Expected product description {new_product.description}, but got {retrieved_product.description}"
+    assert retrieved_product.category == new_product.category, f"Expected product category {new_product.category}, but got {retrieved_product.category}"
+    assert retrieved_product.price == new_product.price, f"Expected product price {new_product.price}, but got {retrieved_product.price}"
+    # assert retrieved_product.created_at == new_product.created_at, f"Expected product creation date {new_product.created_at}, but got {retrieved_product.created_at}"
+
+@pytest.mark.asyncio
+async def test_update_product(product_repository: ProductRepository) -> None:
+    version = await product_repository.get_version()
+    # Assert that the version is not None, indicating a successful query
+    assert version is not None, "Failed to fetch the storage version"
+
+    product_service = ProductService(product_repository)
+    product_service2 = ProductService(product_repository)
+    random_p = random_product()
+    
+    new_product = Product(
+        name=random_p["name"],
+        code=random_p["code"],
+        description=random_p["description"], 
+        category=random_p["category"], 
+        price=random_p["price"],
+        created_at=random_p["created_at"]
     )
 
-    pool = await repo.connect()
-    try:
-        if pool:
-            version = await repo.get_version()
-            # Assert that the version is not None, indicating a successful query
-            assert version is not None, "Failed to fetch PostgreSQL version"
-
-            product_service = ProductService(pool)
-            product_service2 = ProductService(pool)
-            random_p = random_product()
-            
-            new_product = Product(
-                name=random_p["name"],
-                code=random_p["code"],
-                description=random_p["description"], 
-                category=random_p["category"], 
-                price=random_p["price"],
-                created_at=random_p["created_at"]
-            )
-
-            product_id = await product_service.create_product(new_product)
-            # Assert that the product ID is not None, indicating a successful product creation
-            assert product_id is not None, "Product id is None"
-            random_p = random_product()
-            updated_product = Product(
-                name=random_p["name"],
-                code=new_product.code,
-                description=random_p["description"], 
-                category=random_p["category"], 
-                price=random_p["price"],
-                created_at=random_p["created_at"]
-            )
-            update_success = await product_service.update_product(product_id, updated_product)
-            # Assert that the update was successful
-            assert update_success, "Product update failed"
-
-            updated_product_from_db = await product_service2.get_product_by_id(product_id)
-            # Assert that the retrieved product matches the updated details
-            assert updated_product_from_db is not None, "Product should be retrieved from database"
-            assert updated_product_from_db.name == updated_product.name, "Product name was not updated correctly"
-            assert updated_product_from_db.description == updated_product.description, "Product description was not updated correctly"
-            assert updated_product_from_db.category == updated_product.category, "Product category was not updated correctly"
-            assert updated_product_from_db.price == updated_product.price, "Product price was not updated correctly"
-            
-        else:
-            pytest.fail("No connection established")
-    finally:
-        await repo.close()
-
-@pytest.mark.asyncio
-async def test_list_products() -> None:
-    repo = PostgresRepository(
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
+    product_id = await product_service.create_product(new_product)
+    # Assert that the product ID is not None, indicating a successful product creation
+    assert product_id is not None, "Product id is None"
+    random_p = random_product()
+    updated_product = Product(
+        name=random_p["name"],
+        code=new_product.code,
+        description=random_p["description"], 
+        category=random_p["category"], 
+        price=random_p["price"],
+        created_at=random_p["created_at"]
     )
+    update_success = await product_service.update_product(product_id, updated_product)
+    # Assert that the update was successful
+    assert update_success, "Product update failed"
+
+    updated_product_from_db = await product_service2.get_product_by_id(product_id)
+    # Assert that the retrieved product matches the updated details
+    assert updated_product_from_db is not None, "Product should be retrieved from database"
+    assert updated_product_from_db.name == updated_product.name, "Product name was not updated correctly"
+    assert updated_product_from_db.description == updated_product.description, "Product description was not updated correctly"
+    assert updated_product_from_db.category == updated_product.category, "Product category was not updated correctly"
+    assert updated_product_from_db.price == updated_product.price, "Product price was not updated correctly"
+
+@pytest.mark.asyncio
+async def test_list_products(product_repository: ProductRepository) -> None:
+    version = await product_repository.get_version()
+    # Assert that the version is not None, indicating a successful query
+    assert version is not None, "Failed to fetch the storage version"
+
+    product_service = ProductService(product_repository)
+
+    num_products = 3
+    added_product_ids = []
+    for _ in range(num_products):
+        product_data = random_product()
+        new_product = Product(
+            name=product_data["name"],
+            code=product_data["code"],
+            description=product_data["description"],
+            category=product_data["category"],
+            price=product_data["price"],
+            created_at=product_data["created_at"]
+        )
+        product_id = await product_service.create_product(new_product)
+        added_product_ids.append(product_id)
+        # Assert that the product ID is not None, indicating successful creation
+        assert product_id is not None, "Product ID is None"
+
+    products = await product_service.list_products()
+    # Assert that the list is not empty
+    assert products, "Product list should not be empty"
+
+
+    # Additional asserts: Ensure that the products' details are correct
+    for product in products:
+        assert product.name is not None, f"Product name should not be None for product ID {product.id}"
+        assert product.code is not None, f"Product code should not be None for product ID {product.id}"
+        assert product.description is not None, f"Product description should not be None for product ID {product.id}"
+        assert product.category is not None, f"Product category should not be None for product ID {product.id}"
+        assert product.price is not None, f"Product price should not be None for product ID {product.id}"
+        assert product.created_at is not None, f"Product created_at should not be None for product ID {product.id}"
+
+@pytest.mark.asyncio
+async def test_list_products_pagination(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    category = random_product()["name"]
+
+    added_product_ids = []
+    for _ in range(5):
+        product_data = random_product()
+        product_data["category"] = category
+        product_id = await product_service.create_product(Product(**product_data))
+        added_product_ids.append(product_id)
+
+    filters = ProductFilter(category=category)
+    first_page = await product_service.list_products_page(filters, limit=2)
+    # Assert that the first page is bounded by the limit and points to a next page
+    assert [p.id for p in first_page.items] == added_product_ids[:2], "First page should hold the two oldest ids"
+    assert first_page.next_cursor is not None, "First page should have a next cursor"
+
+    seen_ids = [p.id for p in first_page.items]
+    cursor = first_page.next_cursor
+    while cursor:
+        page = await product_service.list_products_page(filters, limit=2, cursor=cursor)
+        seen_ids.extend(p.id for p in page.items)
+        cursor = page.next_cursor
+    # Assert that walking the cursors returns every product exactly once
+    assert seen_ids == added_product_ids, f"Expected {added_product_ids}, but got {seen_ids}"
+
+    desc_page = await product_service.list_products_page(
+        filters, sort=ProductSortField.price, order=SortOrder.desc, limit=5
+    )
+    prices = [p.price for p in desc_page.items]
+    # Assert that sorting by price descending is honoured
+    assert prices == sorted(prices, reverse=True), "Products should be sorted by price descending"
+    assert desc_page.next_cursor is None, "A page holding every match should not have a next cursor"
+
+@pytest.mark.asyncio
+async def test_export_products(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    category = random_product()["name"]
+
+    added_product_ids = []
+    for _ in range(5):
+        product_data = random_product()
+        product_data["category"] = category
+        added_product_ids.append(await product_service.create_product(Product(**product_data)))
+
+    batches = []
+    async for rows in product_service.export_products(ProductFilter(category=category), batch_size=2):
+        batches.append([row["id"] for row in rows])
+    # Assert that the cursor yields fixed-size batches covering every matching product
+    assert [len(batch) for batch in batches] == [2, 2, 1], f"Unexpected batch sizes {batches}"
+    assert sum(batches, []) == added_product_ids, "Exported ids should match the created products in order"
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_copy", [True, False])
+async def test_create_products_bulk(product_repository: ProductRepository, use_copy: bool) -> None:
+    product_service = ProductService(product_repository)
+    new_products = [Product(**random_product()) for _ in range(7)]
+
+    product_ids = await product_service.create_products_bulk(new_products, chunk_size=3, use_copy=use_copy)
+    # Assert that one id is returned per product, in input order
+    assert len(product_ids) == len(new_products), f"Expected {len(new_products)} ids, but got {len(product_ids)}"
+    for product_id, new_product in zip(product_ids, new_products):
+        retrieved_product = await product_service.get_product_by_id(product_id)
+        assert retrieved_product is not None, f"Product {product_id} should exist after bulk insert"
+        assert retrieved_product.code == new_product.code, f"Product {product_id} does not match its input row"
+
+@pytest.mark.asyncio
+async def test_upsert_product(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    new_product = Product(**random_product())
+
+    created, inserted = await product_service.upsert_product(new_product)
+    # Assert that the first upsert inserts the product
+    assert inserted and created.code == new_product.code, f"Expected a new product, but got {created}"
+
+    retried, inserted = await product_service.upsert_product(new_product)
+    # Assert that an identical retry is a no-op on the same row
+    assert not inserted and retried.id == created.id, f"Expected product {created.id} back, but got {retried}"
+    assert retried.version == created.version, "An identical retry should not write a new row version"
+
+    changed, inserted = await product_service.upsert_product(new_product.model_copy(update={"price": Decimal("1.25")}))
+    # Assert that a changed product with the same code updates the existing row
+    assert not inserted and changed.id == created.id, f"Expected product {created.id} to be updated, but got {changed}"
+    assert changed.price == Decimal("1.25"), f"Expected price 1.25, but got {changed.price}"
+
+    other = Product(**random_product())
+    result = await product_service.upsert_products_bulk([other, new_product, other], chunk_size=2)
+    # Assert that bulk upserts report inserted, updated and unchanged rows with ids in input order
+    assert result.ids[1] == created.id and result.ids[0] == result.ids[2], f"Unexpected ids {result.ids}"
+    assert (result.inserted, result.updated, result.unchanged) == (1, 1, 0), f"Unexpected counts {result}"
+    result = await product_service.upsert_products_bulk([other])
+    assert (result.inserted, result.updated, result.unchanged) == (0, 0, 1), f"Unexpected counts {result}"
+
+    repeated = Product(**random_product())
+    result = await product_service.upsert_products_bulk([repeated, repeated.model_copy(update={"price": Decimal("2.50")})], chunk_size=1)
+    # Assert that a code repeated across chunks is written once, as its last copy
+    assert result.ids[0] == result.ids[1], f"Expected one product for both copies, got {result.ids}"
+    assert (result.inserted, result.updated, result.unchanged) == (1, 0, 0), f"Unexpected counts {result}"
+    assert (await product_service.get_product_by_id(result.ids[0])).price == Decimal("2.50"), "Expected the last copy to win"
+
+@pytest.mark.asyncio
+async def test_create_product_idempotent(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    new_product = Product(**random_product())
+    key = random_string()
+
+    product_id, replayed = await product_service.create_product_idempotent(new_product, key)
+    # Assert that the first request creates the product
+    assert product_id is not None and not replayed, "Expected a new product"
+
+    retried_id, replayed = await product_service.create_product_idempotent(new_product, key)
+    # Assert that a retry with the same key returns the original product instead of a new row
+    assert replayed and retried_id == product_id, f"Expected replay of {product_id}, but got {retried_id}"
+
+    # Assert that reusing the key for a different request is rejected
+    with pytest.raises(IdempotencyKeyReused):
+        await product_service.create_product_idempotent(Product(**random_product()), key)
+
+@pytest.mark.asyncio
+async def test_copy_products_csv(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    chunks = list(generate_product_chunks(7, chunk_size=3))
+    codes = [code for chunk in chunks for code in chunk.code.tolist()]
+    since = await current_version(product_repository)
+
+    loaded = await product_service.copy_products_csv(chunk.to_csv() for chunk in chunks)
+    # Assert that every generated row was loaded
+    assert loaded == len(codes), f"Expected {len(codes)} rows loaded, but got {loaded}"
+    stored = {item.code for item in (await product_service.get_changes(since)).items}
+    # Assert that the loaded rows can be found by their generated codes
+    assert stored >= set(codes), f"Expected {len(codes)} stored rows, but missed {set(codes) - stored}"
+
+@pytest.mark.asyncio
+async def test_get_products_by_ids(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    product_ids = await product_service.create_products_bulk([Product(**random_product()) for _ in range(3)])
+    missing_id = product_ids[-1] + 1000000
+    requested_ids = [product_ids[2], missing_id, product_ids[0], product_ids[1]]
+
+    batch = await product_service.get_products_by_ids(requested_ids)
+    # Assert that found products keep the caller's order
+    assert [p.id for p in batch.items] == [product_ids[2], product_ids[0], product_ids[1]], "Products should follow the requested order"
+    # Assert that unknown ids are reported as missing
+    assert batch.missing == [missing_id], f"Expected {missing_id} to be missing, but got {batch.missing}"
+
+@pytest.mark.asyncio
+async def test_bulk_update_and_delete(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    category = random_product()["name"]
+    new_products = []
+    for price in ("10.00", "20.00", "30.00"):
+        product_data = random_product()
+        product_data.update(category=category, price=price)
+        new_products.append(Product(**product_data))
+    product_ids = await product_service.create_products_bulk(new_products)
+
+    patched_ids = await product_service.patch_products([ProductPatchItem(id=product_ids[0], name="Patched")])
+    patched_product = await product_service.get_product_by_id(product_ids[0])
+    # Assert that a partial update only touches the provided fields
+    assert patched_ids == [product_ids[0]], f"Expected {product_ids[0]} to be patched, but got {patched_ids}"
+    assert patched_product.name == "Patched", "Product name should be patched"
+    assert patched_product.code == new_products[0].code, "Omitted fields should be left unchanged"
+
+    filters = ProductFilter(category=category)
+    updated_ids = await product_service.update_products_where(filters, ProductPatch(), Decimal("5"))
+    batch = await product_service.get_products_by_ids(product_ids)
+    # Assert that the set-based price change applied to the whole category
+    assert sorted(updated_ids) == sorted(product_ids), "Every product in the category should be updated"
+    assert [p.price for p in batch.items] == [Decimal("10.50"), Decimal("21.00"), Decimal("31.50")], "Prices should rise by 5%"
+
+    deleted_ids = await product_service.delete_products([product_ids[0]])
+    assert deleted_ids == [product_ids[0]], f"Expected {product_ids[0]} to be deleted, but got {deleted_ids}"
+    deleted_ids = await product_service.delete_products_where(ProductFilter(category=category, min_price=Decimal("30")))
+    # Assert that deletes by filter only remove matching products
+    assert deleted_ids == [product_ids[2]], f"Expected {product_ids[2]} to be deleted, but got {deleted_ids}"
+    batch = await product_service.get_products_by_ids(product_ids)
+    assert [p.id for p in batch.items] == [product_ids[1]], "Only the unmatched product should remain"
+
+    # Assert that unfiltered bulk writes are refused
+    with pytest.raises(ValueError):
+        await product_service.delete_products_where(ProductFilter())
+
+@pytest.mark.asyncio
+async def test_concurrent_bulk_writes_on_overlapping_ids(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    product_ids = await product_service.create_products_bulk([Product(**random_product()) for _ in range(200)])
+    forward, backward = product_ids, product_ids[::-1]
+
+    for attempt in range(5):
+        results = await asyncio.gather(
+            product_service.patch_products([ProductPatchItem(id=id, name=f"Forward {attempt}") for id in forward]),
+            product_service.patch_products([ProductPatchItem(id=id, name=f"Backward {attempt}") for id in backward])
+        )
+        # Assert that batches touching the same rows in opposite orders both complete
+        assert all(sorted(ids) == sorted(product_ids) for ids in results), "Every product should be patched by both batches"
+
+    results = await asyncio.gather(
+        product_service.delete_products(forward[:150]),
+        product_service.delete_products(backward[:150])
+    )
+    deleted_ids = sorted(results[0] + results[1])
+    # Assert that overlapping deletes remove each product exactly once
+    assert deleted_ids == sorted(product_ids), f"Expected every product deleted once, but got {len(deleted_ids)} deletions"
+
+@pytest.mark.asyncio
+async def test_search_products(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    token = random_product()["code"]
+    named = Product(**{**random_product(), "name": f"{token} Ball"})
+    described = Product(**{**random_product(), "description": f"Official {token} match ball"})
+    named_id, described_id = await product_service.create_products_bulk([named, described])
+
+    page = await product_service.search_products(token, SearchMode.fts)
+    # Assert that name matches rank above description matches
+    assert [p.id for p in page.items] == [named_id, described_id], f"Unexpected search results {page.items}"
+    assert page.items[0].rank > page.items[1].rank, "Name matches should rank higher"
+
+    page = await product_service.search_products(token[:12].upper(), SearchMode.prefix, limit=1)
+    # Assert that prefix search is case-insensitive and paginated
+    assert [p.id for p in page.items] == [named_id], f"Unexpected prefix results {page.items}"
+    assert page.next_offset is None, "A single match should not have a next page"
+
+@pytest.mark.asyncio
+async def test_category_stats(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    category = f"Stats {random_string()}"
+    prices = [Decimal("10.00"), Decimal("20.00"), Decimal("30.00")]
+    product_ids = await product_service.create_products_bulk(
+        [Product(**{**random_product(), "category": category, "price": price}) for price in prices]
+    )
+
+    stats = (await product_service.get_category_stats(category=category)).categories
+    # Assert that inserts are reflected in the rollup
+    assert len(stats) == 1, f"Expected stats for one category, but got {len(stats)}"
+    assert stats[0].product_count == 3, f"Expected 3 products, but got {stats[0].product_count}"
+    assert (stats[0].min_price, stats[0].max_price, stats[0].avg_price) == (Decimal("10.00"), Decimal("30.00"), Decimal("20.00")), f"Unexpected price stats {stats[0]}"
+    assert stats[0].recent_count == 3, f"Expected 3 recent products, but got {stats[0].recent_count}"
+
+    # Removing the current min and max forces both to be recomputed
+    await product_service.delete_products([product_ids[0]])
+    await product_service.patch_products([ProductPatchItem(id=product_ids[2], price=Decimal("15.00"))])
+    stats = (await product_service.get_category_stats(category=category)).categories
+    # Assert that deletes and updates are reflected in the rollup
+    assert stats[0].product_count == 2, f"Expected 2 products, but got {stats[0].product_count}"
+    assert (stats[0].min_price, stats[0].max_price) == (Decimal("15.00"), Decimal("20.00")), f"Unexpected price range {stats[0]}"
+
+    await product_service.delete_products(product_ids)
+    stats = (await product_service.get_category_stats(category=category)).categories
+    # Assert that an emptied category disappears from the rollup
+    assert stats == [], f"Expected no stats for an empty category, but got {stats}"
+
+@pytest.mark.asyncio
+async def test_get_changes(product_repository: ProductRepository) -> None:
+    product_service = ProductService(product_repository)
+    since = await current_version(product_repository)
+    product_ids = await product_service.create_products_bulk([Product(**random_product()) for _ in range(3)])
+    await product_service.patch_products([ProductPatchItem(id=product_ids[0], price=Decimal("1.23"))])
+    await product_service.delete_products([product_ids[1]])
+
+    items, deleted, cursor = {}, [], None
+    while True:
+        changes = await product_service.get_changes(since, limit=1, cursor=cursor)
+        items.update({item.id: item for item in changes.items})
+        deleted.extend(changes.deleted)
+        cursor = changes.next_cursor
+        if cursor is None:
+            break
+    # Assert that paging through the feed returns each write and delete once
+    assert set(items) == {product_ids[0], product_ids[2]}, f"Expected updated products {product_ids[0::2]}, but got {sorted(items)}"
+    assert deleted == [product_ids[1]], f"Expected deleted {[product_ids[1]]}, but got {deleted}"
+    assert items[product_ids[0]].price == Decimal("1.23"), f"Expected the latest price, but got {items[product_ids[0]].price}"
+    # Assert that the returned version is a resume point with nothing new after it
+    caught_up = await product_service.get_changes(changes.version)
+    assert caught_up.items == [] and caught_up.deleted == [], f"Expected no further changes, but got {caught_up}"
 
-    pool = await repo.connect()
-    try:
-        if pool:
-            version = await repo.get_version()
-            # Assert that the version is not None, indicating a successful query
-            assert version is not None, "Failed to fetch PostgreSQL version"
-
-            product_service = ProductService(pool)
-
-            num_products = 3
-            added_product_ids = []
-            for _ in range(num_products):
-                product_data = random_product()
-                new_product = Product(
-                    name=product_data["name"],
-                    code=product_data["code"],
-                    description=product_data["description"],
-                    category=product_data["category"],
-                    price=product_data["price"],
-                    created_at=product_data["created_at"]
-                )
-                product_id = await product_service.create_product(new_product)
-                added_product_ids.append(product_id)
-                # Assert that the product ID is not None, indicating successful creation
-                assert product_id is not None, "Product ID is None"
-
-            products = await product_service.list_products()
-            # Assert that the list is not empty
-            assert products, "Product list should not be empty"
-
-
-            # Additional asserts: Ensure that the products' details are correct
-            for product in products:
-                assert product.name is not None, f"Product name should not be None for product ID {product.id}"
-                assert product.code is not None, f"Product code should not be None for product ID {product.id}"
-                assert product.description is not None, f"Product description should not be None for product ID {product.id}"
-                assert product.category is not None, f"Product category should not be None for product ID {product.id}"
-                assert product.price is not None, f"Product price should not be None for product ID {product.id}"
-                assert product.created_at is not None, f"Product created_at should not be None for product ID {product.id}"
-        else:
-            pytest.fail("No connection established")
-    finally:
-        await repo.close()
\ No newline at end of file
+    await product_service.delete_products([product_ids[0], product_ids[2]])
+    await product_service.purge_tombstones(datetime.now(timezone.utc) + timedelta(seconds=1))
+    # Assert that a feed older than purged tombstones must reload
+    with pytest.raises(ChangesExpired):
+        await product_service.get_changes(since)
@@ -0,0 +1,68 @@
+import os, pytest
+from models import Product
+from repositories import PRODUCT_QUERIES, PostgresRepository, QueryPlanSettings, QueryRegistry
+from repositories import product_queries as sql
+from services import ProductService
+from utils import random_product
+from utils.metrics import MetricsRegistry
+
+def test_seq_scan_tables() -> None:
+    queries = QueryRegistry(QueryPlanSettings(seq_scan_tables=("products",)), registry=MetricsRegistry())
+    plan = "Hash Join\n  ->  Seq Scan on products p\n  ->  Seq Scan on product_category_stats s"
+    # Assert that only watched tables are reported
+    assert queries.seq_scan_tables(plan) == ["products"], f"Unexpected tables {queries.seq_scan_tables(plan)}"
+    plan = "Append\n  ->  Seq Scan on products_p202401 products_1\n  ->  Seq Scan on products_p202402 products_2"
+    # Assert that scans of monthly partitions count once against the partitioned table
+    assert queries.seq_scan_tables(plan) == ["products"], f"Unexpected tables {queries.seq_scan_tables(plan)}"
+    plan = "Append\n  ->  Seq Scan on products_default products_1  (cost=0.00..1.01 rows=1 width=192)"
+    # Assert that scans of the default partition count against the partitioned table too
+    assert queries.seq_scan_tables(plan) == ["products"], f"Unexpected tables {queries.seq_scan_tables(plan)}"
+    queries.register("q", "SELECT 1;")
+    # Assert that statement names are unique
+    with pytest.raises(ValueError):
+        queries.register("q", "SELECT 2;")
+
+@pytest.mark.asyncio
+async def test_product_queries_prepared_and_planned() -> None:
+    repo = PostgresRepository(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+    )
+    repo.add_init_hook(PRODUCT_QUERIES.prepare)
+
+    pool = await repo.connect()
+    try:
+        if pool:
+            async with pool.acquire() as conn:
+                prepared = await conn.fetchval("SELECT count(*) FROM pg_prepared_statements")
+                # Assert that the init hook prepared the registered statements up front (search_fuzzy needs pg_trgm)
+                assert prepared >= len(PRODUCT_QUERIES.queries) - 1, f"Expected prepared statements, but got {prepared}"
+
+                # Assert that lookups by id and code can use an index rather than scanning products. Small
+                # partitions are cheaper to scan than to probe, so the planner is told to avoid scans
+                # wherever an index exists; what it still scans has none
+                async with conn.transaction():
+                    await conn.execute("SET LOCAL enable_seqscan = off")
+                    for query, args in ((sql.GET_PRODUCT_BY_ID, (1,)), (sql.GET_PRODUCT_BY_CODE, ("missing",))):
+                        plan = await PRODUCT_QUERIES.explain(conn, query, *args)
+                        assert not PRODUCT_QUERIES.seq_scan_tables(plan), f"{query.name} scans products:\n{plan}"
+
+            product_service = ProductService(pool)
+            product_id = await product_service.create_product(Product(**random_product()))
+            calls = PRODUCT_QUERIES.stats().get("delete_product", {}).get("calls", 0)
+            async with pool.acquire() as conn:
+                plan = await PRODUCT_QUERIES.explain(conn, sql.DELETE_PRODUCT, product_id, analyze=True)
+            # Assert that EXPLAIN ANALYZE of a write is rolled back
+            assert "Delete on products" in plan, f"Unexpected plan:\n{plan}"
+            assert await product_service.get_product_by_id(product_id) is not None, "EXPLAIN ANALYZE must not delete the product"
+
+            assert await product_service.delete_product(product_id), "Product deletion failed"
+            # Assert that executions are counted per statement
+            assert PRODUCT_QUERIES.stats()["delete_product"]["calls"] == calls + 1, "Expected one recorded delete"
+        else:
+            pytest.fail("No connection established")
+    finally:
+        await repo.close()
@@ -1,5 +1,6 @@
-import hashlib, pytest
-from datetime import datetime
+import csv, hashlib, io, pytest
+from datetime import datetime, timezone
+from decimal import Decimal
 from typing import Dict, Tuple
 from utils import *
 
@@ -79,4 +80,46 @@ def test_random_product() -> None:
     assert isinstance(result["code"], str), "Expected 'code' to be a string"
     assert isinstance(result["description"], str), "Expected 'description' to be a string"
     assert isinstance(result["price"], float), "Expected 'price' to be a float"
-    assert isinstance(result["created_at"], datetime), "Expected 'created_at' to be a datetime object"
\ No newline at end of file
+    assert isinstance(result["created_at"], datetime), "Expected 'created_at' to be a datetime object"
+
+def test_generate_product_chunks_seeded() -> None:
+    first = list(generate_product_chunks(10, chunk_size=4, seed=42))
+    second = list(generate_product_chunks(10, chunk_size=4, seed=42))
+    # Assert that the chunks have the requested sizes
+    sizes = [len(chunk) for chunk in first]
+    assert sizes == [4, 4, 2], f"Expected chunk sizes [4, 4, 2], but got {sizes}"
+    # Assert that the same seed produces the same rows
+    assert [chunk.dicts() for chunk in first] == [chunk.dicts() for chunk in second], "Expected identical rows for the same seed"
+
+def test_generate_product_columns() -> None:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2024, 2, 1, tzinfo=timezone.utc)
+    chunk = generate_product_chunks(500, seed=1, categories=["A", "B"], min_price=1, max_price=5, start=start, end=end)
+    rows = next(chunk).dicts()
+    for row in rows:
+        # Assert that each row has the same keys as random_product
+        assert set(row) == {"name", "category", "code", "description", "price", "created_at"}, f"Unexpected keys {set(row)}"
+        # Assert that the name contains a space and has the random_string length
+        assert ' ' in row["name"] and 9 <= len(row["name"]) <= 19, f"Unexpected name {row['name']!r}"
+        # Assert that the code looks like an MD5 hex digest
+        assert len(row["code"]) == 32 and int(row["code"], 16) >= 0, f"Unexpected code {row['code']!r}"
+        # Assert that price, category and created_at respect the requested ranges
+        assert Decimal("1") <= row["price"] <= Decimal("5"), f"Price {row['price']} out of range"
+        assert row["price"].as_tuple().exponent == -2, f"Expected two decimal places, but got {row['price']}"
+        assert row["category"] in ("A", "B"), f"Unexpected category {row['category']}"
+        assert start <= row["created_at"] < end, f"created_at {row['created_at']} out of range"
+
+def test_stream_products_csv() -> None:
+    body = b"".join(stream_products_csv(5, chunk_size=2, seed=7, header=True, categories=['Balls, "Official"'])).decode()
+    rows = list(csv.reader(io.StringIO(body)))
+    # Assert that the header and the rows end their lines the same way
+    assert "\r" not in body and body.count("\n") == len(rows), f"Mixed line terminators in {body!r}"
+    # Assert that the header matches the batch columns
+    assert tuple(rows[0]) == BATCH_COLUMNS, f"Expected header {BATCH_COLUMNS}, but got {rows[0]}"
+    expected = [record for chunk in generate_product_chunks(5, chunk_size=2, seed=7, categories=['Balls, "Official"']) for record in chunk.records()]
+    # Assert that each CSV line parses back to the generated values
+    assert len(rows) - 1 == len(expected), f"Expected {len(expected)} rows, but got {len(rows) - 1}"
+    for line, record in zip(rows[1:], expected):
+        assert line[:4] == list(record[:4]), f"Expected {record[:4]}, but got {line[:4]}"
+        assert Decimal(line[4]) == record[4], f"Expected price {record[4]}, but got {line[4]}"
+        assert datetime.fromisoformat(line[5].replace("Z", "+00:00")) == record[5], f"Expected {record[5]}, but got {line[5]}"
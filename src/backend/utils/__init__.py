@@ -1 +1,16 @@
-from .rand_gen import generate_unique_code, random_price, random_product, random_string
\ No newline at end of file
+from .conditional import http_date, is_not_modified, page_etag, product_etag
+from .cursor import decode_cursor, encode_cursor
+from .export import EXPORT_COLUMNS, csv_chunk, csv_header, ndjson_chunk
+from .fast_json import FastJSONResponse
+from .metrics import DEFAULT_LATENCY_BUCKETS, Histogram
+from .rand_gen import (
+    BATCH_COLUMNS,
+    ProductColumns,
+    generate_product_chunks,
+    generate_product_columns,
+    generate_unique_code,
+    random_price,
+    random_product,
+    random_string,
+    stream_products_csv,
+)
@@ -0,0 +1,42 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Mapping, Optional, Tuple
+
+def product_etag(version: int) -> str:
+    """ETag for a single product; the version changes on every write."""
+    return f'W/"{version}"'
+
+def page_etag(rows: Iterable[Tuple[int, int]], *extra: Optional[str]) -> str:
+    """ETag for a page of products, derived from each row's (id, version) and any paging state."""
+    digest = hashlib.sha1()
+    for product_id, version in rows:
+        digest.update(f"{product_id}:{version};".encode())
+    for value in extra:
+        digest.update(f"|{value or ''}".encode())
+    return f'W/"{digest.hexdigest()}"'
+
+def http_date(value: datetime) -> str:
+    """Format a datetime as an HTTP date for Last-Modified."""
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+def is_not_modified(headers: Mapping[str, str], etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current representation."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or _opaque(etag) in {_opaque(tag) for tag in tags}
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= since
+    return False
@@ -0,0 +1,35 @@
+import base64, json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Tuple
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+def _decode_value(sort: str, value: Any) -> Any:
+    if sort == "created_at":
+        return datetime.fromisoformat(value)
+    if sort == "price":
+        return Decimal(value)
+    return value
+
+def encode_cursor(sort: str, order: str, value: Any, last_id: int) -> str:
+    """Encode the keyset position of the last row of a page into an opaque token."""
+    payload = {"s": sort, "o": order, "v": _encode_value(value), "id": last_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str, sort: str, order: str) -> Tuple[Any, int]:
+    """Decode a cursor token into (sort value, id), raising ValueError if it is invalid for this sort."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        if payload["s"] != sort or payload["o"] != order:
+            raise ValueError("Cursor does not match the requested sort order")
+        return _decode_value(sort, payload["v"]), int(payload["id"])
+    except (KeyError, TypeError, ArithmeticError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,35 @@
+import csv, io, json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, Mapping
+
+EXPORT_COLUMNS = ("id", "name", "code", "description", "category", "price", "created_at")
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def ndjson_chunk(rows: Iterable[Mapping[str, Any]]) -> bytes:
+    """Encode a batch of rows as newline-delimited JSON."""
+    return "".join(
+        json.dumps({column: row[column] for column in EXPORT_COLUMNS}, default=_json_default) + "\n"
+        for row in rows
+    ).encode()
+
+def csv_header() -> bytes:
+    """Return the CSV header line matching csv_chunk."""
+    return (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+
+def csv_chunk(rows: Iterable[Mapping[str, Any]]) -> bytes:
+    """Encode a batch of rows as CSV lines without a header."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            row[column].isoformat() if isinstance(row[column], datetime) else row[column]
+            for column in EXPORT_COLUMNS
+        ])
+    return buffer.getvalue().encode()
@@ -0,0 +1,32 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value: Any) -> Any:
+    # Matches pydantic's JSON mode, which serializes Decimal as a string
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Encode plain Python data to JSON bytes, producing the same output as the pydantic response path."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+class FastJSONResponse(Response):
+    """JSON response that skips response-model validation and encodes with orjson when available."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,159 @@
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+def _with_labels(line: str, labels: str) -> str:
+    """Add pre-formatted labels to one exposition line, leaving HELP/TYPE comments alone."""
+    if not labels or line.startswith("#"):
+        return line
+    name_end = min(index for index in (line.find("{"), line.find(" ")) if index >= 0)
+    if line[name_end] == "{":
+        return f"{line[:name_end + 1]}{labels},{line[name_end + 1:]}"
+    return f"{line[:name_end]}{{{labels}}}{line[name_end:]}"
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+class Counter:
+    """Monotonically increasing value."""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the counter by amount."""
+        self.value += amount
+
+    def render(self, name: str, labels: Dict[str, str]) -> List[str]:
+        return [f"{name}{_format_labels(labels)} {self.value}"]
+
+class Histogram:
+    """Fixed-bucket histogram with cumulative counts, as used by Prometheus."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a single observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def _cumulative(self) -> Iterable[Tuple[float, int]]:
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            yield bound, cumulative
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return cumulative bucket counts keyed by upper bound, plus count and sum."""
+        buckets = {_format_bound(bound): cumulative for bound, cumulative in self._cumulative()}
+        return {"buckets": buckets, "count": self.count, "sum": self.sum}
+
+    def render(self, name: str, labels: Dict[str, str]) -> List[str]:
+        lines = [
+            f"{name}_bucket{_format_labels({**labels, 'le': _format_bound(bound)})} {cumulative}"
+            for bound, cumulative in self._cumulative()
+        ]
+        lines.append(f"{name}_sum{_format_labels(labels)} {self.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {self.count}")
+        return lines
+
+class MetricFamily:
+    """A named metric with one child per combination of label values."""
+
+    def __init__(self, name: str, documentation: str, kind: str, label_names: Sequence[str], factory: Callable[[], Any]):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str) -> Any:
+        """Return the child metric for the given label values, creating it on first use."""
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            child = self.children.setdefault(values, self.factory())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(child.render(self.name, dict(zip(self.label_names, values))))
+        return lines
+
+class MetricsRegistry:
+    """Collection of metric families rendered in the Prometheus text exposition format.
+
+    const_labels are added to every sample, including those produced by collectors.
+    """
+
+    def __init__(self, const_labels: Optional[Dict[str, str]] = None):
+        self.families: Dict[str, MetricFamily] = {}
+        self.collectors: List[Callable[[], Iterable[str]]] = []
+        self.const_labels: Dict[str, str] = dict(const_labels or {})
+
+    def _family(self, name: str, documentation: str, kind: str, label_names: Sequence[str], factory: Callable[[], Any]) -> MetricFamily:
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = MetricFamily(name, documentation, kind, label_names, factory)
+        return family
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        """Register (or return the existing) counter family."""
+        return self._family(name, documentation, "counter", label_names, Counter)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS
+    ) -> MetricFamily:
+        """Register (or return the existing) histogram family."""
+        return self._family(name, documentation, "histogram", label_names, lambda: Histogram(buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        """Register a callable producing extra exposition lines at scrape time."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        lines: List[str] = []
+        for family in list(self.families.values()):
+            lines.extend(family.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        labels = _format_labels(self.const_labels)[1:-1]
+        return "\n".join(_with_labels(line, labels) for line in lines) + "\n"
+
+def render_gauge(name: str, documentation: str, value: float, labels: Optional[Dict[str, str]] = None) -> List[str]:
+    """Render a single gauge sample with its HELP/TYPE header."""
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name}{_format_labels(labels or {})} {value}"]
+
+def render_gauges(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Render several labelled samples of one gauge under a single HELP/TYPE header."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    lines.extend(f"{name}{_format_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+def render_histogram(name: str, documentation: str, histogram: Histogram, labels: Optional[Dict[str, str]] = None) -> List[str]:
+    """Render a standalone histogram with its HELP/TYPE header."""
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} histogram"] + histogram.render(name, labels or {})
+
+REGISTRY = MetricsRegistry()
@@ -1,6 +1,13 @@
-import hashlib, random
-from datetime import datetime
-from typing import Any, Dict
+import csv, hashlib, io, random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 charset = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
 
@@ -31,4 +38,135 @@ def random_product() -> Dict[str, Any]:
         "price": random_price(),
         "created_at": datetime.now()
     }
-    return p
\ No newline at end of file
+    return p
+
+BATCH_COLUMNS = ("name", "code", "description", "category", "price", "created_at")
+# Ends the header and every row alike; COPY and csv readers accept either terminator, but not a mix in one file
+CSV_LINE_TERMINATOR = "\n"
+DEFAULT_CATEGORIES = ("Test",)
+# A fixed default window keeps seeded output identical from one run to the next
+DEFAULT_CREATED_RANGE = (datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, tzinfo=timezone.utc))
+_HEX_PAIRS = None
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("numpy is required for batch product generation")
+
+def _csv_field(value: str) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow([value])
+    return buffer.getvalue()
+
+def _random_strings(rng: Any, size: int, min_len: int, max_len: int, words: int = 2) -> Any:
+    """Vectorized equivalent of random_string for a whole column: letters plus words - 1 spaces."""
+    width = max_len + words - 1
+    alphabet = np.frombuffer(charset.encode(), dtype=np.uint8)
+    chars = alphabet[rng.integers(0, len(alphabet), size=(size, width), dtype=np.uint8)]
+    lengths = rng.integers(min_len, max_len + 1, size=size) + words - 1
+    rows = np.arange(size)
+    # Never put a space at the end, matching random_string
+    for _ in range(words - 1):
+        chars[rows, (rng.random(size) * (lengths - 1)).astype(np.int64)] = ord(" ")
+    # Trailing NUL bytes are stripped when the matrix is viewed as fixed-width bytes
+    chars[np.arange(width) >= lengths[:, None]] = 0
+    return chars.view(f"S{width}").ravel().astype("U")
+
+def _random_codes(rng: Any, size: int) -> Any:
+    """Random 128-bit hex codes, the same shape as generate_unique_code without an MD5 per row."""
+    global _HEX_PAIRS
+    if _HEX_PAIRS is None:
+        _HEX_PAIRS = np.frombuffer("".join(f"{i:02x}" for i in range(256)).encode(), dtype=np.uint8).reshape(256, 2)
+    digest = rng.integers(0, 256, size=(size, 16), dtype=np.uint8)
+    return np.ascontiguousarray(_HEX_PAIRS[digest].reshape(size, 32)).view("S32").ravel().astype("U")
+
+@dataclass
+class ProductColumns:
+    """A chunk of generated products stored column-wise; price is in integer cents, created_at in UTC."""
+    name: Any
+    code: Any
+    description: Any
+    category: Any
+    price_cents: Any
+    created_at: Any
+
+    def __len__(self) -> int:
+        return len(self.name)
+
+    def prices(self) -> List[Decimal]:
+        return [Decimal(cents).scaleb(-2) for cents in self.price_cents.tolist()]
+
+    def timestamps(self) -> List[datetime]:
+        return [value.replace(tzinfo=timezone.utc) for value in self.created_at.astype(datetime).tolist()]
+
+    def records(self) -> List[Tuple[Any, ...]]:
+        """Return row tuples in BATCH_COLUMNS order, e.g. for copy_records_to_table."""
+        return list(zip(
+            self.name.tolist(),
+            self.code.tolist(),
+            self.description.tolist(),
+            self.category.tolist(),
+            self.prices(),
+            self.timestamps()
+        ))
+
+    def dicts(self) -> List[Dict[str, Any]]:
+        """Return one dict per row with the same keys as random_product."""
+        return [dict(zip(BATCH_COLUMNS, record)) for record in self.records()]
+
+    def to_csv(self) -> bytes:
+        """Encode the chunk as headerless CSV in BATCH_COLUMNS order, ready for COPY ... (FORMAT csv)."""
+        dollars, cents = np.divmod(self.price_cents, 100)
+        prices = np.char.add(np.char.add(dollars.astype("U"), "."), np.char.zfill(cents.astype("U"), 2))
+        created_at = np.datetime_as_string(self.created_at, unit="us", timezone="UTC")
+        # Generated strings are alphanumeric, so only categories can need quoting
+        categories = {category: _csv_field(category) for category in np.unique(self.category).tolist()}
+        return "".join(
+            f"{name},{code},{description},{categories[category]},{price},{timestamp}{CSV_LINE_TERMINATOR}"
+            for name, code, description, category, price, timestamp in zip(
+                self.name.tolist(),
+                self.code.tolist(),
+                self.description.tolist(),
+                self.category.tolist(),
+                prices.tolist(),
+                created_at.tolist()
+            )
+        ).encode()
+
+def generate_product_columns(
+    size: int,
+    rng: Any = None,
+    categories: Sequence[str] = DEFAULT_CATEGORIES,
+    min_price: float = 0.01,
+    max_price: float = 10000.00,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> ProductColumns:
+    """Generate one columnar chunk of random products with vectorized NumPy operations."""
+    _require_numpy()
+    rng = rng if rng is not None else np.random.default_rng()
+    start = start or DEFAULT_CREATED_RANGE[0]
+    end = end or DEFAULT_CREATED_RANGE[1]
+    start_us = np.datetime64(start.astimezone(timezone.utc).replace(tzinfo=None), "us")
+    span_us = max(int((end - start) / timedelta(microseconds=1)), 1)
+    return ProductColumns(
+        name=_random_strings(rng, size, 8, 18),
+        code=_random_codes(rng, size),
+        description=_random_strings(rng, size, 24, 54, words=4),
+        category=np.asarray(categories)[rng.integers(0, len(categories), size=size)],
+        price_cents=rng.integers(round(min_price * 100), round(max_price * 100) + 1, size=size),
+        created_at=start_us + rng.integers(0, span_us, size=size).astype("timedelta64[us]")
+    )
+
+def generate_product_chunks(total: int, chunk_size: int = 100000, seed: Optional[Union[int, Sequence[int]]] = None, **options: Any) -> Iterator[ProductColumns]:
+    """Yield ProductColumns chunks until total products have been produced; the same seed yields the same data."""
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    for produced in range(0, total, chunk_size):
+        yield generate_product_columns(min(chunk_size, total - produced), rng, **options)
+
+def stream_products_csv(total: int, chunk_size: int = 100000, seed: Optional[Union[int, Sequence[int]]] = None, header: bool = False, **options: Any) -> Iterator[bytes]:
+    """Yield generated products as CSV byte chunks suitable for a file or COPY FROM STDIN."""
+    if header:
+        yield (",".join(BATCH_COLUMNS) + CSV_LINE_TERMINATOR).encode()
+    for chunk in generate_product_chunks(total, chunk_size, seed, **options):
+        yield chunk.to_csv()
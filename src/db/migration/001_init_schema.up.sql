@@ -1,5 +1,3 @@
-CREATE INDEX ON "products" ("code");
-
 CREATE TABLE "products" (
   "id" bigserial PRIMARY KEY,
   "name" varchar NOT NULL,
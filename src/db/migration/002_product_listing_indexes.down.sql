@@ -0,0 +1,6 @@
+DROP INDEX IF EXISTS "products_category_price_id_idx";
+DROP INDEX IF EXISTS "products_category_created_at_id_idx";
+DROP INDEX IF EXISTS "products_category_id_idx";
+DROP INDEX IF EXISTS "products_name_id_idx";
+DROP INDEX IF EXISTS "products_price_id_idx";
+DROP INDEX IF EXISTS "products_created_at_id_idx";
@@ -0,0 +1,11 @@
+CREATE INDEX IF NOT EXISTS "products_created_at_id_idx" ON "products" ("created_at", "id");
+
+CREATE INDEX IF NOT EXISTS "products_price_id_idx" ON "products" ("price", "id");
+
+CREATE INDEX IF NOT EXISTS "products_name_id_idx" ON "products" ("name", "id");
+
+CREATE INDEX IF NOT EXISTS "products_category_id_idx" ON "products" ("category", "id");
+
+CREATE INDEX IF NOT EXISTS "products_category_created_at_id_idx" ON "products" ("category", "created_at", "id");
+
+CREATE INDEX IF NOT EXISTS "products_category_price_id_idx" ON "products" ("category", "price", "id");
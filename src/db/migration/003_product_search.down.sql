@@ -0,0 +1,4 @@
+DROP INDEX IF EXISTS "products_name_prefix_idx";
+DROP INDEX IF EXISTS "products_name_trgm_idx";
+DROP INDEX IF EXISTS "products_search_vector_idx";
+ALTER TABLE "products" DROP COLUMN IF EXISTS "search_vector";
@@ -0,0 +1,13 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE "products" ADD COLUMN IF NOT EXISTS "search_vector" tsvector
+  GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', "name"), 'A') ||
+    setweight(to_tsvector('simple', "description"), 'B')
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS "products_search_vector_idx" ON "products" USING GIN ("search_vector");
+
+CREATE INDEX IF NOT EXISTS "products_name_trgm_idx" ON "products" USING GIN ("name" gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS "products_name_prefix_idx" ON "products" (lower("name") text_pattern_ops);
@@ -0,0 +1,7 @@
+DROP TRIGGER IF EXISTS "products_category_stats_delete" ON "products";
+DROP TRIGGER IF EXISTS "products_category_stats_update" ON "products";
+DROP TRIGGER IF EXISTS "products_category_stats_insert" ON "products";
+DROP FUNCTION IF EXISTS "products_category_stats_sync"();
+DROP FUNCTION IF EXISTS "refresh_product_category_stats"();
+DROP TABLE IF EXISTS "product_category_daily";
+DROP TABLE IF EXISTS "product_category_stats";
@@ -0,0 +1,112 @@
+-- Per-category rollups kept in step with products by statement-level triggers,
+-- so catalog statistics cost O(categories) to read instead of O(products).
+CREATE TABLE IF NOT EXISTS "product_category_stats" (
+  "category" varchar PRIMARY KEY,
+  "product_count" bigint NOT NULL,
+  "price_sum" decimal NOT NULL,
+  "min_price" decimal,
+  "max_price" decimal
+);
+
+-- Products per category and UTC creation day, for "created in the last N days" counts
+CREATE TABLE IF NOT EXISTS "product_category_daily" (
+  "category" varchar NOT NULL,
+  "day" date NOT NULL,
+  "created_count" bigint NOT NULL,
+  PRIMARY KEY ("category", "day")
+);
+
+CREATE OR REPLACE FUNCTION "refresh_product_category_stats"() RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+  LOCK TABLE "product_category_stats", "product_category_daily" IN EXCLUSIVE MODE;
+  DELETE FROM "product_category_stats";
+  DELETE FROM "product_category_daily";
+  INSERT INTO "product_category_stats" ("category", "product_count", "price_sum", "min_price", "max_price")
+  SELECT "category", count(*), sum("price"), min("price"), max("price")
+  FROM "products"
+  GROUP BY "category";
+  INSERT INTO "product_category_daily" ("category", "day", "created_count")
+  SELECT "category", ("created_at" AT TIME ZONE 'UTC')::date, count(*)
+  FROM "products"
+  GROUP BY 1, 2;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION "products_category_stats_sync"() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    -- Subtract the old rows; where one of them held the category's min or max,
+    -- re-read the extreme from the (category, price, id) index instead.
+    UPDATE "product_category_stats" AS s
+    SET "product_count" = s."product_count" - o."removed",
+        "price_sum" = s."price_sum" - o."price_sum",
+        "min_price" = CASE WHEN o."min_price" <= s."min_price"
+          THEN (SELECT min(p."price") FROM "products" p WHERE p."category" = s."category")
+          ELSE s."min_price" END,
+        "max_price" = CASE WHEN o."max_price" >= s."max_price"
+          THEN (SELECT max(p."price") FROM "products" p WHERE p."category" = s."category")
+          ELSE s."max_price" END
+    FROM (
+      SELECT "category", count(*) AS "removed", sum("price") AS "price_sum", min("price") AS "min_price", max("price") AS "max_price"
+      FROM "old_rows"
+      GROUP BY "category"
+    ) AS o
+    WHERE s."category" = o."category";
+
+    UPDATE "product_category_daily" AS d
+    SET "created_count" = d."created_count" - o."removed"
+    FROM (
+      SELECT "category", ("created_at" AT TIME ZONE 'UTC')::date AS "day", count(*) AS "removed"
+      FROM "old_rows"
+      GROUP BY 1, 2
+    ) AS o
+    WHERE d."category" = o."category" AND d."day" = o."day";
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO "product_category_stats" AS s ("category", "product_count", "price_sum", "min_price", "max_price")
+    SELECT "category", count(*), sum("price"), min("price"), max("price")
+    FROM "new_rows"
+    GROUP BY "category"
+    ORDER BY "category"
+    ON CONFLICT ("category") DO UPDATE
+    SET "product_count" = s."product_count" + EXCLUDED."product_count",
+        "price_sum" = s."price_sum" + EXCLUDED."price_sum",
+        "min_price" = LEAST(s."min_price", EXCLUDED."min_price"),
+        "max_price" = GREATEST(s."max_price", EXCLUDED."max_price");
+
+    INSERT INTO "product_category_daily" AS d ("category", "day", "created_count")
+    SELECT "category", ("created_at" AT TIME ZONE 'UTC')::date, count(*)
+    FROM "new_rows"
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT ("category", "day") DO UPDATE
+    SET "created_count" = d."created_count" + EXCLUDED."created_count";
+  END IF;
+
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    DELETE FROM "product_category_stats" WHERE "product_count" = 0;
+    DELETE FROM "product_category_daily" WHERE "created_count" = 0;
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER "products_category_stats_insert"
+  AFTER INSERT ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_category_stats_sync"();
+
+CREATE TRIGGER "products_category_stats_update"
+  AFTER UPDATE ON "products"
+  REFERENCING OLD TABLE AS "old_rows" NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_category_stats_sync"();
+
+CREATE TRIGGER "products_category_stats_delete"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_category_stats_sync"();
+
+SELECT "refresh_product_category_stats"();
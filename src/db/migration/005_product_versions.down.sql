@@ -0,0 +1,8 @@
+DROP TRIGGER IF EXISTS "products_record_tombstones" ON "products";
+DROP FUNCTION IF EXISTS "products_record_tombstones"();
+DROP TABLE IF EXISTS "product_changes_horizon";
+DROP TABLE IF EXISTS "product_tombstones";
+DROP TRIGGER IF EXISTS "products_stamp_version" ON "products";
+DROP FUNCTION IF EXISTS "products_stamp_version"();
+DROP INDEX IF EXISTS "products_version_id_idx";
+ALTER TABLE "products" DROP COLUMN IF EXISTS "updated_at", DROP COLUMN IF EXISTS "version";
@@ -0,0 +1,53 @@
+-- Every write stamps the row with the writing transaction's id (xid8) as its version.
+-- A change feed that only returns versions below the oldest running transaction
+-- (pg_snapshot_xmin) can never skip a change that commits later.
+ALTER TABLE "products"
+  ADD COLUMN IF NOT EXISTS "version" bigint NOT NULL DEFAULT (pg_current_xact_id()::text::bigint),
+  ADD COLUMN IF NOT EXISTS "updated_at" timestamptz NOT NULL DEFAULT (now());
+
+CREATE INDEX IF NOT EXISTS "products_version_id_idx" ON "products" ("version", "id");
+
+CREATE OR REPLACE FUNCTION "products_stamp_version"() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  NEW."version" := pg_current_xact_id()::text::bigint;
+  NEW."updated_at" := now();
+  RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER "products_stamp_version"
+  BEFORE UPDATE ON "products"
+  FOR EACH ROW EXECUTE FUNCTION "products_stamp_version"();
+
+CREATE TABLE IF NOT EXISTS "product_tombstones" (
+  "id" bigint PRIMARY KEY,
+  "version" bigint NOT NULL DEFAULT (pg_current_xact_id()::text::bigint),
+  "deleted_at" timestamptz NOT NULL DEFAULT (now())
+);
+
+CREATE INDEX IF NOT EXISTS "product_tombstones_version_id_idx" ON "product_tombstones" ("version", "id");
+
+-- Highest tombstone version purged so far; feeds older than this must resync
+CREATE TABLE IF NOT EXISTS "product_changes_horizon" (
+  "singleton" boolean PRIMARY KEY DEFAULT true CHECK ("singleton"),
+  "version" bigint NOT NULL
+);
+
+INSERT INTO "product_changes_horizon" ("version") VALUES (0) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION "products_record_tombstones"() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO "product_tombstones" ("id")
+  SELECT "id" FROM "old_rows"
+  ON CONFLICT ("id") DO UPDATE
+  SET "version" = EXCLUDED."version", "deleted_at" = EXCLUDED."deleted_at";
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER "products_record_tombstones"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_record_tombstones"();
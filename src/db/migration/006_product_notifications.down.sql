@@ -0,0 +1,4 @@
+DROP TRIGGER IF EXISTS "products_notify_delete" ON "products";
+DROP TRIGGER IF EXISTS "products_notify_update" ON "products";
+DROP TRIGGER IF EXISTS "products_notify_insert" ON "products";
+DROP FUNCTION IF EXISTS "products_notify_changes"();
@@ -0,0 +1,40 @@
+-- Publish one NOTIFY per writing statement on the product_changes channel.
+-- Notifications are delivered on commit; payloads stay well under the 8000 byte
+-- limit by listing at most 256 ids and sending "ids": null for larger statements,
+-- in which case listeners should catch up through the change feed.
+CREATE OR REPLACE FUNCTION "products_notify_changes"() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+  "changed" bigint[];
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    SELECT array_agg("id" ORDER BY "id") INTO "changed" FROM (SELECT "id" FROM "old_rows" LIMIT 257) AS r;
+  ELSE
+    SELECT array_agg("id" ORDER BY "id") INTO "changed" FROM (SELECT "id" FROM "new_rows" LIMIT 257) AS r;
+  END IF;
+  IF "changed" IS NULL THEN
+    RETURN NULL;
+  END IF;
+  PERFORM pg_notify('product_changes', json_build_object(
+    'op', lower(TG_OP),
+    'version', pg_current_xact_id()::text::bigint,
+    'ids', CASE WHEN cardinality("changed") > 256 THEN NULL ELSE "changed" END
+  )::text);
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER "products_notify_insert"
+  AFTER INSERT ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_notify_changes"();
+
+CREATE TRIGGER "products_notify_update"
+  AFTER UPDATE ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_notify_changes"();
+
+CREATE TRIGGER "products_notify_delete"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_notify_changes"();
@@ -0,0 +1,3 @@
+DROP TABLE IF EXISTS "product_idempotency_keys";
+CREATE INDEX IF NOT EXISTS "products_code_idx" ON "products" ("code");
+DROP INDEX IF EXISTS "products_code_key";
@@ -0,0 +1,23 @@
+-- Product codes identify a product across imports and retries, so they must be unique.
+-- Earlier duplicates keep their lowest id as the owner of the code; later copies get
+-- their id appended instead of being deleted.
+UPDATE "products" AS p
+SET "code" = p."code" || '-' || p."id"
+FROM (
+  SELECT "id", row_number() OVER (PARTITION BY "code" ORDER BY "id") AS "rank"
+  FROM "products"
+) AS d
+WHERE d."id" = p."id" AND d."rank" > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS "products_code_key" ON "products" ("code");
+DROP INDEX IF EXISTS "products_code_idx";
+
+-- Responses to POST /api/products/ keyed by the client's Idempotency-Key header
+CREATE TABLE IF NOT EXISTS "product_idempotency_keys" (
+  "key" varchar PRIMARY KEY,
+  "request_hash" bytea NOT NULL,
+  "product_id" bigint NOT NULL,
+  "created_at" timestamptz NOT NULL DEFAULT (now())
+);
+
+CREATE INDEX IF NOT EXISTS "product_idempotency_keys_created_at_idx" ON "product_idempotency_keys" ("created_at");
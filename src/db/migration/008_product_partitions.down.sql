@@ -0,0 +1,83 @@
+-- Back to a single heap table; rows of archived (detached) partitions are not restored.
+DROP FUNCTION IF EXISTS "products_archive_partition"(text);
+DROP FUNCTION IF EXISTS "products_create_partitions"(timestamptz, timestamptz);
+
+ALTER TABLE "products" RENAME TO "products_partitioned";
+ALTER SEQUENCE "products_id_seq" OWNED BY NONE;
+
+CREATE TABLE "products" (
+  "id" bigint PRIMARY KEY DEFAULT nextval('products_id_seq'),
+  "name" varchar NOT NULL,
+  "code" varchar NOT NULL,
+  "description" varchar NOT NULL,
+  "category" varchar NOT NULL,
+  "price" decimal NOT NULL,
+  "created_at" timestamptz NOT NULL DEFAULT (now()),
+  "search_vector" tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', "name"), 'A') ||
+    setweight(to_tsvector('simple', "description"), 'B')
+  ) STORED,
+  "version" bigint NOT NULL DEFAULT (pg_current_xact_id()::text::bigint),
+  "updated_at" timestamptz NOT NULL DEFAULT (now())
+);
+
+ALTER SEQUENCE "products_id_seq" OWNED BY "products"."id";
+
+INSERT INTO "products" ("id", "name", "code", "description", "category", "price", "created_at", "version", "updated_at")
+SELECT "id", "name", "code", "description", "category", "price", "created_at", "version", "updated_at"
+FROM "products_partitioned";
+
+DROP TABLE "products_partitioned";
+DROP FUNCTION IF EXISTS "products_sync_codes"();
+DROP TABLE IF EXISTS "product_codes";
+
+CREATE UNIQUE INDEX IF NOT EXISTS "products_code_key" ON "products" ("code");
+CREATE INDEX IF NOT EXISTS "products_created_at_id_idx" ON "products" ("created_at", "id");
+CREATE INDEX IF NOT EXISTS "products_price_id_idx" ON "products" ("price", "id");
+CREATE INDEX IF NOT EXISTS "products_name_id_idx" ON "products" ("name", "id");
+CREATE INDEX IF NOT EXISTS "products_category_id_idx" ON "products" ("category", "id");
+CREATE INDEX IF NOT EXISTS "products_category_created_at_id_idx" ON "products" ("category", "created_at", "id");
+CREATE INDEX IF NOT EXISTS "products_category_price_id_idx" ON "products" ("category", "price", "id");
+CREATE INDEX IF NOT EXISTS "products_search_vector_idx" ON "products" USING GIN ("search_vector");
+CREATE INDEX IF NOT EXISTS "products_name_trgm_idx" ON "products" USING GIN ("name" gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS "products_name_prefix_idx" ON "products" (lower("name") text_pattern_ops);
+CREATE INDEX IF NOT EXISTS "products_version_id_idx" ON "products" ("version", "id");
+
+CREATE TRIGGER "products_category_stats_insert"
+  AFTER INSERT ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_category_stats_sync"();
+
+CREATE TRIGGER "products_category_stats_update"
+  AFTER UPDATE ON "products"
+  REFERENCING OLD TABLE AS "old_rows" NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_category_stats_sync"();
+
+CREATE TRIGGER "products_category_stats_delete"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_category_stats_sync"();
+
+CREATE TRIGGER "products_stamp_version"
+  BEFORE UPDATE ON "products"
+  FOR EACH ROW EXECUTE FUNCTION "products_stamp_version"();
+
+CREATE TRIGGER "products_record_tombstones"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_record_tombstones"();
+
+CREATE TRIGGER "products_notify_insert"
+  AFTER INSERT ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_notify_changes"();
+
+CREATE TRIGGER "products_notify_update"
+  AFTER UPDATE ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_notify_changes"();
+
+CREATE TRIGGER "products_notify_delete"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_notify_changes"();
@@ -0,0 +1,256 @@
+-- Range-partition products by created_at into UTC calendar months named products_pYYYYMM,
+-- plus products_default for rows outside every month. Vacuum and index maintenance then
+-- work one month at a time, listings filtered on created_at only read the months they
+-- overlap, and old months are archived by detaching them whole.
+--
+-- A unique index on a partitioned table must include the partition key, so the primary key
+-- becomes (id, created_at) and the unique code index of 007 is replaced by the product_codes
+-- registry: one row per code, kept in step with products by statement-level triggers.
+-- Writes that reuse a code still fail with unique_violation, now on "product_codes_pkey".
+ALTER TABLE "products" RENAME TO "products_unpartitioned";
+ALTER SEQUENCE "products_id_seq" OWNED BY NONE;
+
+CREATE TABLE "products" (
+  "id" bigint NOT NULL DEFAULT nextval('products_id_seq'),
+  "name" varchar NOT NULL,
+  "code" varchar NOT NULL,
+  "description" varchar NOT NULL,
+  "category" varchar NOT NULL,
+  "price" decimal NOT NULL,
+  "created_at" timestamptz NOT NULL DEFAULT (now()),
+  "search_vector" tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', "name"), 'A') ||
+    setweight(to_tsvector('simple', "description"), 'B')
+  ) STORED,
+  "version" bigint NOT NULL DEFAULT (pg_current_xact_id()::text::bigint),
+  "updated_at" timestamptz NOT NULL DEFAULT (now()),
+  PRIMARY KEY ("id", "created_at")
+) PARTITION BY RANGE ("created_at");
+
+ALTER SEQUENCE "products_id_seq" OWNED BY "products"."id";
+
+CREATE TABLE "products_default" PARTITION OF "products" DEFAULT;
+
+-- Create the monthly partitions covering [from_time, until), moving rows that the default
+-- partition already holds for those months into them. Returns how many were created.
+CREATE OR REPLACE FUNCTION "products_create_partitions"("from_time" timestamptz, "until" timestamptz) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+  "month_start" timestamp := date_trunc('month', "from_time" AT TIME ZONE 'UTC');
+  "month_end" timestamp;
+  "partition" text;
+  "created" integer := 0;
+BEGIN
+  -- Every API worker runs this; they take turns
+  PERFORM pg_advisory_xact_lock(hashtext('products_partitions'));
+  WHILE "month_start" AT TIME ZONE 'UTC' < "until" LOOP
+    "month_end" := "month_start" + interval '1 month';
+    "partition" := 'products_p' || to_char("month_start", 'YYYYMM');
+    IF to_regclass(quote_ident("partition")) IS NULL THEN
+      EXECUTE format('CREATE TABLE %I (LIKE "products" INCLUDING DEFAULTS INCLUDING GENERATED)', "partition");
+      -- Statements on a single partition skip the statement triggers of products: the rows
+      -- only change table, so rollups, tombstones and notifications must not see them
+      EXECUTE format($sql$
+        WITH "moved" AS (
+          DELETE FROM "products_default" WHERE "created_at" >= $1 AND "created_at" < $2
+          RETURNING "id", "name", "code", "description", "category", "price", "created_at", "version", "updated_at"
+        )
+        INSERT INTO %I ("id", "name", "code", "description", "category", "price", "created_at", "version", "updated_at")
+        SELECT * FROM "moved"
+      $sql$, "partition") USING "month_start" AT TIME ZONE 'UTC', "month_end" AT TIME ZONE 'UTC';
+      EXECUTE format(
+        'ALTER TABLE "products" ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        "partition", to_char("month_start", 'YYYY-MM-DD') || ' 00:00:00+00', to_char("month_end", 'YYYY-MM-DD') || ' 00:00:00+00'
+      );
+      "created" := "created" + 1;
+    END IF;
+    "month_start" := "month_end";
+  END LOOP;
+  RETURN "created";
+END;
+$$;
+
+SELECT "products_create_partitions"(
+  LEAST((SELECT min("created_at") FROM "products_unpartitioned"), now()),
+  now() + interval '3 months'
+);
+
+INSERT INTO "products" ("id", "name", "code", "description", "category", "price", "created_at", "version", "updated_at")
+SELECT "id", "name", "code", "description", "category", "price", "created_at", "version", "updated_at"
+FROM "products_unpartitioned";
+
+DROP TABLE "products_unpartitioned";
+
+CREATE TABLE IF NOT EXISTS "product_codes" (
+  "code" varchar PRIMARY KEY,
+  "product_id" bigint NOT NULL
+);
+
+INSERT INTO "product_codes" ("code", "product_id")
+SELECT "code", "id" FROM "products";
+
+CREATE INDEX IF NOT EXISTS "products_created_at_id_idx" ON "products" ("created_at", "id");
+CREATE INDEX IF NOT EXISTS "products_price_id_idx" ON "products" ("price", "id");
+CREATE INDEX IF NOT EXISTS "products_name_id_idx" ON "products" ("name", "id");
+CREATE INDEX IF NOT EXISTS "products_category_id_idx" ON "products" ("category", "id");
+CREATE INDEX IF NOT EXISTS "products_category_created_at_id_idx" ON "products" ("category", "created_at", "id");
+CREATE INDEX IF NOT EXISTS "products_category_price_id_idx" ON "products" ("category", "price", "id");
+CREATE INDEX IF NOT EXISTS "products_search_vector_idx" ON "products" USING GIN ("search_vector");
+CREATE INDEX IF NOT EXISTS "products_name_trgm_idx" ON "products" USING GIN ("name" gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS "products_name_prefix_idx" ON "products" (lower("name") text_pattern_ops);
+CREATE INDEX IF NOT EXISTS "products_version_id_idx" ON "products" ("version", "id");
+
+-- A code is claimed by inserting its product, or beforehand by an upsert that then inserts
+-- the product under the claimed id; either way a second owner hits the primary key.
+CREATE OR REPLACE FUNCTION "products_sync_codes"() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    DELETE FROM "product_codes" AS c
+    USING "old_rows" AS o
+    WHERE c."code" = o."code" AND c."product_id" = o."id";
+  ELSIF TG_OP = 'UPDATE' THEN
+    -- Release every changed code before claiming the new ones, so rows can swap codes
+    DELETE FROM "product_codes" AS c
+    USING "old_rows" AS o JOIN "new_rows" AS n ON n."id" = o."id"
+    WHERE o."code" <> n."code" AND c."code" = o."code" AND c."product_id" = o."id";
+    INSERT INTO "product_codes" ("code", "product_id")
+    SELECT n."code", n."id"
+    FROM "new_rows" AS n JOIN "old_rows" AS o ON o."id" = n."id"
+    WHERE o."code" <> n."code"
+    ORDER BY n."code";
+  ELSE
+    INSERT INTO "product_codes" ("code", "product_id")
+    SELECT n."code", n."id"
+    FROM "new_rows" AS n
+    WHERE NOT EXISTS (
+      SELECT 1 FROM "product_codes" AS c WHERE c."code" = n."code" AND c."product_id" = n."id"
+    )
+    ORDER BY n."code";
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER "products_codes_insert"
+  AFTER INSERT ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_sync_codes"();
+
+CREATE TRIGGER "products_codes_update"
+  AFTER UPDATE ON "products"
+  REFERENCING OLD TABLE AS "old_rows" NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_sync_codes"();
+
+CREATE TRIGGER "products_codes_delete"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_sync_codes"();
+
+-- The triggers of 004-006 went with the old table
+CREATE TRIGGER "products_category_stats_insert"
+  AFTER INSERT ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_category_stats_sync"();
+
+CREATE TRIGGER "products_category_stats_update"
+  AFTER UPDATE ON "products"
+  REFERENCING OLD TABLE AS "old_rows" NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_category_stats_sync"();
+
+CREATE TRIGGER "products_category_stats_delete"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_category_stats_sync"();
+
+CREATE TRIGGER "products_stamp_version"
+  BEFORE UPDATE ON "products"
+  FOR EACH ROW EXECUTE FUNCTION "products_stamp_version"();
+
+CREATE TRIGGER "products_record_tombstones"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_record_tombstones"();
+
+CREATE TRIGGER "products_notify_insert"
+  AFTER INSERT ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_notify_changes"();
+
+CREATE TRIGGER "products_notify_update"
+  AFTER UPDATE ON "products"
+  REFERENCING NEW TABLE AS "new_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_notify_changes"();
+
+CREATE TRIGGER "products_notify_delete"
+  AFTER DELETE ON "products"
+  REFERENCING OLD TABLE AS "old_rows"
+  FOR EACH STATEMENT EXECUTE FUNCTION "products_notify_changes"();
+
+-- Detach a monthly partition and account for its rows as deleted: tombstones for the change
+-- feed, codes released, rollups reduced and listeners told to resync. The detached table is
+-- renamed products_archived_pYYYYMM and returned; export it, then drop it.
+CREATE OR REPLACE FUNCTION "products_archive_partition"("partition" text) RETURNS text
+LANGUAGE plpgsql AS $$
+DECLARE
+  "archived" text := 'products_archived_' || substring("partition" from 'p[0-9]{6}$');
+BEGIN
+  IF "partition" !~ '^products_p[0-9]{6}$' THEN
+    RAISE EXCEPTION 'Not a monthly products partition: %', "partition";
+  END IF;
+  PERFORM pg_advisory_xact_lock(hashtext('products_partitions'));
+  EXECUTE format('ALTER TABLE "products" DETACH PARTITION %I', "partition");
+  EXECUTE format('ALTER TABLE %I RENAME TO %I', "partition", "archived");
+
+  EXECUTE format($sql$
+    INSERT INTO "product_tombstones" ("id")
+    SELECT "id" FROM %I
+    ON CONFLICT ("id") DO UPDATE
+    SET "version" = EXCLUDED."version", "deleted_at" = EXCLUDED."deleted_at"
+  $sql$, "archived");
+
+  EXECUTE format($sql$
+    DELETE FROM "product_codes" AS c
+    USING %I AS o
+    WHERE c."code" = o."code" AND c."product_id" = o."id"
+  $sql$, "archived");
+
+  EXECUTE format($sql$
+    UPDATE "product_category_stats" AS s
+    SET "product_count" = s."product_count" - o."removed",
+        "price_sum" = s."price_sum" - o."price_sum",
+        "min_price" = (SELECT min(p."price") FROM "products" p WHERE p."category" = s."category"),
+        "max_price" = (SELECT max(p."price") FROM "products" p WHERE p."category" = s."category")
+    FROM (
+      SELECT "category", count(*) AS "removed", sum("price") AS "price_sum"
+      FROM %I
+      GROUP BY "category"
+    ) AS o
+    WHERE s."category" = o."category"
+  $sql$, "archived");
+
+  EXECUTE format($sql$
+    UPDATE "product_category_daily" AS d
+    SET "created_count" = d."created_count" - o."removed"
+    FROM (
+      SELECT "category", ("created_at" AT TIME ZONE 'UTC')::date AS "day", count(*) AS "removed"
+      FROM %I
+      GROUP BY 1, 2
+    ) AS o
+    WHERE d."category" = o."category" AND d."day" = o."day"
+  $sql$, "archived");
+
+  DELETE FROM "product_category_stats" WHERE "product_count" = 0;
+  DELETE FROM "product_category_daily" WHERE "created_count" = 0;
+
+  PERFORM pg_notify('product_changes', json_build_object(
+    'op', 'delete',
+    'version', pg_current_xact_id()::text::bigint,
+    'ids', NULL
+  )::text);
+  RETURN "archived";
+END;
+$$;
+
+-- Autovacuum analyzes the partitions but never the partitioned table itself
+ANALYZE "products";
@@ -0,0 +1,80 @@
+-- The stats trigger used to re-read a category's min/max inside the UPDATE that subtracts
+-- removed rows. When that UPDATE waited on a concurrent writer's stats row, it was re-checked
+-- against the new row version but the re-read still ran on the statement's old snapshot, so
+-- a price committed by that writer could be missed. The subtraction now takes the row locks
+-- first and the extremes are re-read by a later statement, whose fresh snapshot (READ
+-- COMMITTED) includes every writer that updated the row before us. Writers still waiting
+-- on the lock apply their own prices with LEAST/GREATEST after we commit.
+--
+-- Stats written before this migration may already be off; "refresh_product_category_stats"()
+-- rebuilds both rollup tables from products and is the repair path.
+CREATE OR REPLACE FUNCTION "products_category_stats_sync"() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+  "stale" varchar[];
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    -- Subtract the old rows, noting the categories where one of them held the min or max
+    WITH "changed" AS (
+      UPDATE "product_category_stats" AS s
+      SET "product_count" = s."product_count" - o."removed",
+          "price_sum" = s."price_sum" - o."price_sum"
+      FROM (
+        SELECT "category", count(*) AS "removed", sum("price") AS "price_sum", min("price") AS "min_price", max("price") AS "max_price"
+        FROM "old_rows"
+        GROUP BY "category"
+      ) AS o
+      WHERE s."category" = o."category"
+      RETURNING s."category", o."min_price" <= s."min_price" OR o."max_price" >= s."max_price" AS "recompute"
+    )
+    SELECT array_agg("category") INTO "stale" FROM "changed" WHERE "recompute";
+
+    IF "stale" IS NOT NULL THEN
+      -- A new statement, so the re-read sees writers that committed while we waited for the locks
+      UPDATE "product_category_stats" AS s
+      SET "min_price" = (SELECT min(p."price") FROM "products" p WHERE p."category" = s."category"),
+          "max_price" = (SELECT max(p."price") FROM "products" p WHERE p."category" = s."category")
+      WHERE s."category" = ANY("stale");
+    END IF;
+
+    UPDATE "product_category_daily" AS d
+    SET "created_count" = d."created_count" - o."removed"
+    FROM (
+      SELECT "category", ("created_at" AT TIME ZONE 'UTC')::date AS "day", count(*) AS "removed"
+      FROM "old_rows"
+      GROUP BY 1, 2
+    ) AS o
+    WHERE d."category" = o."category" AND d."day" = o."day";
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO "product_category_stats" AS s ("category", "product_count", "price_sum", "min_price", "max_price")
+    SELECT "category", count(*), sum("price"), min("price"), max("price")
+    FROM "new_rows"
+    GROUP BY "category"
+    ORDER BY "category"
+    ON CONFLICT ("category") DO UPDATE
+    SET "product_count" = s."product_count" + EXCLUDED."product_count",
+        "price_sum" = s."price_sum" + EXCLUDED."price_sum",
+        "min_price" = LEAST(s."min_price", EXCLUDED."min_price"),
+        "max_price" = GREATEST(s."max_price", EXCLUDED."max_price");
+
+    INSERT INTO "product_category_daily" AS d ("category", "day", "created_count")
+    SELECT "category", ("created_at" AT TIME ZONE 'UTC')::date, count(*)
+    FROM "new_rows"
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT ("category", "day") DO UPDATE
+    SET "created_count" = d."created_count" + EXCLUDED."created_count";
+  END IF;
+
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    DELETE FROM "product_category_stats" WHERE "product_count" = 0;
+    DELETE FROM "product_category_daily" WHERE "created_count" = 0;
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+-- Repair stats that drifted under the old trigger
+SELECT "refresh_product_category_stats"();
@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 
 interface Product {
   id: number;
@@ -10,6 +10,22 @@ interface Product {
   created_at: string;
 }
 
+interface ProductPage {
+  items: Product[];
+  next_cursor: string | null;
+}
+
+interface ProductBatch {
+  items: Product[];
+  missing: number[];
+}
+
+interface ProductChange {
+  op: "insert" | "update" | "delete";
+  version: number;
+  ids: number[] | null;
+}
+
 enum Tab {
   Search,
   Create,
@@ -23,6 +39,7 @@ const ProductTable: React.FC = () => {
   const [productId, setProductId] = useState<string>("");
   const [deleteProductId, setDeleteProductId] = useState<string>("");
   const [allProducts, setAllProducts] = useState<Product[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [newProduct, setNewProduct] = useState<Omit<Product, "id">>({
     name: "",
     code: "",
@@ -37,6 +54,59 @@ const ProductTable: React.FC = () => {
     string | null
   >(null);
 
+  const shownIds = useRef<number[]>([]);
+  shownIds.current = allProducts.map((product) => product.id);
+
+  // Re-read only the displayed rows touched by a change instead of the whole list
+  const refreshRows = async (ids: number[]) => {
+    if (ids.length === 0) {
+      return;
+    }
+    try {
+      const response = await fetch(
+        "http://44.201.89.150:3000/api/products/batch-get",
+        {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify({ ids: ids.slice(0, 1000) }),
+        }
+      );
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! Status: ${response.status}`);
+      }
+
+      const data: ProductBatch = await response.json();
+      const fresh = new Map(data.items.map((product) => [product.id, product]));
+      setAllProducts((products) =>
+        products
+          .filter((product) => !data.missing.includes(product.id))
+          .map((product) => fresh.get(product.id) ?? product)
+      );
+    } catch (error) {
+      console.error("Error refreshing products:", error);
+    }
+  };
+
+  useEffect(() => {
+    const source = new EventSource(
+      "http://44.201.89.150:3000/api/products/events"
+    );
+    source.addEventListener("change", (event) => {
+      const change: ProductChange = JSON.parse((event as MessageEvent).data);
+      if (change.op === "insert") {
+        return;
+      }
+      const ids = change.ids ?? shownIds.current;
+      refreshRows(ids.filter((id) => shownIds.current.includes(id)));
+    });
+    // Sent when notifications were missed or this client fell behind
+    source.addEventListener("resync", () => refreshRows(shownIds.current));
+    return () => source.close();
+  }, []);
+
   const handleSearchProduct = async () => {
     try {
       const response = await fetch(
@@ -101,9 +171,13 @@ const ProductTable: React.FC = () => {
     }
   };
 
-  const handleFetchAllProducts = async () => {
+  const handleFetchAllProducts = async (cursor: string | null = null) => {
     try {
-      const response = await fetch("http://44.201.89.150:3000/api/products/", {
+      const url = new URL("http://44.201.89.150:3000/api/products/");
+      if (cursor) {
+        url.searchParams.set("cursor", cursor);
+      }
+      const response = await fetch(url.toString(), {
         method: "GET",
         headers: {
           "Content-Type": "application/json",
@@ -114,8 +188,9 @@ const ProductTable: React.FC = () => {
         throw new Error(`HTTP error! Status: ${response.status}`);
       }
 
-      const data: Product[] = await response.json();
-      setAllProducts(data);
+      const data: ProductPage = await response.json();
+      setAllProducts(cursor ? [...allProducts, ...data.items] : data.items);
+      setNextCursor(data.next_cursor);
     } catch (error) {
       console.error("Error fetching products:", error);
     }
@@ -139,6 +214,7 @@ const ProductTable: React.FC = () => {
 
       const data: Product = await response.json();
       setAllProducts([data]);
+      setNextCursor(null);
     } catch (error) {
       console.error("Error fetching product by ID:", error);
     }
@@ -303,7 +379,7 @@ const ProductTable: React.FC = () => {
                 Get Product by ID
               </button>
               <button
-                onClick={handleFetchAllProducts}
+                onClick={() => handleFetchAllProducts()}
                 className="btn btn-secondary float-end"
               >
                 List All Products
@@ -337,6 +413,14 @@ const ProductTable: React.FC = () => {
                   ))}
                 </tbody>
               </table>
+              {nextCursor && (
+                <button
+                  onClick={() => handleFetchAllProducts(nextCursor)}
+                  className="btn btn-outline-secondary"
+                >
+                  Load More
+                </button>
+              )}
             </div>
           </>
         )}